@@ -0,0 +1,117 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Optional
+from ..db.base import get_async_db
+from ..models.order import EquityCurve
+from datetime import datetime, timezone
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/charts", tags=["charts"])
+
+# Chart series are downsampled on the server to the requested pixel width, so a
+# payload stays a few thousand points however long the range. format=binary
+# returns the same columns packed as typed arrays (see charts.to_binary). Every
+# response carries an ETag derived from the data's version: a client revalidating
+# unchanged data gets a 304 before anything is read or computed.
+
+_CACHE_CONTROL = "private, no-cache"
+
+
+def _validate(width: int, format: str):
+    from ..services import charts
+    if not 10 <= width <= charts.MAX_WIDTH:
+        raise HTTPException(status_code=400, detail=f"width must be between 10 and {charts.MAX_WIDTH}")
+    if format not in ("json", "binary"):
+        raise HTTPException(status_code=400, detail="format must be json or binary")
+
+
+def _not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": _CACHE_CONTROL})
+
+
+def _respond(meta: dict, series: Dict[str, Dict[str, np.ndarray]], format: str, tag: str) -> Response:
+    """`series` maps a name to its columns; binary flattens them to "<name>.<column>" """
+    from ..services import charts
+    headers = {"ETag": tag, "Cache-Control": _CACHE_CONTROL}
+    if format == "binary":
+        flat = {f"{name}.{column}": values for name, columns in series.items() for column, values in columns.items()}
+        return Response(content=charts.to_binary(flat, meta), media_type=charts.BINARY_MEDIA_TYPE, headers=headers)
+    return JSONResponse({**meta, "series": {name: charts.to_json(columns) for name, columns in series.items()}},
+                        headers=headers)
+
+
+@router.get("/candles")
+async def get_candles(
+    security_id: str,
+    exchange: str = "NSE",
+    timeframe: str = "1",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    width: int = 800,
+    overlays: Optional[str] = Query(None, description="e.g. ema(9);ema(21);rsi(14)"),
+    format: str = "json",
+    if_none_match: Optional[str] = Header(None),
+):
+    """OHLCV from the candle store bucketed to `width` candles, with indicator overlays"""
+    from ..services import charts
+    _validate(width, format)
+    if timeframe not in ("1", "D"):
+        raise HTTPException(status_code=400, detail="timeframe must be 1 or D")
+    specs = [s.strip() for s in (overlays or "").split(";") if s.strip()]
+    first, last = charts.default_range(timeframe, charts.to_epoch(start), charts.to_epoch(end))
+    version = await run_in_threadpool(charts.candle_version, exchange, security_id, timeframe)
+    tag = charts.etag("candles", exchange, security_id, timeframe, first, last, width, specs, format, version)
+    if charts.etag_matches(if_none_match, tag):
+        return _not_modified(tag)
+    try:
+        ohlcv, lines = await run_in_threadpool(charts.candle_chart, exchange, security_id, timeframe,
+                                               first, last, width, specs)
+    except charts.ChartError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    meta = {"exchange": exchange, "security_id": security_id, "timeframe": timeframe,
+            "start": first, "end": last, "width": width, "candles": len(ohlcv["ts"])}
+    return _respond(meta, {"candles": ohlcv, **lines}, format, tag)
+
+
+def _naive_utc(ts: Optional[int]) -> Optional[datetime]:
+    # equity_curve timestamps are stored as naive UTC
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None) if ts is not None else None
+
+
+@router.get("/equity")
+async def get_equity(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    width: int = 800,
+    format: str = "json",
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Equity curve with realized/unrealized P&L, reduced to `width` points"""
+    from ..services import charts
+    _validate(width, format)
+    conditions = []
+    start_ts, end_ts = charts.to_epoch(start), charts.to_epoch(end)
+    first, last = _naive_utc(start_ts), _naive_utc(end_ts)
+    if first is not None:
+        conditions.append(EquityCurve.timestamp >= first)
+    if last is not None:
+        conditions.append(EquityCurve.timestamp < last)
+    count, max_id = (await db.execute(
+        select(func.count(EquityCurve.id), func.max(EquityCurve.id)).where(*conditions)
+    )).one()
+    tag = charts.etag("equity", first, last, width, format, count, max_id)
+    if charts.etag_matches(if_none_match, tag):
+        return _not_modified(tag)
+    rows = (await db.execute(
+        select(EquityCurve.timestamp, EquityCurve.equity_value, EquityCurve.realized_pnl,
+               EquityCurve.unrealized_pnl).where(*conditions).order_by(EquityCurve.timestamp)
+    )).all()
+    columns = await run_in_threadpool(charts.equity_chart, [tuple(r) for r in rows], width)
+    meta = {"start": start_ts, "end": end_ts, "width": width, "points": count}
+    return _respond(meta, {"equity": columns}, format, tag)
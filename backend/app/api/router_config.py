@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import Optional
-from ..db.base import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from ..db.base import get_db, get_async_db
 from ..models.config_dhan import ConfigDhan
+from ..services import topology
 from pydantic import BaseModel
 import logging
 
@@ -32,7 +35,7 @@ class ConfigDhanUpdate(BaseModel):
 @router.get("/", response_model=ConfigDhanSchema)
 def get_config(db: Session = Depends(get_db)):
     """Get Dhan API configuration"""
-    config = db.query(ConfigDhan).first()
+    config = db.query(ConfigDhan).order_by(ConfigDhan.id).first()
     if not config:
         raise HTTPException(status_code=404, detail="Config not found. Please set up your Dhan credentials.")
     return config
@@ -41,18 +44,20 @@ def get_config(db: Session = Depends(get_db)):
 @router.post("/", response_model=ConfigDhanSchema)
 def create_config(config_data: ConfigDhanSchema, db: Session = Depends(get_db)):
     """Create or update Dhan API configuration"""
-    existing = db.query(ConfigDhan).first()
+    existing = db.query(ConfigDhan).order_by(ConfigDhan.id).first()
     if existing:
         for key, value in config_data.dict(exclude_unset=True).items():
             setattr(existing, key, value)
         db.commit()
         db.refresh(existing)
+        topology.notify("dhan config updated")
         logger.info("Config updated")
         return existing
     config = ConfigDhan(**config_data.dict())
     db.add(config)
     db.commit()
     db.refresh(config)
+    topology.notify("dhan config created")
     logger.info("Config created")
     return config
 
@@ -60,7 +65,7 @@ def create_config(config_data: ConfigDhanSchema, db: Session = Depends(get_db)):
 @router.put("/", response_model=ConfigDhanSchema)
 def update_config(config_data: ConfigDhanUpdate, db: Session = Depends(get_db)):
     """Update Dhan API configuration"""
-    config = db.query(ConfigDhan).first()
+    config = db.query(ConfigDhan).order_by(ConfigDhan.id).first()
     if not config:
         raise HTTPException(status_code=404, detail="Config not found")
     update_data = config_data.dict(exclude_unset=True)
@@ -68,22 +73,108 @@ def update_config(config_data: ConfigDhanUpdate, db: Session = Depends(get_db)):
         setattr(config, key, value)
     db.commit()
     db.refresh(config)
+    topology.notify("dhan config updated")
     logger.info("Config updated")
     return config
 
 
 @router.get("/test-connection")
-def test_connection(db: Session = Depends(get_db)):
+async def test_connection(db: AsyncSession = Depends(get_async_db)):
     """Test Dhan API connection"""
-    from ..services.dhan_client import get_dhan_client
-    config = db.query(ConfigDhan).first()
-    if not config:
+    from ..services.dhan_async import get_client
+    client = await get_client(db)
+    if client is None:
         raise HTTPException(status_code=404, detail="Config not found")
     try:
-        client = get_dhan_client(db)
-        # Try a simple API call
-        profile = client.get_fund_limits()
+        # Try a simple API call (uncached, so it really reaches Dhan)
+        profile = await client.get_fund_limits()
+        if profile.get("status") == "failure":
+            raise RuntimeError(profile.get("remarks"))
         return {"status": "connected", "message": "Successfully connected to Dhan API", "data": profile}
     except Exception as e:
         logger.error(f"Connection test failed: {e}")
         raise HTTPException(status_code=400, detail=f"Connection failed: {str(e)}")
+
+
+class AccountSchema(BaseModel):
+    name: Optional[str] = None
+    client_id: str
+    access_token: str
+    is_enabled: bool = True
+    capital: Optional[float] = None
+    qty_multiplier: float = 1.0
+    max_daily_loss_pct: Optional[float] = None
+    max_positions: Optional[int] = None
+    max_capital_per_trade_pct: Optional[float] = None
+
+
+class AccountUpdate(BaseModel):
+    name: Optional[str] = None
+    client_id: Optional[str] = None
+    access_token: Optional[str] = None
+    is_enabled: Optional[bool] = None
+    capital: Optional[float] = None
+    qty_multiplier: Optional[float] = None
+    max_daily_loss_pct: Optional[float] = None
+    max_positions: Optional[int] = None
+    max_capital_per_trade_pct: Optional[float] = None
+
+
+class AccountOut(BaseModel):
+    id: int
+    name: Optional[str]
+    client_id: str
+    is_enabled: Optional[bool]
+    capital: Optional[float]
+    qty_multiplier: Optional[float]
+    max_daily_loss_pct: Optional[float]
+    max_positions: Optional[int]
+    max_capital_per_trade_pct: Optional[float]
+
+    class Config:
+        from_attributes = True
+
+
+@router.get("/accounts", response_model=List[AccountOut])
+def list_accounts(db: Session = Depends(get_db)):
+    """Trading accounts; the first is the primary (market data and model portfolio)"""
+    return db.query(ConfigDhan).order_by(ConfigDhan.id).all()
+
+
+@router.post("/accounts", response_model=AccountOut)
+def create_account(data: AccountSchema, db: Session = Depends(get_db)):
+    """Add an account that receives its own sizing of every live order"""
+    # config_dhan.id defaults to 1 for the original single-account row
+    account = ConfigDhan(id=(db.query(func.max(ConfigDhan.id)).scalar() or 0) + 1, **data.dict())
+    db.add(account)
+    db.commit()
+    db.refresh(account)
+    topology.notify("account created")
+    logger.info(f"Account {account.id} created")
+    return account
+
+
+@router.put("/accounts/{account_id}", response_model=AccountOut)
+def update_account(account_id: int, data: AccountUpdate, db: Session = Depends(get_db)):
+    account = db.get(ConfigDhan, account_id)
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    for key, value in data.dict(exclude_unset=True).items():
+        setattr(account, key, value)
+    db.commit()
+    db.refresh(account)
+    topology.notify("account updated")
+    return account
+
+
+@router.delete("/accounts/{account_id}")
+def delete_account(account_id: int, db: Session = Depends(get_db)):
+    account = db.get(ConfigDhan, account_id)
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if account.id == db.query(func.min(ConfigDhan.id)).scalar():
+        raise HTTPException(status_code=400, detail="The primary account cannot be deleted; update it instead")
+    db.delete(account)
+    db.commit()
+    topology.notify("account deleted")
+    return {"message": "Account deleted"}
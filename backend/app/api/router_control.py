@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from ..db.base import get_db
-from ..models.strategy import Strategy
+from ..models.strategy import Strategy, WatchlistItem
 from ..models.order import Order
 from ..models.config_dhan import ConfigDhan
+from ..services import topology
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
+from datetime import date
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,12 +19,15 @@ router = APIRouter(prefix="/control", tags=["control"])
 def kill_switch(db: Session = Depends(get_db)):
     """Emergency kill switch - stop all strategies and scheduler"""
     from ..workers.engine import stop_scheduler
+    from ..services import alerts
     # Deactivate all strategies
     db.query(Strategy).update({Strategy.is_active: False})
     db.commit()
+    topology.notify("kill switch")
     # Stop scheduler
     stop_scheduler()
     logger.warning("KILL SWITCH ACTIVATED - All strategies stopped")
+    alerts.emit("CRITICAL", "kill_switch", "Kill switch activated: all strategies stopped and scheduler halted")
     return {
         "status": "success",
         "message": "Kill switch activated. All strategies stopped and scheduler halted."
@@ -32,7 +38,7 @@ def kill_switch(db: Session = Depends(get_db)):
 def start_scheduler_endpoint(db: Session = Depends(get_db)):
     """Start the strategy scheduler"""
     from ..workers.engine import start_scheduler, get_scheduler_status
-    config = db.query(ConfigDhan).first()
+    config = db.query(ConfigDhan).order_by(ConfigDhan.id).first()
     if not config:
         raise HTTPException(status_code=400, detail="Please configure Dhan API credentials first")
     if get_scheduler_status():
@@ -72,16 +78,17 @@ def reset_daily_pnl(db: Session = Depends(get_db)):
 
 @router.post("/toggle-paper-trade")
 def toggle_paper_trade(db: Session = Depends(get_db)):
-    """Toggle paper trade mode on/off"""
-    config = db.query(ConfigDhan).first()
-    if not config:
-        raise HTTPException(status_code=404, detail="Config not found")
-    config.paper_trade = not config.paper_trade
+    """Toggle paper trade mode on/off (the global setting; PAPER_TRADING=true still forces paper)"""
+    from ..services.risk_manager import get_global_settings, is_paper_trading
+    gs = get_global_settings(db)
+    gs.paper_trading = not gs.paper_trading
     db.commit()
-    mode = "Paper Trading" if config.paper_trade else "Live Trading"
+    topology.notify("paper trading toggled")
+    paper = is_paper_trading(gs)
+    mode = "Paper Trading" if paper else "Live Trading"
     logger.warning(f"Trading mode changed to: {mode}")
     return {
-        "paper_trade": config.paper_trade,
+        "paper_trade": paper,
         "mode": mode,
         "message": f"Switched to {mode} mode"
     }
@@ -95,7 +102,7 @@ class RiskSettings(BaseModel):
 @router.put("/risk-settings")
 def update_risk_settings(settings: RiskSettings, db: Session = Depends(get_db)):
     """Update risk management settings"""
-    config = db.query(ConfigDhan).first()
+    config = db.query(ConfigDhan).order_by(ConfigDhan.id).first()
     if not config:
         raise HTTPException(status_code=404, detail="Config not found")
     if settings.max_daily_loss_pct is not None:
@@ -103,9 +110,147 @@ def update_risk_settings(settings: RiskSettings, db: Session = Depends(get_db)):
     if settings.max_positions is not None:
         config.max_positions = settings.max_positions
     db.commit()
+    topology.notify("risk settings updated")
     logger.info(f"Risk settings updated: {settings.dict(exclude_none=True)}")
     return {
         "max_daily_loss_pct": config.max_daily_loss_pct,
         "max_positions": config.max_positions,
         "message": "Risk settings updated"
     }
+
+
+@router.post("/history/download")
+def download_history(background_tasks: BackgroundTasks, days: int = 365, db: Session = Depends(get_db)):
+    """Bulk download daily history for every watchlist and screener-universe symbol into the local candle store"""
+    from ..services.candle_store import download_history as _download
+    from ..services.screener import with_universe
+    items = with_universe(db.query(WatchlistItem).all())
+    if not items:
+        return {"status": "skipped", "message": "Watchlist and universe lists are empty"}
+    db.expunge_all()
+    background_tasks.add_task(_download, items, days)
+    return {"status": "started", "instruments": len(items), "days": days}
+
+
+@router.post("/history/ingest-today")
+def ingest_today(background_tasks: BackgroundTasks):
+    """Append today's minute bars for every watchlist and universe symbol (also runs automatically after the close)"""
+    from ..workers.engine import ingest_session_candles
+    background_tasks.add_task(ingest_session_candles)
+    return {"status": "started"}
+
+
+@router.post("/replay")
+def replay_session(day: date, speed: Optional[float] = None):
+    """
+    Replay a recorded session through the live engine on a virtual clock (scheduler must be stopped).
+    speed: N x real time; omit to run as fast as possible. Equal fingerprints mean identical trading.
+    """
+    from ..workers.replay import replay_day
+    try:
+        return replay_day(day, speed)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+class RobustnessRequest(BaseModel):
+    module_name: str = "ema_crossover"
+    exchange: str = "NSE"
+    security_id: str
+    timeframe: str = "1"
+    params: Optional[dict] = None
+    param_grid: Optional[Dict[str, List]] = None  # e.g. {"ema_fast": [5, 9, 13], "ema_slow": [21, 34]}
+    train_bars: int = 2000
+    test_bars: int = 500
+    step_bars: Optional[int] = None
+    objective: str = "sharpe"
+    resamples: int = 5000
+    method: str = "bootstrap"
+    seed: Optional[int] = None
+
+
+@router.post("/robustness")
+def robustness_analysis(request: RobustnessRequest):
+    """Walk-forward optimisation plus Monte Carlo resampling of the out-of-sample trades"""
+    from ..services.robustness import analyze
+    if request.objective not in ("sharpe", "total_return", "profit_factor", "win_rate"):
+        raise HTTPException(status_code=400, detail=f"Unknown objective: {request.objective}")
+    try:
+        return analyze(
+            request.module_name, request.exchange, request.security_id, request.timeframe,
+            base_params=request.params, param_grid=request.param_grid,
+            train_bars=request.train_bars, test_bars=request.test_bars, step_bars=request.step_bars,
+            objective=request.objective, resamples=request.resamples, method=request.method,
+            seed=request.seed,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/profile/slowest")
+def profile_slowest(n: int = 10, by: str = "max"):
+    """Slowest strategy/symbol pairs by on_bar time (by: max, mean, last, total)"""
+    from ..services.profiler import slowest_on_bar
+    return {"by": by, "slowest": slowest_on_bar(n, by)}
+
+
+@router.post("/profile/slowest/reset")
+def profile_slowest_reset():
+    """Clear the accumulated on_bar timings"""
+    from ..services.profiler import reset_on_bar_stats
+    reset_on_bar_stats()
+    return {"status": "success", "message": "on_bar timings reset"}
+
+
+@router.post("/profile")
+def start_profile(cycles: int = 1, interval_ms: float = 5.0, top_allocations: int = 50):
+    """Capture a sampled CPU profile and a memory allocation snapshot of the next K cycles"""
+    from ..services.profiler import request_capture
+    if cycles < 1 or cycles > 60:
+        raise HTTPException(status_code=400, detail="cycles must be between 1 and 60")
+    if interval_ms < 1:
+        raise HTTPException(status_code=400, detail="interval_ms must be at least 1")
+    try:
+        capture = request_capture(cycles, interval_ms, top_allocations)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return capture.to_dict()
+
+
+@router.get("/profile")
+def list_profiles():
+    """List profiling captures of this process"""
+    from ..services.profiler import list_captures
+    return {"captures": list_captures()}
+
+
+@router.get("/profile/{capture_id}")
+def get_profile(capture_id: str):
+    """Get the status of a profiling capture"""
+    from ..services.profiler import get_capture
+    capture = get_capture(capture_id)
+    if not capture:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    return capture.to_dict()
+
+
+@router.get("/profile/{capture_id}/cpu")
+def download_cpu_profile(capture_id: str):
+    """Download the CPU profile as folded stacks (speedscope / flamegraph.pl)"""
+    from ..services.profiler import get_capture
+    capture = get_capture(capture_id)
+    if not capture or not capture.cpu_path:
+        raise HTTPException(status_code=404, detail="CPU profile not available")
+    return FileResponse(capture.cpu_path, media_type="text/plain",
+                        filename=f"cycle_{capture_id}.collapsed")
+
+
+@router.get("/profile/{capture_id}/memory")
+def download_memory_profile(capture_id: str):
+    """Download the memory allocation growth report"""
+    from ..services.profiler import get_capture
+    capture = get_capture(capture_id)
+    if not capture or not capture.memory_path:
+        raise HTTPException(status_code=404, detail="Memory snapshot not available")
+    return FileResponse(capture.memory_path, media_type="text/plain",
+                        filename=f"cycle_{capture_id}.memory.txt")
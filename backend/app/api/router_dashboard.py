@@ -1,53 +1,73 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from ..db.base import get_db
-from ..models.order import Order
+from ..db.base import get_async_db
+from ..models.order import Order, LogEntry, GlobalSettings
 from ..models.strategy import Strategy
 from ..models.config_dhan import ConfigDhan
+from ..services.risk_manager import is_paper_trading
 from pydantic import BaseModel
-from datetime import datetime, date
+from datetime import datetime, date, timedelta, timezone
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+# Every route here is async: database access goes through the async engine and
+# broker reads through the httpx client, so a slow Dhan call holds a socket,
+# not one of the threadpool's workers.
+
 
 class OrderOut(BaseModel):
     id: int
     strategy_id: Optional[int]
+    account_id: Optional[int] = None
     symbol: str
     exchange: str
-    order_type: str
-    transaction_type: str
-    quantity: int
+    side: str
+    qty: int
     price: Optional[float]
+    order_type: str
+    product: str
+    sl: Optional[float]
+    target: Optional[float]
     status: str
     dhan_order_id: Optional[str]
-    created_at: datetime
-    is_paper_trade: bool
+    is_paper: bool
+    notes: Optional[str]
+    timestamp: datetime
 
     class Config:
         from_attributes = True
 
 
+async def _first(db: AsyncSession, model):
+    return (await db.execute(select(model).order_by(model.id).limit(1))).scalar_one_or_none()
+
+
+async def _paper_mode(db: AsyncSession) -> bool:
+    return is_paper_trading(await _first(db, GlobalSettings))
+
+
+def _today_start() -> datetime:
+    today = date.today()
+    return datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
+
+
 @router.get("/positions")
-def get_positions(db: Session = Depends(get_db)):
+async def get_positions(db: AsyncSession = Depends(get_async_db)):
     """Get live positions from Dhan API"""
-    config = db.query(ConfigDhan).first()
+    config = await _first(db, ConfigDhan)
     if not config:
         return {"positions": [], "message": "No config found"}
-    if config.paper_trade:
-        # Return paper trade positions from orders table
-        open_orders = db.query(Order).filter(
-            Order.status == "TRADED",
-            Order.is_paper_trade == True
-        ).all()
-        return {"positions": [], "paper_trade": True, "message": "Paper trade mode active"}
+    if await _paper_mode(db):
+        from ..services.paper_broker import get_broker
+        broker = get_broker()
+        return {"positions": broker.positions(), "open_orders": broker.open_orders(), "paper_trade": True}
     try:
-        from ..services.dhan_client import get_dhan_client
-        client = get_dhan_client(db)
-        positions = client.get_positions()
+        from ..services import dhan_async
+        positions = await dhan_async.get_positions(db)
         return {"positions": positions, "paper_trade": False}
     except Exception as e:
         logger.error(f"Error fetching positions: {e}")
@@ -55,48 +75,45 @@ def get_positions(db: Session = Depends(get_db)):
 
 
 @router.get("/orders", response_model=List[OrderOut])
-def get_orders(
+async def get_orders(
     limit: int = 50,
     skip: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get orders history"""
-    orders = db.query(Order).order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
-    return orders
+    result = await db.execute(select(Order).order_by(Order.timestamp.desc()).offset(skip).limit(limit))
+    return result.scalars().all()
 
 
 @router.get("/pnl")
-def get_pnl(db: Session = Depends(get_db)):
-    """Get today's P&L summary"""
-    config = db.query(ConfigDhan).first()
-    today = date.today()
-    today_orders = db.query(Order).filter(
-        Order.status == "TRADED"
-    ).all()
-    total_pnl = sum(o.pnl or 0 for o in today_orders)
-    total_trades = len(today_orders)
-    winning_trades = sum(1 for o in today_orders if (o.pnl or 0) > 0)
+async def get_pnl(db: AsyncSession = Depends(get_async_db)):
+    """Get today's P&L summary (from the engine's exposure book)"""
+    from ..services.portfolio_risk import get_book
+    snapshot = get_book().snapshot()
+    total_trades = (await db.execute(
+        select(func.count(Order.id)).where(Order.status == "EXECUTED", Order.timestamp >= _today_start())
+    )).scalar_one()
+    realized = snapshot["realized_pnl"]
+    unrealized = snapshot["unrealized_pnl"]
     return {
-        "total_pnl": round(total_pnl, 2),
+        "total_pnl": round(realized + unrealized, 2),
+        "realized_pnl": round(realized, 2),
+        "unrealized_pnl": round(unrealized, 2),
         "total_trades": total_trades,
-        "winning_trades": winning_trades,
-        "losing_trades": total_trades - winning_trades,
-        "win_rate": round(winning_trades / total_trades * 100, 2) if total_trades > 0 else 0,
-        "paper_trade": config.paper_trade if config else True,
-        "date": str(today)
+        "paper_trade": await _paper_mode(db),
+        "date": str(date.today())
     }
 
 
 @router.get("/portfolio")
-def get_portfolio(db: Session = Depends(get_db)):
+async def get_portfolio(db: AsyncSession = Depends(get_async_db)):
     """Get portfolio holdings"""
-    config = db.query(ConfigDhan).first()
-    if not config or config.paper_trade:
+    config = await _first(db, ConfigDhan)
+    if not config or await _paper_mode(db):
         return {"holdings": [], "paper_trade": True}
     try:
-        from ..services.dhan_client import get_dhan_client
-        client = get_dhan_client(db)
-        holdings = client.get_holdings()
+        from ..services import dhan_async
+        holdings = await dhan_async.get_holdings(db)
         return {"holdings": holdings, "paper_trade": False}
     except Exception as e:
         logger.error(f"Error fetching portfolio: {e}")
@@ -104,17 +121,17 @@ def get_portfolio(db: Session = Depends(get_db)):
 
 
 @router.get("/funds")
-def get_funds(db: Session = Depends(get_db)):
+async def get_funds(db: AsyncSession = Depends(get_async_db)):
     """Get available funds"""
-    config = db.query(ConfigDhan).first()
+    config = await _first(db, ConfigDhan)
     if not config:
         raise HTTPException(status_code=404, detail="Config not found")
-    if config.paper_trade:
-        return {"available_balance": 100000, "used_margin": 0, "paper_trade": True}
+    if await _paper_mode(db):
+        from ..services.paper_broker import get_broker
+        return {**get_broker().account(), "paper_trade": True}
     try:
-        from ..services.dhan_client import get_dhan_client
-        client = get_dhan_client(db)
-        funds = client.get_fund_limits()
+        from ..services import dhan_async
+        funds = await dhan_async.get_fund_limits(db)
         return {"funds": funds, "paper_trade": False}
     except Exception as e:
         logger.error(f"Error fetching funds: {e}")
@@ -122,18 +139,151 @@ def get_funds(db: Session = Depends(get_db)):
 
 
 @router.get("/status")
-def get_system_status(db: Session = Depends(get_db)):
+async def get_system_status(db: AsyncSession = Depends(get_async_db)):
     """Get system status"""
     from ..workers.engine import get_scheduler_status
-    config = db.query(ConfigDhan).first()
-    active_strategies = db.query(Strategy).filter(Strategy.is_active == True).count()
-    total_orders_today = db.query(Order).filter(Order.status == "TRADED").count()
-    scheduler_status = get_scheduler_status()
+    config = await _first(db, ConfigDhan)
+    active_strategies = (await db.execute(
+        select(func.count(Strategy.id)).where(Strategy.is_enabled == True)
+    )).scalar_one()
+    total_orders_today = (await db.execute(
+        select(func.count(Order.id)).where(Order.status == "EXECUTED", Order.timestamp >= _today_start())
+    )).scalar_one()
     return {
-        "scheduler_running": scheduler_status,
+        "scheduler_running": get_scheduler_status(),
         "active_strategies": active_strategies,
         "orders_today": total_orders_today,
         "config_set": config is not None,
-        "paper_trade": config.paper_trade if config else True,
+        "paper_trade": await _paper_mode(db),
         "connected": config is not None
     }
+
+
+@router.get("/logs")
+async def get_logs(
+    level: Optional[str] = None,
+    source: Optional[str] = None,
+    since_minutes: int = 60,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Recent log entries. The time bound lets Postgres prune to the latest daily partitions."""
+    since = datetime.now(timezone.utc) - timedelta(minutes=since_minutes)
+    query = select(LogEntry).where(LogEntry.timestamp >= since)
+    if level:
+        query = query.where(LogEntry.level == level.upper())
+    if source:
+        query = query.where(LogEntry.source == source.upper())
+    entries = (await db.execute(query.order_by(LogEntry.timestamp.desc()).limit(min(limit, 1000)))).scalars().all()
+    return [
+        {
+            "id": e.id,
+            "timestamp": e.timestamp,
+            "level": e.level,
+            "source": e.source,
+            "message": e.message,
+            "extra": e.extra,
+        }
+        for e in entries
+    ]
+
+
+@router.get("/exposure")
+async def get_exposure():
+    """Portfolio exposure: gross/net, margin used and notional by symbol, sector and strategy"""
+    from ..services.portfolio_risk import get_book
+    return get_book().summary()
+
+
+@router.get("/broker-cache")
+async def get_broker_cache_stats():
+    """Hit/miss counters of the shared broker read cache"""
+    from ..services.broker_cache import get_cache
+    return get_cache().stats()
+
+
+@router.get("/topology")
+async def get_topology_stats():
+    """Version and reload count of the engine's cached strategy/watchlist/settings topology"""
+    from ..services.topology import get_cache
+    return get_cache().stats()
+
+
+@router.get("/strategy-runtime")
+async def get_strategy_runtime():
+    """Per-strategy on_bar CPU/memory accounting, overruns and quarantine state"""
+    from ..workers.strategy_pool import get_runner, IsolatedRunner
+    runner = get_runner()
+    return {"isolated": isinstance(runner, IsolatedRunner), "strategies": runner.snapshot()}
+
+
+@router.get("/accounts")
+async def get_accounts():
+    """Per-account exposure of the engine's trading accounts"""
+    from starlette.concurrency import run_in_threadpool
+    from ..db.base import SessionLocal
+    from ..services import accounts, topology
+
+    def load():
+        db = SessionLocal()
+        try:
+            return accounts.snapshot(topology.get(db))
+        finally:
+            db.close()
+
+    return {"accounts": await run_in_threadpool(load)}
+
+
+@router.get("/option-chains")
+async def get_option_chains(table: bool = False):
+    """IV, PCR, max pain and skew of each underlying's chain from the last chain refresh"""
+    from ..services.option_chain import latest
+    chains = []
+    for (exchange, security_id), analytics in latest().items():
+        entry = {"exchange": exchange, "security_id": security_id, **analytics.summary()}
+        if table:
+            frame = analytics.to_frame()
+            entry["strikes_table"] = frame.astype(object).where(frame.notna(), None).to_dict("records")
+        chains.append(entry)
+    return {"chains": chains}
+
+
+@router.get("/cross-section")
+async def get_cross_section(matrix: bool = False):
+    """Window and update counters of the cross-section, optionally with its return correlation matrix"""
+    from ..services.cross_section import get_cross_section
+    cross = get_cross_section()
+    out = cross.stats()
+    if matrix:
+        corr = cross.correlation()
+        out["correlation"] = corr.astype(object).where(corr.notna(), None).to_dict()
+    return out
+
+
+@router.get("/triggers")
+async def get_triggers():
+    """Open positions protected by the SL/target/trailing-stop monitor"""
+    from ..services.trigger_monitor import get_monitor, feed_running
+    return {"positions": get_monitor().snapshot(), "feed_running": feed_running()}
+
+
+@router.get("/journal")
+async def get_journal(day: Optional[date] = None):
+    """Writer counters of the market data / decision journal and the record counts of one day"""
+    from starlette.concurrency import run_in_threadpool
+    from ..services import journal
+    return {"writer": journal.stats(), "day": await run_in_threadpool(journal.summarize, day)}
+
+
+@router.get("/alerts")
+async def get_alerts():
+    """Counters of the Telegram alert dispatcher (null when alerting is not configured)"""
+    from ..services import alerts
+    return {"enabled": alerts.stats() is not None, "dispatcher": alerts.stats()}
+
+
+@router.get("/warmup")
+async def get_warmup():
+    """Instruments and load time of today's pre-open indicator warm-up"""
+    from ..services import warmup
+    return {"active": warmup.active() is not None, **warmup.get_history().stats()}
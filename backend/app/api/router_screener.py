@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from ..db.base import get_db
+from ..models.strategy import Strategy
+from pydantic import BaseModel
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/screener", tags=["screener"])
+
+
+class ScanRequest(BaseModel):
+    condition: Dict[str, Any]
+    exchange: str = "NSE"
+    timeframe: str = "1"  # "1" for minute bars, "D" for daily bars from the candle store
+    lookback: int = 200
+    universe: Optional[List[str]] = None  # security IDs; defaults to the whole universe
+    strategy_id: Optional[int] = None  # push hits into this strategy's watchlist
+    replace_watchlist: bool = False
+
+
+@router.post("/scan")
+def scan(request: ScanRequest, db: Session = Depends(get_db)):
+    """Scan the universe with a condition and optionally push hits into a watchlist"""
+    from ..services import screener
+    if request.lookback < 2 or request.lookback > 5000:
+        raise HTTPException(status_code=400, detail="lookback must be between 2 and 5000")
+    if request.strategy_id is not None:
+        strategy = db.query(Strategy).filter(Strategy.id == request.strategy_id).first()
+        if not strategy:
+            raise HTTPException(status_code=404, detail="Strategy not found")
+    try:
+        result = screener.scan(
+            request.condition,
+            exchange=request.exchange,
+            timeframe=request.timeframe,
+            lookback=request.lookback,
+            universe=request.universe,
+        )
+    except screener.ScreenerError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.strategy_id is not None:
+        result["watchlist"] = screener.push_to_watchlist(
+            db, request.strategy_id, result["hits"], replace=request.replace_watchlist
+        )
+    return result
+
+
+@router.get("/fields")
+def list_fields():
+    """Operands and operators supported by the condition DSL"""
+    from ..services import screener
+    return {
+        "fields": list(screener.FIELDS),
+        "indicators": [f"{name}(length)" for name in screener.INDICATORS],
+        "comparisons": list(screener.COMPARISONS.keys()),
+        "crosses": list(screener.CROSSES),
+        "logical": ["all", "any", "not"],
+        "example": {"all": [{"cross_above": ["ema(9)", "ema(21)"]}, {"gt": ["rsi(14)", 55]}]},
+    }
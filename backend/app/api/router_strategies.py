@@ -4,6 +4,7 @@ from typing import Optional, List
 from ..db.base import get_db
 from ..models.strategy import Strategy
 from ..models.config_dhan import ConfigDhan
+from ..services import topology
 from pydantic import BaseModel
 import logging
 
@@ -65,6 +66,7 @@ def create_strategy(strategy_data: StrategyCreate, db: Session = Depends(get_db)
     db.add(strategy)
     db.commit()
     db.refresh(strategy)
+    topology.notify(f"strategy {strategy.id} created")
     logger.info(f"Strategy created: {strategy.name} for {strategy.symbol}")
     return strategy
 
@@ -89,6 +91,7 @@ def update_strategy(strategy_id: int, strategy_data: StrategyUpdate, db: Session
         setattr(strategy, key, value)
     db.commit()
     db.refresh(strategy)
+    topology.notify(f"strategy {strategy.id} updated")
     logger.info(f"Strategy updated: {strategy.id}")
     return strategy
 
@@ -101,6 +104,7 @@ def delete_strategy(strategy_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Strategy not found")
     db.delete(strategy)
     db.commit()
+    topology.notify(f"strategy {strategy_id} deleted")
     logger.info(f"Strategy deleted: {strategy_id}")
     return {"message": "Strategy deleted"}
 
@@ -113,6 +117,7 @@ def toggle_strategy(strategy_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Strategy not found")
     strategy.is_active = not strategy.is_active
     db.commit()
+    topology.notify(f"strategy {strategy_id} toggled")
     status = "activated" if strategy.is_active else "deactivated"
     logger.info(f"Strategy {strategy_id} {status}")
     return {"id": strategy_id, "is_active": strategy.is_active, "status": status}
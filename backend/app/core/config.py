@@ -16,13 +16,117 @@ class Settings(BaseSettings):
     MARKET_CLOSE_HOUR: int = 15
     MARKET_CLOSE_MINUTE: int = 30
     TIMEZONE: str = "Asia/Kolkata"
+    PRE_OPEN_HOUR: int = 9
+    PRE_OPEN_MINUTE: int = 0
+    SQUARE_OFF_HOUR: int = 15  # no new intraday entries after this, open intraday positions are flattened
+    SQUARE_OFF_MINUTE: int = 15
+    CLOSING_SESSION_END_HOUR: int = 16
+    CLOSING_SESSION_END_MINUTE: int = 0
+    SPECIAL_SESSION_SQUARE_OFF_BUFFER_MINUTES: int = 15
+    MARKET_CALENDAR_FILE: Optional[str] = None  # defaults to app/data/nse_calendar.json
 
-    # Telegram alerts (optional)
+    # Async Dhan REST client used by the API routes
+    DHAN_API_BASE_URL: str = "https://api.dhan.co"
+    DHAN_HTTP_TIMEOUT_SECONDS: float = 10.0
+    DHAN_HTTP_MAX_CONNECTIONS: int = 20
+
+    # Parallel order submission when orders fan out to several accounts
+    ACCOUNT_FANOUT_WORKERS: int = 16
+
+    # Dashboard broker reads (positions, holdings, funds) are shared for this long
+    BROKER_CACHE_TTL_SECONDS: float = 3.0
+
+    # Telegram alerts (optional): orders, risk blocks, errors and the kill switch,
+    # coalesced into digests within Telegram's per-chat rate limits
     TELEGRAM_BOT_TOKEN: Optional[str] = None
     TELEGRAM_CHAT_ID: Optional[str] = None
+    TELEGRAM_API_BASE_URL: str = "https://api.telegram.org"  # point at a local fake endpoint in tests
+    TELEGRAM_MIN_LEVEL: str = "INFO"  # INFO, WARN, ERROR, CRITICAL
+    TELEGRAM_QUEUE_SIZE: int = 1000
+    TELEGRAM_COALESCE_SECONDS: float = 5.0
+    TELEGRAM_MIN_INTERVAL_SECONDS: float = 1.0
+    TELEGRAM_MAX_PER_MINUTE: int = 20
 
     # Paper trading mode
     PAPER_TRADING: bool = True
+    PAPER_SLIPPAGE_BPS: float = 5.0
+    PAPER_LATENCY_MS: float = 250.0
+    PAPER_FEE_PER_ORDER: float = 20.0
+
+    # Portfolio risk engine (percentages are of trading capital)
+    PAPER_CAPITAL: float = 100000.0
+    RISK_PER_TRADE_PCT: float = 1.0
+    RISK_ATR_MULTIPLIER: float = 1.5
+    MAX_SYMBOL_EXPOSURE_PCT: float = 20.0
+    MAX_SECTOR_EXPOSURE_PCT: float = 40.0
+    MAX_STRATEGY_EXPOSURE_PCT: float = 60.0
+    MAX_GROSS_EXPOSURE_PCT: float = 100.0
+    MAX_NET_EXPOSURE_PCT: float = 100.0
+    MAX_MARGIN_PCT: float = 100.0
+    INTRADAY_MARGIN_PCT: float = 20.0
+
+    # SL/target monitor: stream LTPs from the Dhan market feed in live mode
+    # (otherwise triggers are checked against each cycle's latest bar)
+    TRIGGER_FEED_ENABLED: bool = True
+
+    # Local historical candle store
+    DATA_DIR: str = "data"
+    HISTORY_DOWNLOAD_WORKERS: int = 8
+    # Pre-open warm-up: bars of earlier sessions (from the minute store) prepended to each
+    # live frame so indicators have their lookback from the first bar; 0 disables
+    WARMUP_BARS: int = 375
+    WARMUP_WORKERS: int = 16
+
+    # DB log sink: batching and retention of the logs table
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_BATCH_SIZE: int = 500
+    LOG_FLUSH_INTERVAL_SECONDS: float = 1.0
+    LOG_RETENTION_DAYS: int = 30
+    LOG_ARCHIVE_EXPIRED: bool = False  # detach old partitions instead of dropping them
+    LOG_PARTITION_DAYS_AHEAD: int = 3
+
+    # Engine topology (settings, strategies, watchlists, accounts) is cached; without
+    # Postgres LISTEN/NOTIFY triggers, direct DB edits are detected by polling this often
+    TOPOLOGY_POLL_SECONDS: float = 5.0
+
+    # Strategy isolation: each enabled strategy's on_bar runs in its own worker process,
+    # so a hung or runaway strategy is killed at its budget and cannot stall the cycle.
+    # Workers receive the cycle's indicators with the frame and hand back what they
+    # computed, so nothing is recomputed per process; the cost left is pickling across
+    # the pipe. Off, strategies run in-process with budgets only checked after the
+    # fact (overrunners are still quarantined), for profiling or trusted strategies.
+    STRATEGY_ISOLATION: bool = True
+    STRATEGY_CALL_BUDGET_MS: float = 2000.0         # one on_bar call; the worker is killed past it
+    STRATEGY_CYCLE_BUDGET_SECONDS: float = 20.0     # all of one strategy's symbols in a cycle
+    STRATEGY_QUARANTINE_AFTER: int = 3              # consecutive overruns/crashes before quarantine
+    STRATEGY_QUARANTINE_MINUTES: float = 15.0
+    STRATEGY_PRIORITY_WINDOW_MINUTES: float = 30.0  # recent signals put a strategy in the first tier
+    STRATEGY_MEMORY_LIMIT_MB: int = 0               # address-space cap per worker, 0 = none
+    STRATEGY_MAX_PARALLEL: int = 8
+
+    # Append-only journal of fetched bars, ticks, intents, risk decisions and order events
+    # under DATA_DIR/journal, as zlib-compressed blocks in per-day segment files
+    JOURNAL_ENABLED: bool = True
+    JOURNAL_QUEUE_SIZE: int = 100000
+    JOURNAL_BLOCK_BYTES: int = 262144
+    JOURNAL_SEGMENT_BYTES: int = 67108864
+    JOURNAL_FLUSH_INTERVAL_SECONDS: float = 1.0
+    JOURNAL_COMPRESSION_LEVEL: int = 1
+
+    # Option chains (Dhan v2 REST) and F&O instruments
+    DHAN_SCRIP_MASTER_URL: str = "https://images.dhan.co/api-data/api-scrip-master.csv"
+    OPTION_CHAIN_MIN_INTERVAL_SECONDS: float = 3.0  # Dhan rate-limits chain requests
+    OPTION_CHAIN_REFRESH_SECONDS: float = 30.0      # background refresh of the cycle's underlyings
+    OPTIONS_RISK_FREE_RATE: float = 0.065
+
+    # Rolling window (bars) of the cross-section given to uses_cross_section strategies
+    CROSS_SECTION_WINDOW: int = 375
+
+    # Walk-forward / Monte Carlo robustness analysis
+    ROBUSTNESS_WORKERS: int = 4
+
+    # On-demand profiling artifacts
+    PROFILE_DIR: str = "logs/profiles"
 
     class Config:
         env_file = ".env"
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
 
@@ -11,6 +13,33 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+
+def _async_url(url: str) -> str:
+    """Same database through an asyncio driver (asyncpg for Postgres, aiosqlite for SQLite)"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    elif parsed.get_backend_name() == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+def _async_pool_args(url: str) -> dict:
+    # aiosqlite runs on a NullPool/StaticPool, which rejects queue-pool sizing
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {"pool_size": 10, "max_overflow": 20}
+
+
+# Used by the async API routes; the engine and scheduler keep the sync engine
+async_engine = create_async_engine(
+    _async_url(settings.DATABASE_URL),
+    pool_pre_ping=True,
+    **_async_pool_args(settings.DATABASE_URL)
+)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -20,3 +49,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,13 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import logging
 import os
 
-from app.db.base import engine, Base
-from app.api import router_config, router_strategies, router_dashboard, router_control
+from app.db.base import engine, async_engine, Base
+from app.api import router_config, router_strategies, router_dashboard, router_control, router_screener, router_charts
 from app.workers.engine import start_scheduler, stop_scheduler
+from app.services import metrics, log_sink, dhan_async, journal, alerts
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,12 +22,20 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Dhan Algo Terminal...")
     Base.metadata.create_all(bind=engine)
+    log_sink.start()
+    journal.start()
+    alerts.start()
     start_scheduler()
     logger.info("Scheduler started.")
     yield
     # Shutdown
     stop_scheduler()
     logger.info("Scheduler stopped.")
+    await dhan_async.close_all()
+    await async_engine.dispose()
+    alerts.stop()
+    journal.stop()
+    log_sink.stop()
 
 
 app = FastAPI(
@@ -45,17 +54,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Routers
-app.include_router(router_config.router, prefix="/api/config", tags=["config"])
-app.include_router(router_strategies.router, prefix="/api/strategies", tags=["strategies"])
-app.include_router(router_dashboard.router, prefix="/api/dashboard", tags=["dashboard"])
-app.include_router(router_control.router, prefix="/api/control", tags=["control"])
-
-# Serve frontend static files (if built)
-if os.path.exists("/app/static"):
-    app.mount("/", StaticFiles(directory="/app/static", html=True), name="static")
+# Routers (each router carries its own /<name> prefix)
+app.include_router(router_config.router, prefix="/api", tags=["config"])
+app.include_router(router_strategies.router, prefix="/api", tags=["strategies"])
+app.include_router(router_dashboard.router, prefix="/api", tags=["dashboard"])
+app.include_router(router_control.router, prefix="/api", tags=["control"])
+app.include_router(router_screener.router, prefix="/api", tags=["screener"])
+app.include_router(router_charts.router, prefix="/api", tags=["charts"])
 
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "ok", "service": "dhan-algo-terminal"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    payload, content_type = metrics.render_latest()
+    return Response(content=payload, media_type=content_type)
+
+
+# Serve frontend static files (if built). Mounted last so "/" doesn't shadow API routes.
+if os.path.exists("/app/static"):
+    app.mount("/", StaticFiles(directory="/app/static", html=True), name="static")
@@ -1,17 +1,30 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime
 from app.db.base import Base
 from datetime import datetime, timezone
 
 
 class ConfigDhan(Base):
+    """
+    One Dhan trading account. The first row is the primary account: it supplies
+    market data and the live feed, and strategies are risk-checked against it.
+    Every other enabled row receives its own sizing of the same orders.
+    """
     __tablename__ = "config_dhan"
 
     id = Column(Integer, primary_key=True, index=True, default=1)
+    name = Column(String(50), nullable=True)
     client_id = Column(String, nullable=False, default="")
     api_key = Column(String, nullable=True)
     api_secret = Column(String, nullable=True)
     access_token = Column(String, nullable=True)
     token_expiry = Column(DateTime, nullable=True)
+    is_enabled = Column(Boolean, default=True)  # only consulted for non-primary accounts
+    capital = Column(Float, nullable=True)  # None = broker's start-of-day limit
+    qty_multiplier = Column(Float, default=1.0)  # scales this account's risk-sized entries (secondary accounts)
+    # Risk limit overrides; None = global settings
+    max_daily_loss_pct = Column(Float, nullable=True)
+    max_positions = Column(Integer, nullable=True)
+    max_capital_per_trade_pct = Column(Float, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
                         onupdate=lambda: datetime.now(timezone.utc))
@@ -1,4 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, Text, ForeignKey, JSON, Index
+from sqlalchemy import PrimaryKeyConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 from datetime import datetime, timezone
@@ -9,6 +12,7 @@ class Order(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     strategy_id = Column(Integer, ForeignKey("strategies.id"), nullable=True)
+    account_id = Column(Integer, ForeignKey("config_dhan.id"), nullable=True, index=True)  # None = primary
     symbol = Column(String(50), nullable=False)
     exchange = Column(String(10), default="NSE")
     side = Column(String(10), nullable=False)  # BUY or SELL
@@ -30,15 +34,46 @@ class Order(Base):
     strategy = relationship("Strategy", back_populates="orders")
 
 
+class PartitionKeyPrimaryKey(PrimaryKeyConstraint):
+    """
+    Primary key that Postgres DDL extends with the partition key column(s), which a
+    partitioned table's PK must include. Other dialects (and the ORM identity) keep
+    the plain key, so SQLite can still autoincrement a single-column id.
+    """
+
+    def __init__(self, *columns, partition_columns=(), **kw):
+        super().__init__(*columns, **kw)
+        self.partition_columns = tuple(partition_columns)
+
+
+@compiles(PartitionKeyPrimaryKey)
+def _compile_primary_key(constraint, compiler, **kw):
+    return compiler.visit_primary_key_constraint(constraint, **kw)
+
+
+@compiles(PartitionKeyPrimaryKey, "postgresql")
+def _compile_partitioned_primary_key(constraint, compiler, **kw):
+    names = [compiler.preparer.quote(c.name) for c in constraint.columns]
+    names += [compiler.preparer.quote(name) for name in constraint.partition_columns]
+    return f"PRIMARY KEY ({', '.join(names)})"
+
+
 class LogEntry(Base):
     __tablename__ = "logs"
+    # On Postgres the table is range-partitioned by day; partitions are created
+    # and expired by app.services.log_sink. The partition key joins the PK there only.
+    __table_args__ = (
+        PartitionKeyPrimaryKey("id", partition_columns=("timestamp",)),
+        Index("ix_logs_level_timestamp", "level", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), autoincrement=True)
+    timestamp = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), index=True)
     level = Column(String(10), default="INFO")  # INFO, WARN, ERROR
     source = Column(String(50), default="ENGINE")  # ENGINE, API, STRATEGY, DHAN
     message = Column(Text, nullable=False)
-    extra = Column(Text, nullable=True)  # JSON string for extra data
+    extra = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"), nullable=True)
 
 
 class GlobalSettings(Base):
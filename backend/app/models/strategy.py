@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, JSON
+from sqlalchemy import Column, Integer, String, Boolean, Text, JSON, ForeignKey
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -23,7 +23,7 @@ class WatchlistItem(Base):
     __tablename__ = "watchlist_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    strategy_id = Column(Integer, nullable=False)
+    strategy_id = Column(Integer, ForeignKey("strategies.id"), nullable=False)
     symbol = Column(String(50), nullable=False)
     exchange = Column(String(10), default="NSE")  # NSE or BSE
     security_id = Column(String(50), nullable=True)  # Dhan security ID
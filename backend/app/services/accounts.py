@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional
+from sqlalchemy.orm import Session
+from app.models.config_dhan import ConfigDhan
+from app.models.order import GlobalSettings
+from app.models.strategy import Strategy
+from app.core.config import settings
+from app.services import portfolio_risk
+from app.services.risk_manager import is_paper_trading
+from app.services.instruments import get_master
+from app.services.topology import Topology
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AccountOrder(NamedTuple):
+    """One account's share of a TradeIntent"""
+    strategy: Strategy
+    intent: object             # TradeIntent; its qty is the primary account's
+    account: Optional[ConfigDhan]  # None = primary
+    qty: int
+
+
+def fan_out_active(gs: Optional[GlobalSettings], topo: Topology) -> bool:
+    """Orders fan out in live mode once a second account is enabled"""
+    return not is_paper_trading(gs) and bool(topo.secondary_accounts)
+
+
+def allocate(db: Session, gs: GlobalSettings, topo: Topology, strategy: Strategy, intent) -> List[AccountOrder]:
+    """
+    The primary order as risk-approved, plus each secondary account's own sizing of
+    the same intent: its book, capital and limits size the entry (so quantities
+    scale with capital), then its qty_multiplier and the lot size apply. Exits
+    close whatever that account holds.
+    """
+    orders = [AccountOrder(strategy, intent, None, intent.qty)]
+    if not fan_out_active(gs, topo):
+        return orders
+    lot = get_master().lot_size(intent.exchange, intent.security_id)
+    for account in topo.secondary_accounts:
+        try:
+            book = portfolio_risk.get_account_book(db, account.id)
+            limits = portfolio_risk.load_limits(gs, portfolio_risk.get_capital(db, gs, account), account)
+            decision = book.check_batch([intent], limits)[0]
+        except Exception as e:
+            logger.error(f"Sizing {intent} for account {account.name or account.client_id} failed: {e}")
+            continue
+        qty = decision.qty
+        if decision.approved and not intent.is_exit:
+            qty = int(qty * (account.qty_multiplier or 1.0))
+        qty -= qty % lot
+        if not decision.approved or qty <= 0:
+            logger.info(f"Trade skipped for {intent.symbol} on account {account.name or account.client_id}: "
+                        f"{decision.reason if not decision.approved else 'sized below one lot'}")
+            continue
+        orders.append(AccountOrder(strategy, intent, account, qty))
+    return orders
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ACCOUNT_FANOUT_WORKERS,
+                                           thread_name_prefix="order-fanout")
+    return _executor
+
+
+def submit(orders: List[AccountOrder], place: Callable[[AccountOrder], dict]) -> List[dict]:
+    """
+    Place all accounts' orders at once, so the batch costs about one broker round
+    trip rather than one per account. Results come back in the orders' order;
+    `place` runs on pool threads and must not touch the caller's session.
+    """
+    if len(orders) <= 1:
+        return [place(order) for order in orders]
+    futures = [_get_executor().submit(place, order) for order in orders]
+    results = []
+    for order, future in zip(orders, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.error(f"Order for account {order.account.name if order.account else 'primary'} failed: {e}")
+            results.append({"success": False, "error": str(e)})
+    return results
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def snapshot(topo: Topology) -> list:
+    """Accounts with their exposure books (secondary books exist once they have traded)"""
+    books = portfolio_risk.account_books()
+    rows = []
+    for account in ([topo.dhan] if topo.dhan else []) + topo.secondary_accounts:
+        primary = account is topo.dhan
+        book = portfolio_risk.get_book() if primary else books.get(account.id)
+        rows.append({
+            "id": account.id, "name": account.name, "client_id": account.client_id, "primary": primary,
+            "capital": account.capital, "qty_multiplier": account.qty_multiplier,
+            "exposure": book.summary() if book is not None else None,
+        })
+    return rows
@@ -0,0 +1,214 @@
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+from app.core.config import settings
+from collections import Counter, deque
+import threading
+import logging
+import httpx
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+LEVELS = {"INFO": 0, "WARN": 1, "ERROR": 2, "CRITICAL": 3}
+_ICONS = {"INFO": "ℹ️", "WARN": "⚠️", "ERROR": "❗", "CRITICAL": "🛑"}
+MAX_MESSAGE_CHARS = 4096  # Telegram's limit for one message
+MAX_DIGEST_LINES = 40
+
+
+class Alert(NamedTuple):
+    ts: float
+    level: str
+    category: str  # order, risk, error, kill_switch, ...
+    text: str
+
+
+def render(alerts: List[Alert]) -> str:
+    """One alert as is; a burst as a digest with per-category counts, newest lines kept"""
+    if len(alerts) == 1:
+        a = alerts[0]
+        return f"{_ICONS.get(a.level, '')} [{a.category}] {a.text}"[:MAX_MESSAGE_CHARS]
+    counts = Counter(a.category for a in alerts)
+    worst = max(alerts, key=lambda a: LEVELS.get(a.level, 0)).level
+    header = (f"{_ICONS.get(worst, '')} {len(alerts)} alerts: "
+              + ", ".join(f"{n} {category}" for category, n in counts.most_common()))
+    shown = alerts[-MAX_DIGEST_LINES:]
+    lines = [header]
+    if len(alerts) > len(shown):
+        lines.append(f"... {len(alerts) - len(shown)} earlier alerts omitted")
+    lines.extend(f"{datetime.fromtimestamp(a.ts):%H:%M:%S} {a.level} [{a.category}] {a.text}" for a in shown)
+    text = "\n".join(lines)
+    if len(text) > MAX_MESSAGE_CHARS:
+        text = text[:MAX_MESSAGE_CHARS - 4] + "\n..."
+    return text
+
+
+class AlertDispatcher:
+    """
+    Telegram alerts kept off the trading path. emit() only enqueues on a bounded
+    queue and drops (and counts) when it is full. A background thread waits
+    `coalesce_seconds` after the first alert of a burst and sends everything
+    pending as one digest; sends are spaced to stay within the per-chat rate
+    limits, and alerts arriving meanwhile join the next digest. A CRITICAL alert
+    skips the coalescing wait (not the rate limit).
+    """
+
+    def __init__(self, base_url: str, token: str, chat_id: str, maxsize: int, coalesce_seconds: float,
+                 min_interval: float, max_per_minute: int, min_level: str = "INFO", timeout: float = 10.0):
+        self.chat_id = chat_id
+        self._path = f"/bot{token}/sendMessage"
+        self._http = httpx.Client(base_url=base_url, timeout=timeout)
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._coalesce = coalesce_seconds
+        self._min_interval = min_interval
+        self._max_per_minute = max_per_minute
+        self._min_level = LEVELS.get(min_level, 0)
+        self._sent_at: deque = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self.emitted = 0
+        self.dropped = 0
+        self.messages = 0
+        self.failed = 0
+
+    def emit(self, level: str, category: str, text: str):
+        if LEVELS.get(level, 0) < self._min_level:
+            return
+        try:
+            self._queue.put_nowait(Alert(time.time(), level, category, text))
+            self.emitted += 1
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Alert queue full, {self.dropped} alerts dropped so far")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="alerts", daemon=True)
+        self._thread.start()
+        logger.info("Telegram alerts started")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        pending = self._drain([])
+        if pending:
+            self._send(pending)
+        self._http.close()
+        logger.info("Telegram alerts stopped")
+
+    def _drain(self, pending: List[Alert]) -> List[Alert]:
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                return pending
+
+    def _next_slot(self) -> float:
+        """Earliest time the next message may go out"""
+        now = time.monotonic()
+        while self._sent_at and self._sent_at[0] <= now - 60:
+            self._sent_at.popleft()
+        slot = self._sent_at[-1] + self._min_interval if self._sent_at else now
+        if len(self._sent_at) >= self._max_per_minute:
+            slot = max(slot, self._sent_at[0] + 60)
+        return slot
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                pending = [self._queue.get(timeout=1.0)]
+            except queue.Empty:
+                continue
+            critical = pending[0].level == "CRITICAL"
+            deadline = max(time.monotonic() + (0 if critical else self._coalesce), self._next_slot())
+            while not self._stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    alert = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(alert)
+                if alert.level == "CRITICAL" and not critical:
+                    critical = True
+                    deadline = self._next_slot()
+            self._send(self._drain(pending))
+
+    def _send(self, alerts: List[Alert]):
+        text = render(alerts)
+        for _ in range(3):
+            wait = self._next_slot() - time.monotonic()
+            if wait > 0:
+                # Returns at once on shutdown, so the final digest is not held back
+                self._stop_event.wait(wait)
+            self._sent_at.append(time.monotonic())
+            try:
+                response = self._http.post(self._path, json={"chat_id": self.chat_id, "text": text,
+                                                             "disable_web_page_preview": True})
+            except httpx.HTTPError as e:
+                logger.warning(f"Telegram send failed: {e}")
+                continue
+            if response.status_code == 429:
+                # Flood control: Telegram says how long to back off
+                try:
+                    retry_after = float(response.json()["parameters"]["retry_after"])
+                except (ValueError, KeyError, TypeError):
+                    retry_after = 5.0
+                logger.warning(f"Telegram rate limited, retrying in {retry_after}s")
+                self._stop_event.wait(retry_after)
+                continue
+            if response.is_success:
+                self.messages += 1
+                return
+            logger.warning(f"Telegram send rejected ({response.status_code}): {response.text[:200]}")
+            break
+        self.failed += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"emitted": self.emitted, "dropped": self.dropped, "queued": self._queue.qsize(),
+                "messages": self.messages, "failed": self.failed}
+
+
+_dispatcher: Optional[AlertDispatcher] = None
+
+
+def start():
+    """Start alerting if a bot token and chat id are configured"""
+    global _dispatcher
+    if not settings.TELEGRAM_BOT_TOKEN or not settings.TELEGRAM_CHAT_ID:
+        logger.info("Telegram alerts disabled: TELEGRAM_BOT_TOKEN / TELEGRAM_CHAT_ID not set")
+        return
+    if _dispatcher is None:
+        _dispatcher = AlertDispatcher(
+            base_url=settings.TELEGRAM_API_BASE_URL,
+            token=settings.TELEGRAM_BOT_TOKEN,
+            chat_id=settings.TELEGRAM_CHAT_ID,
+            maxsize=settings.TELEGRAM_QUEUE_SIZE,
+            coalesce_seconds=settings.TELEGRAM_COALESCE_SECONDS,
+            min_interval=settings.TELEGRAM_MIN_INTERVAL_SECONDS,
+            max_per_minute=settings.TELEGRAM_MAX_PER_MINUTE,
+            min_level=settings.TELEGRAM_MIN_LEVEL,
+        )
+    _dispatcher.start()
+
+
+def stop():
+    global _dispatcher
+    if _dispatcher is not None:
+        _dispatcher.stop()
+        _dispatcher = None
+
+
+def emit(level: str, category: str, text: str):
+    """Queue an alert; a no-op when alerting is off. Never blocks."""
+    if _dispatcher is not None:
+        _dispatcher.emit(level, category, text)
+
+
+def stats() -> Optional[Dict[str, int]]:
+    return _dispatcher.stats() if _dispatcher is not None else None
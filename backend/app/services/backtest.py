@@ -0,0 +1,146 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+from app.core.config import settings
+from app.services.paper_broker import PaperBroker, bar_timestamps
+from app.services.candle_store import get_store
+from app.services import candles
+from app.strategies.registry import get_strategy_class
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Regular NSE session: 09:15-15:30
+SESSION_MINUTES = 375
+TRADING_DAYS = 252
+
+
+class BacktestResult(NamedTuple):
+    equity: np.ndarray       # mark-to-market equity at each simulated bar's close
+    trade_pnls: np.ndarray   # net PnL (after fees) of each closed round trip
+    stats: Dict[str, float]
+
+
+def bars_per_year(timeframe: str) -> float:
+    if timeframe.upper() == "D":
+        return float(TRADING_DAYS)
+    return SESSION_MINUTES / max(int(timeframe), 1) * TRADING_DAYS
+
+
+def load_frame(exchange: str, security_id: str, timeframe: str = "1", start=None, end=None) -> pd.DataFrame:
+    """Candle store range as the same typed frame the live engine hands strategies"""
+    cols = get_store().read(exchange, security_id, start, end, timeframe)
+    # Copied out of the read-only memory maps so strategies may write to the frame
+    return candles.to_frame({name: np.array(values) for name, values in cols.items()})
+
+
+def performance(equity: np.ndarray, trade_pnls: np.ndarray, periods_per_year: float) -> Dict[str, float]:
+    """Return, drawdown and Sharpe of an equity curve plus per-trade statistics"""
+    stats = {"total_return": 0.0, "max_drawdown": 0.0, "sharpe": 0.0, "trades": int(len(trade_pnls)),
+             "win_rate": 0.0, "profit_factor": 0.0}
+    if len(equity) >= 2 and equity[0] > 0:
+        stats["total_return"] = float(equity[-1] / equity[0] - 1)
+        peaks = np.maximum.accumulate(equity)
+        stats["max_drawdown"] = float(((peaks - equity) / peaks).max())
+        returns = np.diff(equity) / equity[:-1]
+        std = returns.std(ddof=1)
+        if std > 0:
+            stats["sharpe"] = float(returns.mean() / std * np.sqrt(periods_per_year))
+    if len(trade_pnls):
+        wins = trade_pnls[trade_pnls > 0]
+        losses = trade_pnls[trade_pnls < 0]
+        stats["win_rate"] = float(len(wins) / len(trade_pnls))
+        # None when there are no losing trades (unbounded)
+        stats["profit_factor"] = float(wins.sum() / -losses.sum()) if len(losses) else None
+    return stats
+
+
+def run_backtest(module_name: str, params: Optional[Dict[str, Any]], df: pd.DataFrame,
+                 symbol: str = "BACKTEST", exchange: str = "NSE", security_id: str = "",
+                 capital: Optional[float] = None, periods_per_year: Optional[float] = None,
+                 trade_from: int = 0, lookback: int = 300, min_bars: int = 5) -> BacktestResult:
+    """
+    Replay a frame bar by bar through a registered strategy and the paper broker's fill model.
+    Bars before `trade_from` are history only (indicator warm-up); equity and trades
+    are measured from there on. Each on_bar sees at most `lookback` bars.
+    """
+    cls = get_strategy_class(module_name)
+    if cls is None:
+        raise ValueError(f"Unknown strategy: {module_name}")
+    capital = capital or settings.PAPER_CAPITAL
+    strategy = cls(config={"exchange": exchange, "security_id": security_id, "product": "INTRADAY"},
+                   params=params or {})
+
+    n = len(df)
+    ts = bar_timestamps(df)
+    if ts is None:
+        ts = np.arange(n, dtype=np.int64) * 60
+    o = df["open"].to_numpy(dtype=np.float64)
+    h = df["high"].to_numpy(dtype=np.float64)
+    l = df["low"].to_numpy(dtype=np.float64)
+    c = df["close"].to_numpy(dtype=np.float64)
+
+    clock = [0.0]
+    broker = PaperBroker(cash=capital, slippage_bps=settings.PAPER_SLIPPAGE_BPS, latency_ms=0,
+                         fee_per_order=settings.PAPER_FEE_PER_ORDER, clock=lambda: clock[0])
+    trade_from = max(trade_from, min_bars - 1)
+    equity = np.full(max(n - trade_from, 0), capital, dtype=np.float64)
+    trades: List[float] = []
+    fee = settings.PAPER_FEE_PER_ORDER
+    trade_open = None  # (realized PnL, fees paid) when the current position was opened
+
+    def record(fills, qty: int):
+        """Close/open round trips along the fills of one bar, starting from position `qty`"""
+        nonlocal trade_open
+        position = broker._positions[(exchange, symbol)]
+        for k, fill in enumerate(fills):
+            fees_before = broker.fees - fee * (len(fills) - k)
+            new_qty = qty + (fill.qty if fill.side == "BUY" else -fill.qty)
+            if trade_open is not None and qty != 0 and (new_qty == 0 or (new_qty > 0) != (qty > 0)):
+                realized, fees = trade_open
+                trades.append(position.realized_pnl - realized - (fees_before + fee - fees))
+                trade_open = None
+            if new_qty != 0 and trade_open is None:
+                trade_open = (position.realized_pnl, fees_before)
+            qty = new_qty
+
+    def held() -> int:
+        position = broker._positions.get((exchange, symbol))
+        return position.qty if position else 0
+
+    for i in range(n):
+        qty = held()
+        fills = broker.on_bar(exchange, symbol, int(ts[i]), o[i], h[i], l[i], c[i])
+        if fills:
+            record(fills, qty)
+            if held() == 0 and any(f.oco_group for f in fills):
+                strategy.on_position_closed(symbol)
+        if i < trade_from:
+            continue
+
+        clock[0] = float(ts[i]) + 1  # orders become eligible from the next bar's open
+        window = df.iloc[max(0, i + 1 - lookback):i + 1]
+        for intent in strategy.on_bar(symbol, window):
+            if intent.is_exit:
+                # The strategy closes by itself: its working bracket goes away
+                for order in list(broker._pending.get((exchange, symbol), [])):
+                    broker.cancel(order.order_id)
+            broker.submit(symbol=symbol, exchange=exchange, side=intent.side, qty=intent.qty,
+                          order_type=intent.order_type, price=intent.price, product=intent.product,
+                          security_id=security_id, sl=None if intent.is_exit else intent.sl,
+                          target=None if intent.is_exit else intent.target, reason=intent.reason)
+
+        equity[i - trade_from] = broker.cash + held() * c[i]
+
+    if n:
+        clock[0] = float(ts[-1]) + 1
+        qty = held()
+        final = broker.flatten(None)
+        if final:
+            record(final, qty)
+        if len(equity):
+            equity[-1] = broker.cash
+
+    trade_pnls = np.asarray(trades, dtype=np.float64)
+    stats = performance(equity, trade_pnls, periods_per_year or bars_per_year("1"))
+    return BacktestResult(equity, trade_pnls, stats)
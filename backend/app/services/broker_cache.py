@@ -0,0 +1,140 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from app.core.config import settings
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-progress load that concurrent callers of the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """
+    Short-lived cache for broker reads with single-flight loading.
+    Concurrent misses on one key share a single loader call; invalidation bumps a
+    generation counter so a load that started before it is returned to its
+    waiters but never stored.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._async_flights: Dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                if flight.error is None and generation == self._generation:
+                    self._entries[key] = (time.monotonic() + self.ttl, flight.value)
+            flight.done.set()
+        return flight.value
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """get_or_load for coroutine loaders; waiters await the leader's future instead of blocking a thread"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            flight = self._async_flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._async_flights[key] = asyncio.get_running_loop().create_future()
+                generation = self._generation
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return await asyncio.shield(flight)
+
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            with self._lock:
+                self._async_flights.pop(key, None)
+            flight.cancel()
+            raise
+        except Exception as e:
+            with self._lock:
+                self._async_flights.pop(key, None)
+            flight.set_exception(e)
+            # Retrieved here so a failure nobody else awaited is not reported as "never retrieved"
+            flight.exception()
+            raise
+        with self._lock:
+            self._async_flights.pop(key, None)
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        flight.set_result(value)
+        return value
+
+    def invalidate(self, *keys: Hashable):
+        """Drop the given keys, or everything when called without keys"""
+        with self._lock:
+            self._generation += 1
+            if keys:
+                for key in keys:
+                    self._entries.pop(key, None)
+            else:
+                self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ttl": self.ttl, "entries": len(self._entries), "in_flight": len(self._flights) + len(self._async_flights),
+                    "hits": self.hits, "misses": self.misses, "shared": self.shared}
+
+
+_cache: Optional[TTLCache] = None
+
+
+def get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        _cache = TTLCache(settings.BROKER_CACHE_TTL_SECONDS)
+    return _cache
+
+
+def invalidate(*keys: Hashable):
+    get_cache().invalidate(*keys)
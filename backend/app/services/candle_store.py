@@ -0,0 +1,238 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterable, List, Optional, Union
+from app.core.config import settings
+from app.services.market_calendar import get_calendar
+import numpy as np
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# One raw little-endian file per column, appended in time order. Raw files
+# (rather than compressed blocks) are what make reads zero-copy: a range read
+# is two binary searches on the ts column and slices of the memory maps.
+COLUMNS = {
+    "ts": np.dtype("<i8"),       # epoch seconds (UTC)
+    "open": np.dtype("<f4"),
+    "high": np.dtype("<f4"),
+    "low": np.dtype("<f4"),
+    "close": np.dtype("<f4"),
+    "volume": np.dtype("<i8"),
+}
+
+# Dhan's intraday start_Time counts seconds from 1980-01-01 00:00 IST
+DHAN_EPOCH_OFFSET = 315513000
+
+TimeLike = Union[int, float, datetime, date, None]
+
+
+def _to_epoch(value: TimeLike) -> Optional[int]:
+    """Epoch seconds; naive datetimes and dates are exchange-local time, not the host's"""
+    if value is None:
+        return None
+    if not isinstance(value, datetime) and isinstance(value, date):
+        value = datetime(value.year, value.month, value.day)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = get_calendar().tz.localize(value)
+        return int(value.timestamp())
+    return int(value)
+
+
+def _column(values, dtype: np.dtype) -> np.ndarray:
+    """One C-level conversion; only a column holding nulls takes the slow path (NaN / 0 volume)"""
+    try:
+        return np.asarray(values, dtype=dtype)
+    except (TypeError, ValueError):
+        floats = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        if dtype.kind == "i":
+            floats = np.nan_to_num(floats)
+        return floats.astype(dtype)
+
+
+def columns_from_dhan(data: dict) -> Dict[str, np.ndarray]:
+    """Convert Dhan's column-oriented candle response to store columns"""
+    if "start_Time" in data:
+        ts = _column(data["start_Time"], COLUMNS["ts"]) + DHAN_EPOCH_OFFSET
+    else:
+        ts = _column(data.get("timestamp", []), np.dtype(np.float64)).astype(COLUMNS["ts"])
+    return {
+        "ts": ts,
+        "open": _column(data.get("open", []), COLUMNS["open"]),
+        "high": _column(data.get("high", []), COLUMNS["high"]),
+        "low": _column(data.get("low", []), COLUMNS["low"]),
+        "close": _column(data.get("close", []), COLUMNS["close"]),
+        "volume": np.nan_to_num(_column(data.get("volume", []), np.dtype(np.float64))).astype(COLUMNS["volume"]),
+    }
+
+
+class CandleStore:
+    """
+    Append-only OHLCV store, one directory per (timeframe, exchange, security_id):
+        <root>/<timeframe>/<exchange>/<security_id>/{ts,open,high,low,close,volume}.bin
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._maps: Dict[str, tuple] = {}  # dir -> (ts file size, {col: memmap})
+        self._write_lock = threading.Lock()
+
+    def _dir(self, exchange: str, security_id: str, timeframe: str) -> str:
+        return os.path.join(self.root, timeframe, exchange, str(security_id))
+
+    def _rows_on_disk(self, path: str) -> int:
+        """Rows fully written across all columns (a crash mid-append leaves ragged columns)"""
+        rows = None
+        for col, dtype in COLUMNS.items():
+            file = os.path.join(path, f"{col}.bin")
+            n = os.path.getsize(file) // dtype.itemsize if os.path.exists(file) else 0
+            rows = n if rows is None else min(rows, n)
+        return rows or 0
+
+    def append(self, exchange: str, security_id: str, columns: Dict[str, np.ndarray],
+               timeframe: str = "1") -> int:
+        """Append bars newer than the last stored bar; re-ingesting a day is a no-op"""
+        ts = np.asarray(columns["ts"], dtype=COLUMNS["ts"])
+        if ts.size == 0:
+            return 0
+        path = self._dir(exchange, security_id, timeframe)
+        with self._write_lock:
+            os.makedirs(path, exist_ok=True)
+            rows = self._rows_on_disk(path)
+            last = self.last_timestamp(exchange, security_id, timeframe) if rows else None
+            order = np.argsort(ts, kind="stable")
+            ts = ts[order]
+            keep = np.ones(ts.size, dtype=bool)
+            keep[1:] = ts[1:] != ts[:-1]
+            if last is not None:
+                keep &= ts > last
+            if not keep.any():
+                return 0
+            for col, dtype in COLUMNS.items():
+                values = np.asarray(columns[col])[order][keep].astype(dtype, copy=False)
+                file = os.path.join(path, f"{col}.bin")
+                with open(file, "ab") as f:
+                    f.truncate(rows * dtype.itemsize)  # drop any partial tail from an interrupted append
+                    f.write(values.tobytes())
+            self._maps.pop(path, None)
+        return int(keep.sum())
+
+    def _open(self, path: str) -> Optional[Dict[str, np.ndarray]]:
+        ts_file = os.path.join(path, "ts.bin")
+        if not os.path.exists(ts_file):
+            return None
+        size = os.path.getsize(ts_file)
+        cached = self._maps.get(path)
+        if cached and cached[0] == size:
+            return cached[1]
+        rows = self._rows_on_disk(path)
+        if rows == 0:
+            return None
+        maps = {
+            col: np.memmap(os.path.join(path, f"{col}.bin"), dtype=dtype, mode="r", shape=(rows,))
+            for col, dtype in COLUMNS.items()
+        }
+        self._maps[path] = (size, maps)
+        return maps
+
+    def read(self, exchange: str, security_id: str, start: TimeLike = None, end: TimeLike = None,
+             timeframe: str = "1") -> Dict[str, np.ndarray]:
+        """Bars with start <= ts < end as read-only memmap views (no copy)"""
+        maps = self._open(self._dir(exchange, security_id, timeframe))
+        if maps is None:
+            return {col: np.empty(0, dtype=dtype) for col, dtype in COLUMNS.items()}
+        ts = maps["ts"]
+        lo = 0 if start is None else int(np.searchsorted(ts, _to_epoch(start), side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, _to_epoch(end), side="left"))
+        return {col: arr[lo:hi] for col, arr in maps.items()}
+
+    def tail(self, exchange: str, security_id: str, bars: int, timeframe: str = "1") -> Dict[str, np.ndarray]:
+        """Last `bars` bars as memmap views"""
+        maps = self._open(self._dir(exchange, security_id, timeframe))
+        if maps is None:
+            return {col: np.empty(0, dtype=dtype) for col, dtype in COLUMNS.items()}
+        return {col: arr[-bars:] for col, arr in maps.items()}
+
+    def last_timestamp(self, exchange: str, security_id: str, timeframe: str = "1") -> Optional[int]:
+        maps = self._open(self._dir(exchange, security_id, timeframe))
+        if maps is None:
+            return None
+        return int(maps["ts"][-1])
+
+    def version(self, exchange: str, security_id: str, timeframe: str = "1") -> Optional[tuple]:
+        """(rows, last ts) of an instrument: changes whenever bars are appended"""
+        maps = self._open(self._dir(exchange, security_id, timeframe))
+        if maps is None:
+            return None
+        return len(maps["ts"]), int(maps["ts"][-1])
+
+    def instruments(self, exchange: str, timeframe: str = "1") -> List[str]:
+        path = os.path.join(self.root, timeframe, exchange)
+        if not os.path.isdir(path):
+            return []
+        return sorted(os.listdir(path))
+
+
+_store: Optional[CandleStore] = None
+
+
+def get_store() -> CandleStore:
+    global _store
+    if _store is None:
+        _store = CandleStore(os.path.join(settings.DATA_DIR, "candles"))
+    return _store
+
+
+def ingest_intraday(db, items: Iterable) -> int:
+    """Append today's minute bars for watchlist items; run after the close"""
+    from app.services import dhan_client
+    store = get_store()
+    total = 0
+    for item in items:
+        security_id = item.security_id or item.symbol
+        try:
+            data = dhan_client.get_intraday_data(db=db, security_id=security_id, exchange=item.exchange)
+            if data:
+                total += store.append(item.exchange, security_id, columns_from_dhan(data), timeframe="1")
+        except Exception as e:
+            logger.error(f"Candle ingestion failed for {item.symbol}: {e}")
+    logger.info(f"Ingested {total} minute bars")
+    return total
+
+
+def download_history(items: Iterable, days: int = 365, workers: int = None) -> dict:
+    """Bulk download daily bars for many instruments in parallel"""
+    from app.db.base import SessionLocal
+    from app.services import dhan_client
+    store = get_store()
+    to_date = date.today()
+    from_date = to_date - timedelta(days=days)
+    items = list(items)
+
+    def _one(item) -> int:
+        security_id = item.security_id or item.symbol
+        db = SessionLocal()
+        try:
+            data = dhan_client.get_historical_daily_data(
+                db=db, symbol=item.symbol, exchange=item.exchange,
+                from_date=from_date.isoformat(), to_date=to_date.isoformat()
+            )
+            if not data:
+                return 0
+            return store.append(item.exchange, security_id, columns_from_dhan(data), timeframe="D")
+        finally:
+            db.close()
+
+    results = {"instruments": len(items), "bars": 0, "failed": []}
+    with ThreadPoolExecutor(max_workers=workers or settings.HISTORY_DOWNLOAD_WORKERS) as pool:
+        futures = {pool.submit(_one, item): item for item in items}
+        for future, item in futures.items():
+            try:
+                results["bars"] += future.result()
+            except Exception as e:
+                logger.error(f"History download failed for {item.symbol}: {e}")
+                results["failed"].append(item.symbol)
+    logger.info(f"History download: {results['bars']} daily bars for {len(items)} instruments")
+    return results
@@ -0,0 +1,64 @@
+from typing import Dict, Optional
+from app.core.config import settings
+from app.services.candle_store import COLUMNS, columns_from_dhan
+import pandas as pd
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Typed OHLCV frames as strategies see them: the candle store's compact dtypes
+# (float32 prices, int64 volume) indexed by a tz-aware DatetimeIndex over the
+# epoch-second ts column. Frames wrap the column arrays without copying them.
+FRAME_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def sanitize(cols: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Equal-length columns with strictly increasing ts. Monotonicity is checked in one
+    vectorized pass; only a response that fails it is sorted, keeping the last
+    version of a repeated bar.
+    """
+    n = min(len(values) for values in cols.values())
+    if any(len(values) != n for values in cols.values()):
+        logger.warning(f"Ragged candle columns truncated to {n} bars")
+        cols = {name: values[:n] for name, values in cols.items()}
+    ts = cols["ts"]
+    if n > 1 and not (ts[1:] > ts[:-1]).all():
+        order = np.argsort(ts, kind="stable")
+        ordered = ts[order]
+        keep = np.ones(n, dtype=bool)
+        keep[:-1] = ordered[1:] != ordered[:-1]
+        rows = order[keep]
+        cols = {name: values[rows] for name, values in cols.items()}
+    return cols
+
+
+def to_frame(cols: Dict[str, np.ndarray], tz: str = settings.TIMEZONE) -> pd.DataFrame:
+    """Candle columns (store layout) as a frame; arrays of the store dtypes are not copied"""
+    ts = np.asarray(cols["ts"], dtype=COLUMNS["ts"])
+    index = pd.DatetimeIndex(ts.view("M8[s]"), name="ts").tz_localize("UTC").tz_convert(tz)
+    data = {name: np.asarray(cols[name], dtype=COLUMNS[name]) for name in FRAME_COLUMNS}
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def empty_frame() -> pd.DataFrame:
+    return to_frame({name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()})
+
+
+def from_dhan(data: Optional[dict]) -> pd.DataFrame:
+    """Dhan's column-oriented candle response as a typed, time-indexed frame"""
+    if not data:
+        return empty_frame()
+    try:
+        return to_frame(sanitize(columns_from_dhan(data)))
+    except (KeyError, TypeError, ValueError) as e:
+        logger.error(f"Candle conversion error: {e}")
+        return empty_frame()
+
+
+def epoch_seconds(df: pd.DataFrame) -> Optional[np.ndarray]:
+    """Epoch seconds of each bar of a typed frame (None for frames without a time index)"""
+    if isinstance(df.index, pd.DatetimeIndex):
+        return df.index.as_unit("s").asi8
+    return None
@@ -0,0 +1,209 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.services import candles
+from app.services.candle_store import get_store
+from app.services.market_calendar import get_calendar
+from app.strategies import indicators
+import pandas as pd
+import numpy as np
+import hashlib
+import struct
+import json
+import re
+
+# Same operand syntax as the screener: ema(9), sma(20,volume), rsi(14), atr(14)
+_INDICATOR_RE = re.compile(r"^(ema|sma|rsi|atr)\((\d+)(?:,(open|high|low|close|volume))?\)$")
+MAX_OVERLAYS = 8
+MAX_WIDTH = 5000
+
+# Binary columnar payload:
+#   b"DCOL" | u32 header length | header (JSON: {"columns": [{"name", "dtype", "length"}], ...meta})
+#   | each column's little-endian values in header order, each starting at the next
+#     8-byte aligned offset of the payload (so a browser can wrap them in typed arrays)
+BINARY_MAGIC = b"DCOL"
+BINARY_MEDIA_TYPE = "application/vnd.dhan-algo.columns"
+
+
+class ChartError(ValueError):
+    pass
+
+
+def to_epoch(value: Optional[datetime]) -> Optional[int]:
+    """Naive datetimes are exchange-local time"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = get_calendar().tz.localize(value)
+    return int(value.timestamp())
+
+
+def default_range(timeframe: str, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+    """
+    Missing bounds: up to now, one day of minute bars or a year of daily bars. "Now"
+    is rounded up to the bar boundary so the range (and ETag) is stable within a bar.
+    """
+    step = 86400 if timeframe == "D" else 60
+    if end is None:
+        end = (int(get_calendar().clock()) // step + 1) * step
+    return (start if start is not None else end - 365 * step if timeframe == "D" else end - 1440 * step), end
+
+
+def ohlc_buckets(cols: Dict[str, np.ndarray], width: int) -> Dict[str, np.ndarray]:
+    """
+    At most `width` candles, each merging consecutive bars (first open, highest high,
+    lowest low, last close, summed volume), so every spike and gap stays visible
+    """
+    n = len(cols["ts"])
+    if n <= width:
+        return {name: np.asarray(values) for name, values in cols.items()}
+    size = -(-n // width)
+    starts = np.arange(0, n, size)
+    ends = np.minimum(starts + size, n) - 1
+    return {
+        "ts": np.asarray(cols["ts"])[starts],
+        "open": np.asarray(cols["open"])[starts],
+        "high": np.maximum.reduceat(cols["high"], starts),
+        "low": np.minimum.reduceat(cols["low"], starts),
+        "close": np.asarray(cols["close"])[ends],
+        "volume": np.add.reduceat(cols["volume"], starts),
+    }
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets: per bucket, the
+    point forming the largest triangle with the previous pick and the next
+    bucket's average, which keeps peaks, troughs and the line's overall shape.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bounds = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    bounds = np.append(bounds, n)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        next_lo, next_hi = bounds[i + 1], bounds[i + 2]
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def indicator(spec: str, frame: pd.DataFrame) -> pd.Series:
+    key = spec.replace(" ", "").lower()
+    match = _INDICATOR_RE.match(key)
+    if not match:
+        raise ChartError(f"Unknown indicator: {spec!r}")
+    name, length, field = match.group(1), int(match.group(2)), match.group(3) or "close"
+    if not 1 <= length <= 1000:
+        raise ChartError(f"Indicator length must be between 1 and 1000: {spec!r}")
+    series = frame[field].astype(np.float64)
+    if name == "ema":
+        return indicators.ema(series, length)
+    if name == "sma":
+        return indicators.sma(series, length)
+    if name == "rsi":
+        return indicators.rsi(frame["close"].astype(np.float64), length)
+    return indicators.atr(frame.astype(np.float64), length)
+
+
+def _lookback(specs: Sequence[str]) -> int:
+    """Bars read ahead of the range so overlays are warmed up at its first bar"""
+    lengths = [int(m.group(2)) for m in (_INDICATOR_RE.match(s.replace(" ", "").lower()) for s in specs) if m]
+    return 5 * max(lengths) if lengths else 0
+
+
+def candle_version(exchange: str, security_id: str, timeframe: str) -> tuple:
+    return get_store().version(exchange, security_id, timeframe) or (0, 0)
+
+
+def candle_chart(exchange: str, security_id: str, timeframe: str, start: int, end: int,
+                 width: int, overlays: Sequence[str] = ()) -> Tuple[Dict[str, np.ndarray], Dict[str, Dict[str, np.ndarray]]]:
+    """OHLCV of [start, end) bucketed to `width` candles, and each overlay reduced to `width` points"""
+    if len(overlays) > MAX_OVERLAYS:
+        raise ChartError(f"At most {MAX_OVERLAYS} overlays")
+    for spec in overlays:
+        if not _INDICATOR_RE.match(spec.replace(" ", "").lower()):
+            raise ChartError(f"Unknown indicator: {spec!r}")
+    store = get_store()
+    cols = store.read(exchange, security_id, None, end, timeframe)  # memmap views, no copy
+    first = int(np.searchsorted(cols["ts"], start, side="left"))
+    lookback = min(_lookback(overlays), first)
+    ohlcv = {name: values[first:] for name, values in cols.items()}
+    series = {}
+    if overlays and len(ohlcv["ts"]):
+        frame = candles.to_frame({name: values[first - lookback:] for name, values in cols.items()})
+        x = ohlcv["ts"]
+        for spec in overlays:
+            values = indicator(spec, frame).to_numpy(dtype=np.float64)[lookback:]
+            valid = np.flatnonzero(~np.isnan(values))
+            keep = valid[lttb(x[valid], values[valid], width)]
+            series[spec] = {"ts": x[keep], "value": values[keep]}
+    return ohlc_buckets(ohlcv, width), series
+
+
+def equity_chart(rows: List[tuple], width: int) -> Dict[str, np.ndarray]:
+    """(timestamp, equity, realized, unrealized) rows reduced to `width` points by LTTB on equity"""
+    if not rows:
+        return {name: np.empty(0) for name in ("ts", "equity", "realized_pnl", "unrealized_pnl")}
+    ts = np.array([(t if t.tzinfo else t.replace(tzinfo=timezone.utc)).timestamp() for t, *_ in rows], dtype=np.int64)
+    values = np.array([row[1:] for row in rows], dtype=np.float64)
+    equity = values[:, 0]
+    valid = np.flatnonzero(~np.isnan(equity))
+    keep = valid[lttb(ts[valid], equity[valid], width)]
+    return {"ts": ts[keep], "equity": equity[keep],
+            "realized_pnl": values[keep, 1], "unrealized_pnl": values[keep, 2]}
+
+
+def etag(*parts) -> str:
+    return '"' + hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip().removeprefix("W/") for c in if_none_match.split(",")]
+    return tag in candidates or "*" in candidates
+
+
+# Wire dtypes: epoch seconds fit u4 until 2106, chart values need no more than f4
+_WIRE = {"ts": np.dtype("<u4")}
+
+
+def _wire(name: str, values: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=_WIRE.get(name, np.dtype("<f4")))
+
+
+def to_json(columns: Dict[str, np.ndarray]) -> Dict[str, list]:
+    """Columnar JSON; floats rounded to what a chart can show"""
+    out = {}
+    for name, values in columns.items():
+        if name == "ts":
+            out[name] = np.asarray(values, dtype=np.int64).tolist()
+        else:
+            rounded = np.round(np.asarray(values, dtype=np.float64), 4)
+            out[name] = [None if v != v else v for v in rounded.tolist()]
+    return out
+
+
+def to_binary(columns: Dict[str, np.ndarray], meta: dict) -> bytes:
+    """Pack named columns (possibly of different lengths) into the DCOL layout"""
+    arrays = [(name, _wire(name.rsplit(".", 1)[-1], values)) for name, values in columns.items()]
+    header = json.dumps({**meta, "columns": [{"name": name, "dtype": arr.dtype.str, "length": len(arr)}
+                                             for name, arr in arrays]}).encode()
+    parts = [BINARY_MAGIC, struct.pack("<I", len(header)), header]
+    offset = len(BINARY_MAGIC) + 4 + len(header)
+    for _, arr in arrays:
+        pad = -offset % 8
+        parts.append(b"\0" * pad)
+        data = arr.tobytes()
+        parts.append(data)
+        offset += pad + len(data)
+    return b"".join(parts)
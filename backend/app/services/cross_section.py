@@ -0,0 +1,294 @@
+from datetime import date, datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.services import metrics
+from app.services.market_calendar import get_calendar
+import pandas as pd
+import numpy as np
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+InstrumentKey = Tuple[str, str]  # (exchange, security_id)
+
+
+def _session_day(ts: int) -> date:
+    return datetime.fromtimestamp(ts, get_calendar().tz).date()
+
+
+class RollingMoments:
+    """
+    Sum and sum of outer products of the last `window` N-vectors. Pushing a bar is
+    O(N^2) (add the new outer product, subtract the one leaving the window); the sums
+    are recomputed exactly from the ring buffer once per window to shed rounding drift.
+    """
+
+    def __init__(self, window: int, n: int):
+        self.window = window
+        self._buf = np.zeros((window, n))
+        self._count = 0
+        self._head = 0  # next slot to write
+        self._since_resync = 0
+        self.s1 = np.zeros(n)
+        self.s2 = np.zeros((n, n))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _swap(self, slot: int, x: np.ndarray):
+        old = self._buf[slot]
+        self.s1 += x - old
+        self.s2 += np.outer(x, x) - np.outer(old, old)
+        self._buf[slot] = x
+
+    def push(self, x: np.ndarray):
+        if self._count < self.window:
+            self._count += 1
+        self._swap(self._head, x)  # empty slots hold zeros, so the subtraction is a no-op
+        self._head = (self._head + 1) % self.window
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            self.resync()
+
+    def replace_last(self, x: np.ndarray):
+        """Overwrite the newest vector (a bar that was still forming when pushed)"""
+        if self._count:
+            self._swap((self._head - 1) % self.window, x)
+
+    def last(self, back: int = 0) -> np.ndarray:
+        return self._buf[(self._head - 1 - back) % self.window]
+
+    def resync(self):
+        rows = self._buf[:self._count] if self._count < self.window else self._buf
+        self.s1 = rows.sum(axis=0)
+        self.s2 = rows.T @ rows
+        self._since_resync = 0
+
+    def mean(self) -> np.ndarray:
+        return self.s1 / max(self._count, 1)
+
+    def cov(self) -> np.ndarray:
+        n = self._count
+        if n < 2:
+            return np.full_like(self.s2, np.nan)
+        m = self.s1 / n
+        return (self.s2 - n * np.outer(m, m)) / (n - 1)
+
+    def cov_row(self, i: int) -> np.ndarray:
+        """Row i of cov() in O(N)"""
+        n = self._count
+        if n < 2:
+            return np.full(len(self.s1), np.nan)
+        return (self.s2[i] - self.s1[i] * self.s1 / n) / (n - 1)
+
+    def variances(self) -> np.ndarray:
+        n = self._count
+        if n < 2:
+            return np.full(len(self.s1), np.nan)
+        return (np.diagonal(self.s2) - self.s1 * self.s1 / n) / (n - 1)
+
+
+class Peer(NamedTuple):
+    symbol: str
+    exchange: str
+    security_id: str
+    close: float
+    correlation: float  # of bar returns over the window
+    beta: float         # hedge ratio: log(this) ~ alpha + beta * log(peer)
+    zscore: float       # current residual of that regression over its rolling std
+
+
+class CrossSectionView:
+    """One instrument's row of the cross-section, as handed to a strategy's on_bar"""
+
+    def __init__(self, symbol: str, ts: int, bars: int, symbols: Tuple[str, ...],
+                 keys: Tuple[InstrumentKey, ...], close: np.ndarray, correlation: np.ndarray,
+                 covariance: np.ndarray, beta: np.ndarray, zscore: np.ndarray):
+        self.symbol = symbol
+        self.ts = ts
+        self.bars = bars
+        self.symbols = symbols
+        self.keys = keys
+        self.close = close
+        self.correlation = correlation
+        self.covariance = covariance
+        self.beta = beta
+        self.zscore = zscore
+
+    def peer(self, symbol: str) -> Optional[Peer]:
+        try:
+            j = self.symbols.index(symbol)
+        except ValueError:
+            return None
+        if self.symbols[j] == self.symbol:
+            return None
+        return Peer(symbol, self.keys[j][0], self.keys[j][1], float(self.close[j]),
+                    float(self.correlation[j]), float(self.beta[j]), float(self.zscore[j]))
+
+    def peers(self, min_correlation: float = -1.0) -> List[Peer]:
+        """Other instruments by descending return correlation"""
+        order = np.argsort(-np.nan_to_num(self.correlation, nan=-2.0))
+        out = []
+        for j in order:
+            if self.symbols[j] == self.symbol or not (self.correlation[j] >= min_correlation):
+                continue
+            out.append(self.peer(self.symbols[j]))
+        return out
+
+
+class CrossSection:
+    """
+    Rolling cross-sectional statistics of a universe of instruments, advanced one
+    bar at a time: log-price moments (hedge ratios and cointegration spreads of
+    every pair) and return moments (covariance and correlation). The first update
+    after a universe change or on a new session seeds the window from the cycle's
+    frames; later bars are O(N^2) incremental updates instead of an
+    O(window * N^2) recompute.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.keys: Tuple[InstrumentKey, ...] = ()
+        self.symbols: Tuple[str, ...] = ()
+        self._index: Dict[InstrumentKey, int] = {}
+        self._levels: Optional[RollingMoments] = None
+        self._returns: Optional[RollingMoments] = None
+        self._shift = np.zeros(0)  # log prices at seeding; keeps the level sums small
+        self._last_close = np.zeros(0)
+        self.ts: Optional[int] = None
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.seeds = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def bars(self) -> int:
+        return len(self._returns) if self._returns is not None else 0
+
+    def _seed(self, universe: Dict[InstrumentKey, str], frames: Dict[InstrumentKey, pd.DataFrame]):
+        self.keys = tuple(universe)
+        self.symbols = tuple(universe.values())
+        self._index = {key: i for i, key in enumerate(self.keys)}
+        n = len(self.keys)
+        closes = pd.concat([frames[key]["close"].astype(np.float64).rename(i) for i, key in enumerate(self.keys)],
+                           axis=1).sort_index().ffill().bfill().tail(self.window + 1)
+        log_prices = np.log(closes.to_numpy())
+        self._shift = log_prices[0].copy()
+        self._levels = RollingMoments(self.window, n)
+        self._returns = RollingMoments(self.window, n)
+        levels = log_prices - self._shift
+        for row in levels[-self.window:]:
+            self._levels.push(row)
+        for row in np.diff(levels, axis=0):
+            self._returns.push(row)
+        self._last_close = closes.to_numpy()[-1].copy()
+        self.ts = int(closes.index[-1].timestamp())
+        self.seeds += 1
+
+    def update(self, universe: Dict[InstrumentKey, str], frames: Dict[InstrumentKey, pd.DataFrame]):
+        """
+        Advance to the newest bar of `frames` (typed candle frames per instrument). A bar
+        with the timestamp of the last update replaces it, since it was still forming;
+        an instrument without a bar this time carries its last close forward. A bar
+        from another session than the last update (the next day, or an earlier day
+        being replayed) reseeds instead of extending the old window.
+        """
+        universe = {key: symbol for key, symbol in universe.items() if key in frames}
+        if not universe:
+            return
+        with self._lock:
+            if tuple(universe) != self.keys:
+                self._seed(universe, frames)
+                return
+            ts = max(int(frames[key].index[-1].timestamp()) for key in self.keys)
+            if self.ts is not None and _session_day(ts) != _session_day(self.ts):
+                self._seed(universe, frames)
+                return
+            if self.ts is not None and ts < self.ts:
+                return
+            close = self._last_close.copy()
+            for i, key in enumerate(self.keys):
+                df = frames[key]
+                if int(df.index[-1].timestamp()) == ts:
+                    close[i] = float(df["close"].iloc[-1])
+            level = np.log(close) - self._shift
+            if ts == self.ts:
+                previous = self._levels.last(1) if len(self._levels) > 1 else level
+                self._levels.replace_last(level)
+                self._returns.replace_last(level - previous)
+            else:
+                self._returns.push(level - self._levels.last())
+                self._levels.push(level)
+            self._last_close = close
+            self.ts = ts
+            self.updates += 1
+
+    def view(self, key: InstrumentKey) -> Optional[CrossSectionView]:
+        """Correlations, covariances, hedge ratios and spread z-scores of one instrument against the rest"""
+        with self._lock:
+            i = self._index.get(key)
+            if i is None or self._levels is None:
+                return None
+            cov_r = self._returns.cov_row(i)
+            var_r = self._returns.variances()
+            cov_p = self._levels.cov_row(i)
+            var_p = self._levels.variances()
+            mean_p = self._levels.mean()
+            level = self._levels.last()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = cov_r / np.sqrt(var_r[i] * var_r)
+            beta = cov_p / var_p
+            residual_var = var_p[i] - beta * cov_p
+            spread = (level[i] - mean_p[i]) - beta * (level - mean_p)
+            zscore = spread / np.sqrt(residual_var)
+        zscore[i] = np.nan
+        return CrossSectionView(self.symbols[i], self.ts, self.bars, self.symbols, self.keys,
+                                self._last_close.copy(), correlation, cov_r, beta, zscore)
+
+    def correlation(self) -> pd.DataFrame:
+        """Full return correlation matrix (O(N^2); for the dashboard, not the cycle)"""
+        with self._lock:
+            if self._returns is None:
+                return pd.DataFrame()
+            cov = self._returns.cov()
+        sd = np.sqrt(np.diagonal(cov))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.outer(sd, sd)
+        return pd.DataFrame(corr, index=list(self.symbols), columns=list(self.symbols))
+
+    def stats(self) -> dict:
+        return {"instruments": len(self.keys), "bars": self.bars, "window": self.window,
+                "ts": self.ts, "updates": self.updates, "seeds": self.seeds}
+
+
+_cross_section: Optional[CrossSection] = None
+
+
+def get_cross_section() -> CrossSection:
+    global _cross_section
+    if _cross_section is None:
+        _cross_section = CrossSection(settings.CROSS_SECTION_WINDOW)
+    return _cross_section
+
+
+def refresh(items: Sequence, frame: Callable[[str, str], Optional[pd.DataFrame]]) -> Optional[CrossSection]:
+    """Advance the shared cross-section over watchlist `items` with this cycle's frames"""
+    universe: Dict[InstrumentKey, str] = {}
+    for item in items:
+        universe.setdefault((item.exchange, str(item.security_id or item.symbol)), item.symbol)
+    frames = {}
+    for key in universe:
+        df = frame(*key)
+        if df is not None and len(df) and isinstance(df.index, pd.DatetimeIndex):
+            frames[key] = df
+    if len(frames) < 2:
+        return None
+    start = time.perf_counter()
+    cross_section = get_cross_section()
+    cross_section.update(universe, frames)
+    metrics.STAGE_CROSS_SECTION.observe(time.perf_counter() - start)
+    return cross_section
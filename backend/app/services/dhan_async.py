@@ -0,0 +1,136 @@
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.config_dhan import ConfigDhan
+from app.core.config import settings
+from app.services import metrics, broker_cache
+import httpx
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDhanClient:
+    """
+    Non-blocking Dhan REST client for the API process.
+    Responses are wrapped like dhanhq's ({"status", "remarks", "data"}) so callers
+    can treat both clients the same way.
+    """
+
+    def __init__(self, client_id: str, access_token: str, base_url: Optional[str] = None,
+                 timeout: Optional[float] = None, max_connections: Optional[int] = None):
+        self.client_id = client_id
+        self._http = httpx.AsyncClient(
+            base_url=base_url or settings.DHAN_API_BASE_URL,
+            headers={
+                "access-token": access_token,
+                "client-id": client_id,
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            },
+            timeout=timeout or settings.DHAN_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=max_connections or settings.DHAN_HTTP_MAX_CONNECTIONS),
+        )
+
+    async def _request(self, endpoint: str, method: str, path: str, **kwargs) -> dict:
+        start = time.perf_counter()
+        try:
+            response = await self._http.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            metrics.DHAN_REQUEST_ERRORS.labels(endpoint).inc()
+            raise
+        finally:
+            metrics.DHAN_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        if response.is_success:
+            return {"status": "success", "remarks": "", "data": body}
+        metrics.DHAN_REQUEST_ERRORS.labels(endpoint).inc()
+        return {"status": "failure", "remarks": body, "data": ""}
+
+    async def get_fund_limits(self) -> dict:
+        return await self._request("fund_limits", "GET", "/fundlimit")
+
+    async def get_positions(self) -> dict:
+        return await self._request("positions", "GET", "/positions")
+
+    async def get_holdings(self) -> dict:
+        return await self._request("holdings", "GET", "/holdings")
+
+    async def get_order_list(self) -> dict:
+        return await self._request("order_list", "GET", "/orders")
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+_clients: Dict[Tuple[str, str], AsyncDhanClient] = {}
+
+
+async def get_client(db: AsyncSession) -> Optional[AsyncDhanClient]:
+    """Pooled client for the configured credentials; a new token gets a new client"""
+    cfg = (await db.execute(select(ConfigDhan).order_by(ConfigDhan.id).limit(1))).scalar_one_or_none()
+    if cfg is None or not cfg.client_id or not cfg.access_token:
+        logger.warning("Dhan credentials not configured")
+        return None
+    key = (cfg.client_id, cfg.access_token)
+    client = _clients.get(key)
+    if client is None:
+        for stale in [k for k in _clients if k[0] == cfg.client_id]:
+            await _clients.pop(stale).aclose()
+        client = _clients[key] = AsyncDhanClient(cfg.client_id, cfg.access_token)
+    return client
+
+
+async def _cached_read(db: AsyncSession, endpoint: str, read) -> dict:
+    """Async counterpart of dhan_client._cached_read; shares its cache keys and TTL"""
+    client = await get_client(db)
+    if client is None:
+        raise RuntimeError("Dhan not configured")
+
+    async def load():
+        result = await read(client)
+        if result.get("status") == "failure":
+            raise RuntimeError(result.get("remarks") or result)
+        return result
+
+    return await broker_cache.get_cache().aget_or_load((endpoint, client.client_id), load)
+
+
+def _data(result) -> list:
+    if isinstance(result, dict) and "data" in result:
+        return result["data"] or []
+    return []
+
+
+async def get_fund_limits(db: AsyncSession) -> dict:
+    try:
+        return await _cached_read(db, "fund_limits", lambda c: c.get_fund_limits())
+    except Exception as e:
+        logger.error(f"get_fund_limits error: {e}")
+        return {}
+
+
+async def get_positions(db: AsyncSession) -> list:
+    try:
+        return _data(await _cached_read(db, "positions", lambda c: c.get_positions()))
+    except Exception as e:
+        logger.error(f"get_positions error: {e}")
+        return []
+
+
+async def get_holdings(db: AsyncSession) -> list:
+    try:
+        return _data(await _cached_read(db, "holdings", lambda c: c.get_holdings()))
+    except Exception as e:
+        logger.error(f"get_holdings error: {e}")
+        return []
+
+
+async def close_all():
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()
@@ -1,20 +1,24 @@
 from dhanhq import dhanhq
 from sqlalchemy.orm import Session
-from app.models.order import LogEntry, GlobalSettings
+from app.models.order import GlobalSettings
 from app.models.config_dhan import ConfigDhan
-from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
 from app.core.config import settings
+from app.services import metrics, log_sink, broker_cache, topology
+from app.services.instruments import get_master
+from app.services.risk_manager import is_paper_trading
 import logging
-import json
+import time
 
 logger = logging.getLogger(__name__)
 
-_dhan_instance = None
+# account id -> (credentials, dhanhq instance)
+_instances: Dict[int, Tuple[tuple, dhanhq]] = {}
 
 
 def get_dhan_config_from_db(db: Session) -> ConfigDhan:
     """Get Dhan config from DB (first row)"""
-    config = db.query(ConfigDhan).first()
+    config = db.query(ConfigDhan).order_by(ConfigDhan.id).first()
     if not config:
         config = ConfigDhan(id=1, client_id="")
         db.add(config)
@@ -23,64 +27,141 @@ def get_dhan_config_from_db(db: Session) -> ConfigDhan:
     return config
 
 
-def get_dhan_instance(db: Session):
-    """Get authenticated dhanhq instance"""
-    global _dhan_instance
-    cfg = get_dhan_config_from_db(db)
-    if not cfg.client_id or not cfg.access_token:
+def get_dhan_instance(db: Session, account: Optional[ConfigDhan] = None):
+    """
+    Authenticated dhanhq instance of `account` (default: the primary account),
+    pooled per account and reused until its credentials change
+    """
+    cfg = account if account is not None else topology.get(db).dhan
+    if cfg is None or not cfg.client_id or not cfg.access_token:
         logger.warning("Dhan credentials not configured")
         return None
+    credentials = (cfg.client_id, cfg.access_token)
+    cached = _instances.get(cfg.id)
+    if cached is not None and cached[0] == credentials:
+        return cached[1]
     try:
-        _dhan_instance = dhanhq(cfg.client_id, cfg.access_token)
-        return _dhan_instance
+        instance = dhanhq(*credentials)
+        instance.base_url = settings.DHAN_API_BASE_URL
+        _instances[cfg.id] = (credentials, instance)
+        return instance
     except Exception as e:
-        logger.error(f"Error creating Dhan instance: {e}")
+        logger.error(f"Error creating Dhan instance for account {cfg.name or cfg.client_id}: {e}")
         return None
 
 
+def _call(endpoint: str, fn, *args, **kwargs):
+    """Invoke a dhanhq method, recording latency and errors per endpoint"""
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception:
+        metrics.DHAN_REQUEST_ERRORS.labels(endpoint).inc()
+        raise
+    finally:
+        metrics.DHAN_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+    # dhanhq reports most API errors as {"status": "failure"} instead of raising
+    if isinstance(result, dict) and result.get("status") == "failure":
+        metrics.DHAN_REQUEST_ERRORS.labels(endpoint).inc()
+    return result
+
+
+_SEGMENTS = {
+    "NSE": dhanhq.NSE,
+    "BSE": dhanhq.BSE,
+    "NFO": dhanhq.NSE_FNO,
+    "BFO": dhanhq.BSE_FNO,
+    "IDX": dhanhq.INDEX,
+}
+_PRODUCTS = {
+    "INTRADAY": dhanhq.INTRA,
+    "CNC": dhanhq.CNC,
+    "MARGIN": dhanhq.MARGIN,  # carry-forward F&O (NRML)
+    "NRML": dhanhq.MARGIN,
+}
+
+
+def _segment(exchange: str) -> str:
+    """Dhan exchange segment of an exchange code (NSE, BSE, NFO, BFO, IDX)"""
+    return _SEGMENTS.get(exchange, dhanhq.NSE)
+
+
+def _product(product: str) -> str:
+    return _PRODUCTS.get(product, dhanhq.CNC)
+
+
 def test_connection(db: Session) -> dict:
     """Test connection by calling get_fund_limits"""
     dhan = get_dhan_instance(db)
     if not dhan:
         return {"success": False, "error": "Dhan not configured"}
     try:
-        result = dhan.get_fund_limits()
+        result = _call("fund_limits", dhan.get_fund_limits)
         return {"success": True, "data": result}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def get_fund_limits(db: Session) -> dict:
-    dhan = get_dhan_instance(db)
-    if not dhan:
-        return {}
+def _cached_read(db: Session, endpoint: str, read, account: Optional[ConfigDhan] = None):
+    """
+    Account read shared through the broker cache: at most one Dhan call per key
+    and TTL window, however many dashboards poll. Failures raise and are not cached.
+    """
+    cfg = account if account is not None else topology.get(db).dhan
+
+    def load():
+        dhan = get_dhan_instance(db, cfg)
+        if not dhan:
+            raise RuntimeError("Dhan not configured")
+        result = _call(endpoint, read, dhan)
+        if isinstance(result, dict) and result.get("status") == "failure":
+            raise RuntimeError(result.get("remarks") or result)
+        return result
+
+    return broker_cache.get_cache().get_or_load((endpoint, cfg.client_id if cfg else ""), load)
+
+
+def _data(result) -> list:
+    if isinstance(result, dict) and "data" in result:
+        return result["data"] or []
+    return []
+
+
+def invalidate_account_cache():
+    """Drop cached positions, holdings and funds after the account changed"""
+    broker_cache.invalidate()
+
+
+def get_fund_limits(db: Session, account: Optional[ConfigDhan] = None) -> dict:
     try:
-        return dhan.get_fund_limits()
+        return _cached_read(db, "fund_limits", lambda dhan: dhan.get_fund_limits(), account)
     except Exception as e:
         logger.error(f"get_fund_limits error: {e}")
         return {}
 
 
-def get_positions(db: Session) -> list:
-    dhan = get_dhan_instance(db)
-    if not dhan:
-        return []
+def get_positions(db: Session, account: Optional[ConfigDhan] = None) -> list:
     try:
-        result = dhan.get_positions()
-        if isinstance(result, dict) and "data" in result:
-            return result["data"] or []
-        return []
+        return _data(_cached_read(db, "positions", lambda dhan: dhan.get_positions(), account))
     except Exception as e:
         logger.error(f"get_positions error: {e}")
         return []
 
 
+def get_holdings(db: Session) -> list:
+    try:
+        return _data(_cached_read(db, "holdings", lambda dhan: dhan.get_holdings()))
+    except Exception as e:
+        logger.error(f"get_holdings error: {e}")
+        return []
+
+
 def get_orders(db: Session) -> list:
     dhan = get_dhan_instance(db)
     if not dhan:
         return []
     try:
-        result = dhan.get_order_list()
+        result = _call("order_list", dhan.get_order_list)
         if isinstance(result, dict) and "data" in result:
             return result["data"] or []
         return []
@@ -92,23 +173,38 @@ def get_orders(db: Session) -> list:
 def place_order(db: Session, symbol: str, exchange: str, side: str, qty: int,
                 order_type: str = "MARKET", price: float = 0,
                 product: str = "INTRADAY", security_id: str = "",
-                sl: float = None, target: float = None) -> dict:
-    """Place an order on Dhan"""
-    cfg = get_dhan_config_from_db(db)
-    if settings.PAPER_TRADING or cfg is None:
-        logger.info(f"[PAPER] Would place order: {side} {qty} {symbol} @ {order_type}")
-        return {"success": True, "orderId": f"PAPER_{datetime.now().strftime('%Y%m%d%H%M%S')}", "paper": True}
+                sl: float = None, target: float = None, strategy_id: int = None,
+                reason: str = "", account: Optional[ConfigDhan] = None) -> dict:
+    """
+    Place an order on Dhan (or on the paper broker in paper mode) for `account`,
+    default the primary. Safe to call from fan-out threads: the session is only
+    used to resolve the cached topology.
+    """
+    topo = topology.get(db)
+    cfg = topo.dhan
+    if is_paper_trading(topo.settings) or cfg is None:
+        from app.services.paper_broker import get_broker
+        # sl/target are enforced by the trigger monitor in both modes, so no paper bracket here
+        order = get_broker().submit(
+            symbol=symbol, exchange=exchange, side=side, qty=qty, order_type=order_type,
+            price=price, product=product, security_id=security_id,
+            strategy_id=strategy_id, reason=reason
+        )
+        logger.info(f"[PAPER] Order {order.order_id}: {side} {qty} {symbol} @ {order_type}")
+        return {"success": True, "orderId": order.order_id, "paper": True}
 
-    dhan = get_dhan_instance(db)
+    dhan = get_dhan_instance(db, account)
     if not dhan:
         return {"success": False, "error": "Dhan not configured"}
+    label = f"[{account.name or account.client_id}] " if account is not None else ""
     try:
         transaction_type = dhanhq.BUY if side == "BUY" else dhanhq.SELL
-        exc = dhanhq.NSE if exchange == "NSE" else dhanhq.BSE
-        prod = dhanhq.INTRA if product == "INTRADAY" else dhanhq.CNC
+        exc = _segment(exchange)
+        prod = _product(product)
         ot = dhanhq.MARKET if order_type == "MARKET" else dhanhq.LIMIT
 
-        result = dhan.place_order(
+        result = _call(
+            "place_order", dhan.place_order,
             security_id=security_id,
             exchange_segment=exc,
             transaction_type=transaction_type,
@@ -117,25 +213,33 @@ def place_order(db: Session, symbol: str, exchange: str, side: str, qty: int,
             product_type=prod,
             price=price if order_type == "LIMIT" else 0
         )
-        log_to_db(db, "INFO", "DHAN", f"Order placed: {side} {qty} {symbol} - {result}")
-        return {"success": True, "data": result}
+        invalidate_account_cache()
+        # A rejection comes back as {"status": "failure", "remarks": ...}, not as an exception
+        if not isinstance(result, dict) or result.get("status") != "success":
+            error = result.get("remarks") if isinstance(result, dict) else result
+            logger.error(f"{label}Order rejected: {side} {qty} {symbol} - {error}")
+            log_to_db(db, "ERROR", "DHAN", f"{label}Order rejected: {side} {qty} {symbol} - {error}")
+            return {"success": False, "error": str(error), "data": result}
+        log_to_db(db, "INFO", "DHAN", f"{label}Order placed: {side} {qty} {symbol} - {result}")
+        return {"success": True, "orderId": (result.get("data") or {}).get("orderId"), "data": result}
     except Exception as e:
-        logger.error(f"place_order error: {e}")
-        log_to_db(db, "ERROR", "DHAN", f"Order error: {e}")
+        logger.error(f"{label}place_order error: {e}")
+        log_to_db(db, "ERROR", "DHAN", f"{label}Order error: {e}")
         return {"success": False, "error": str(e)}
 
 
 def get_intraday_data(db: Session, security_id: str, exchange: str = "NSE",
-                      instrument: str = "EQUITY", interval: str = "1") -> list:
-    """Get intraday candle data"""
+                      instrument: str = None, interval: str = "1") -> list:
+    """Get intraday candle data; the instrument type is looked up for F&O and index securities"""
     dhan = get_dhan_instance(db)
     if not dhan:
         return []
     try:
-        result = dhan.intraday_minute_charts(
+        result = _call(
+            "intraday_minute_data", dhan.intraday_minute_data,
             security_id=security_id,
-            exchange_segment=exchange,
-            instrument_type=instrument
+            exchange_segment=_segment(exchange),
+            instrument_type=instrument or get_master().instrument_type(exchange, security_id)
         )
         if isinstance(result, dict) and "data" in result:
             return result["data"] or []
@@ -145,16 +249,30 @@ def get_intraday_data(db: Session, security_id: str, exchange: str = "NSE",
         return []
 
 
-def log_to_db(db: Session, level: str, source: str, message: str, extra: dict = None):
-    """Log event to DB"""
+def get_historical_daily_data(db: Session, symbol: str, exchange: str = "NSE",
+                              instrument: str = "EQUITY", from_date: str = "", to_date: str = "") -> dict:
+    """Get daily candles between two dates (YYYY-MM-DD)"""
+    dhan = get_dhan_instance(db)
+    if not dhan:
+        return {}
     try:
-        entry = LogEntry(
-            level=level,
-            source=source,
-            message=message,
-            extra=json.dumps(extra) if extra else None
+        result = _call(
+            "historical_daily_data", dhan.historical_daily_data,
+            symbol=symbol,
+            exchange_segment=_segment(exchange),
+            instrument_type=instrument,
+            expiry_code=0,
+            from_date=from_date,
+            to_date=to_date
         )
-        db.add(entry)
-        db.commit()
+        if isinstance(result, dict) and "data" in result:
+            return result["data"] or {}
+        return {}
     except Exception as e:
-        logger.error(f"log_to_db error: {e}")
+        logger.error(f"get_historical_daily_data error: {e}")
+        return {}
+
+
+def log_to_db(db: Session, level: str, source: str, message: str, extra: dict = None):
+    """Queue an event for the DB log sink. Never blocks or touches the caller's session."""
+    log_sink.emit(level, source, message, extra)
@@ -0,0 +1,155 @@
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+import threading
+import logging
+import httpx
+import csv
+import os
+
+logger = logging.getLogger(__name__)
+
+# Exchange codes used in watchlists and intents -> Dhan exchange segments
+EXCHANGE_SEGMENTS = {
+    "NSE": "NSE_EQ",
+    "BSE": "BSE_EQ",
+    "NFO": "NSE_FNO",
+    "BFO": "BSE_FNO",
+    "IDX": "IDX_I",
+}
+DERIVATIVE_EXCHANGES = ("NFO", "BFO")
+
+# (SEM_EXM_EXCH_ID, SEM_SEGMENT) of the scrip master -> exchange code
+_MASTER_EXCHANGES = {("NSE", "D"): "NFO", ("BSE", "D"): "BFO", ("NSE", "I"): "IDX", ("BSE", "I"): "IDX"}
+
+
+class Instrument(NamedTuple):
+    exchange: str
+    security_id: str
+    symbol: str
+    instrument: str            # EQUITY, INDEX, OPTIDX, OPTSTK, FUTIDX, FUTSTK, ...
+    underlying: str
+    expiry: Optional[str]      # YYYY-MM-DD
+    strike: Optional[float]
+    option_type: Optional[str]  # CE / PE
+    lot_size: int
+
+
+def _parse_row(row: dict) -> Optional[Instrument]:
+    exchange = _MASTER_EXCHANGES.get((row.get("SEM_EXM_EXCH_ID"), row.get("SEM_SEGMENT")))
+    if exchange is None:
+        return None
+    symbol = row.get("SEM_TRADING_SYMBOL") or ""
+    expiry = (row.get("SEM_EXPIRY_DATE") or "")[:10] or None
+    try:
+        strike = float(row.get("SEM_STRIKE_PRICE") or 0) or None
+    except ValueError:
+        strike = None
+    option_type = row.get("SEM_OPTION_TYPE") if row.get("SEM_OPTION_TYPE") in ("CE", "PE") else None
+    try:
+        lot_size = max(int(float(row.get("SEM_LOT_UNITS") or 1)), 1)
+    except ValueError:
+        lot_size = 1
+    return Instrument(
+        exchange=exchange, security_id=str(row.get("SEM_SMST_SECURITY_ID")), symbol=symbol,
+        instrument="INDEX" if exchange == "IDX" else (row.get("SEM_INSTRUMENT_NAME") or ""),
+        underlying=symbol.split("-")[0], expiry=expiry if exchange != "IDX" else None,
+        strike=strike, option_type=option_type, lot_size=lot_size,
+    )
+
+
+class InstrumentMaster:
+    """
+    Index and F&O rows of Dhan's scrip master, refreshed once a day into DATA_DIR.
+    Anything not listed (cash equities) is EQUITY with a lot size of 1.
+    """
+
+    def __init__(self, path: str, url: str):
+        self.path = path
+        self.url = url
+        self._lock = threading.Lock()
+        self._by_id: Dict[Tuple[str, str], Instrument] = {}
+        self._lots: Dict[str, int] = {}
+        self._loaded_on: Optional[date] = None
+
+    def _download(self):
+        tmp = self.path + ".part"
+        with httpx.stream("GET", self.url, timeout=60.0, follow_redirects=True) as response:
+            response.raise_for_status()
+            with open(tmp, "wb") as f:
+                for chunk in response.iter_bytes():
+                    f.write(chunk)
+        os.replace(tmp, self.path)
+
+    def _ensure(self):
+        today = date.today()
+        if self._loaded_on == today:
+            return
+        with self._lock:
+            if self._loaded_on == today:
+                return
+            fresh = os.path.exists(self.path) and datetime.fromtimestamp(os.path.getmtime(self.path)).date() == today
+            if not fresh:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self._download()
+                except Exception as e:
+                    logger.error(f"Scrip master download failed{', using the previous copy' if os.path.exists(self.path) else ''}: {e}")
+            by_id, lots = {}, {}
+            if os.path.exists(self.path):
+                with open(self.path, newline="") as f:
+                    for row in csv.DictReader(f):
+                        inst = _parse_row(row)
+                        if inst is None:
+                            continue
+                        by_id[(inst.exchange, inst.security_id)] = inst
+                        if inst.option_type and inst.underlying not in lots:
+                            lots[inst.underlying] = inst.lot_size
+            self._by_id, self._lots = by_id, lots
+            self._loaded_on = today
+            logger.info(f"Instrument master loaded: {len(by_id)} index/F&O instruments")
+
+    def load(self) -> int:
+        """Make sure today's master is loaded (pre-open), so lookups on the order path never download it"""
+        self._ensure()
+        return len(self._by_id)
+
+    def get(self, exchange: str, security_id: str) -> Optional[Instrument]:
+        self._ensure()
+        return self._by_id.get((exchange, str(security_id)))
+
+    def instrument_type(self, exchange: str, security_id: str) -> str:
+        if exchange == "IDX":
+            return "INDEX"
+        if exchange not in DERIVATIVE_EXCHANGES:
+            return "EQUITY"
+        inst = self.get(exchange, security_id)
+        return inst.instrument if inst else "OPTIDX"
+
+    def lot_size(self, exchange: str, security_id: str) -> int:
+        if exchange not in DERIVATIVE_EXCHANGES:
+            return 1
+        inst = self.get(exchange, security_id)
+        return inst.lot_size if inst else 1
+
+    def underlying_lot_size(self, underlying: str) -> int:
+        """Option lot size of an underlying (e.g. NIFTY), 1 if unknown"""
+        self._ensure()
+        return self._lots.get(underlying, 1)
+
+    def options(self, underlying: str, expiry: str) -> List[Instrument]:
+        """Tradeable contracts of one expiry, for mapping a chain strike to a security_id"""
+        self._ensure()
+        return sorted((i for i in self._by_id.values()
+                       if i.option_type and i.underlying == underlying and i.expiry == expiry),
+                      key=lambda i: (i.strike or 0, i.option_type))
+
+
+_master: Optional[InstrumentMaster] = None
+
+
+def get_master() -> InstrumentMaster:
+    global _master
+    if _master is None:
+        _master = InstrumentMaster(os.path.join(settings.DATA_DIR, "scrip-master.csv"), settings.DHAN_SCRIP_MASTER_URL)
+    return _master
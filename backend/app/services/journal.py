@@ -0,0 +1,414 @@
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+from app.services.candle_store import COLUMNS, columns_from_dhan
+import numpy as np
+import threading
+import logging
+import struct
+import queue
+import json
+import time
+import zlib
+import os
+
+logger = logging.getLogger(__name__)
+
+# Segment layout: a sequence of blocks, each one header followed by the
+# zlib-compressed concatenation of its records. A torn block at the tail of a
+# segment (crash mid-write) fails its length or CRC check and ends the read.
+BLOCK = struct.Struct("<4sIIII")   # magic, record count, raw length, compressed length, crc32
+BLOCK_MAGIC = b"JRN1"
+RECORD = struct.Struct("<BdI")     # kind, wall-clock epoch seconds, body length
+STR_LEN = struct.Struct("<H")
+COUNT = struct.Struct("<I")
+PRICE = struct.Struct("<d")
+
+BARS, TICK, INTENT, RISK, ORDER = 1, 2, 3, 4, 5
+KIND_NAMES = {BARS: "bars", TICK: "tick", INTENT: "intent", RISK: "risk", ORDER: "order"}
+KINDS = {name: kind for kind, name in KIND_NAMES.items()}
+
+INTENT_FIELDS = ("strategy_id", "symbol", "exchange", "security_id", "side", "qty", "order_type", "price",
+                 "product", "sl", "target", "trail", "is_exit", "ref_price", "atr", "reason", "group")
+
+
+class Record(NamedTuple):
+    kind: str
+    ts: float
+    data: object
+
+
+def _pack_str(value: str) -> bytes:
+    raw = (value or "").encode()
+    return STR_LEN.pack(len(raw)) + raw
+
+
+def _unpack_str(buf: memoryview, pos: int) -> Tuple[str, int]:
+    (n,) = STR_LEN.unpack_from(buf, pos)
+    pos += STR_LEN.size
+    return bytes(buf[pos:pos + n]).decode(), pos + n
+
+
+def _encode_bars(exchange: str, security_id: str, cols: Dict[str, np.ndarray]) -> bytes:
+    parts = [_pack_str(exchange), _pack_str(security_id), COUNT.pack(len(cols["ts"]))]
+    parts.extend(np.ascontiguousarray(cols[name], dtype=dtype).tobytes() for name, dtype in COLUMNS.items())
+    return b"".join(parts)
+
+
+def _decode_bars(body: memoryview) -> dict:
+    exchange, pos = _unpack_str(body, 0)
+    security_id, pos = _unpack_str(body, pos)
+    (n,) = COUNT.unpack_from(body, pos)
+    pos += COUNT.size
+    cols = {}
+    for name, dtype in COLUMNS.items():
+        cols[name] = np.frombuffer(body, dtype=dtype, count=n, offset=pos)
+        pos += n * dtype.itemsize
+    return {"exchange": exchange, "security_id": security_id, **cols}
+
+
+def _encode_tick(exchange: str, symbol: str, price: float) -> bytes:
+    return _pack_str(exchange) + _pack_str(symbol) + PRICE.pack(price)
+
+
+def _decode_tick(body: memoryview) -> dict:
+    exchange, pos = _unpack_str(body, 0)
+    symbol, pos = _unpack_str(body, pos)
+    return {"exchange": exchange, "symbol": symbol, "price": PRICE.unpack_from(body, pos)[0]}
+
+
+class Journal:
+    """
+    Append-only binary journal of market data and engine decisions.
+    The record_* calls only put a tuple on a queue; encoding, compression and
+    file I/O happen on a background thread. When the queue is full, records
+    are dropped (and counted) rather than blocking the trading cycle.
+    """
+
+    def __init__(self, root: str, maxsize: int, block_bytes: int, segment_bytes: int,
+                 flush_interval: float, level: int):
+        self.root = root
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._block_bytes = block_bytes
+        self._segment_bytes = segment_bytes
+        self._flush_interval = flush_interval
+        self._level = level
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._buffer = bytearray()
+        self._count = 0
+        self._file = None
+        self._segment_day: Optional[date] = None
+        # Bars already journaled per instrument, so a full-day fetch only adds what is new
+        self._last_bar: Dict[Tuple[str, str], int] = {}
+        self.records = 0
+        self.blocks = 0
+        self.raw_bytes = 0
+        self.written_bytes = 0
+        self.dropped = 0
+
+    def put(self, kind: int, payload):
+        try:
+            self._queue.put_nowait((kind, time.time(), payload))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 10000 == 1:
+                logger.warning(f"Journal queue full, {self.dropped} records dropped so far")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+        self._thread.start()
+        logger.info(f"Journal started in {self.root}")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        while not self._queue.empty():
+            self._drain()
+            self._flush()
+        self._flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        logger.info(f"Journal stopped: {self.records} records, {self.written_bytes} bytes written")
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                item = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                self._append(*item)
+                self._drain()
+            if len(self._buffer) >= self._block_bytes or time.monotonic() - last_flush >= self._flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+
+    def _drain(self):
+        while len(self._buffer) < self._block_bytes:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._append(*item)
+
+    def _append(self, kind: int, ts: float, payload):
+        try:
+            body = self._encode(kind, payload)
+        except Exception as e:
+            logger.error(f"Journal could not encode a {KIND_NAMES.get(kind, kind)} record: {e}")
+            return
+        if body is None:
+            return
+        self._buffer += RECORD.pack(kind, ts, len(body))
+        self._buffer += body
+        self._count += 1
+
+    def _encode(self, kind: int, payload) -> Optional[bytes]:
+        if kind == BARS:
+            exchange, security_id, candles = payload
+            cols = columns_from_dhan(candles)
+            key = (exchange, security_id)
+            last = self._last_bar.get(key)
+            if last is not None:
+                # Re-journal the last known bar too: it may still have been forming
+                start = int(np.searchsorted(cols["ts"], last, side="left"))
+                cols = {name: values[start:] for name, values in cols.items()}
+            if not len(cols["ts"]):
+                return None
+            self._last_bar[key] = int(cols["ts"][-1])
+            return _encode_bars(exchange, security_id, cols)
+        if kind == TICK:
+            return _encode_tick(*payload)
+        return json.dumps(payload, separators=(",", ":"), default=str).encode()
+
+    def _flush(self):
+        count = self._count
+        if not count:
+            return
+        raw = bytes(self._buffer)
+        compressed = zlib.compress(raw, self._level)
+        header = BLOCK.pack(BLOCK_MAGIC, count, len(raw), len(compressed), zlib.crc32(compressed))
+        try:
+            handle = self._segment()
+            handle.write(header)
+            handle.write(compressed)
+            handle.flush()
+        except OSError as e:
+            logger.error(f"Journal write of {count} records failed: {e}")
+            return
+        finally:
+            # The block is written or lost as a whole; either way the next one starts empty
+            self._buffer.clear()
+            self._count = 0
+        self.records += count
+        self.blocks += 1
+        self.raw_bytes += len(raw)
+        self.written_bytes += BLOCK.size + len(compressed)
+
+    def _segment(self):
+        """Current segment file; a new one per day, past the size limit, and on every start"""
+        today = date.today()
+        if self._file is not None and self._segment_day == today and self._file.tell() < self._segment_bytes:
+            return self._file
+        if self._file is not None:
+            self._file.close()
+        if self._segment_day != today:
+            self._last_bar.clear()
+        directory = os.path.join(self.root, today.isoformat())
+        os.makedirs(directory, exist_ok=True)
+        existing = segments(today, self.root)
+        seq = int(os.path.basename(existing[-1]).split(".")[0]) + 1 if existing else 1
+        self._file = open(os.path.join(directory, f"{seq:06d}.jnl"), "ab")
+        self._segment_day = today
+        return self._file
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "queued": self._queue.qsize(),
+            "records": self.records,
+            "blocks": self.blocks,
+            "raw_bytes": self.raw_bytes,
+            "written_bytes": self.written_bytes,
+            "compression_ratio": round(self.raw_bytes / self.written_bytes, 2) if self.written_bytes else None,
+            "dropped": self.dropped,
+            "segment": self._file.name if self._file is not None else None,
+        }
+
+
+def _default_root() -> str:
+    return os.path.join(settings.DATA_DIR, "journal")
+
+
+def days(root: Optional[str] = None) -> List[date]:
+    root = root or _default_root()
+    if not os.path.isdir(root):
+        return []
+    found = []
+    for name in os.listdir(root):
+        try:
+            found.append(date.fromisoformat(name))
+        except ValueError:
+            continue
+    return sorted(found)
+
+
+def segments(day: date, root: Optional[str] = None) -> List[str]:
+    directory = os.path.join(root or _default_root(), day.isoformat())
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".jnl")]
+
+
+def iter_blocks(path: str) -> Iterator[Tuple[int, bytes]]:
+    """(record count, decompressed block) for every intact block of one segment"""
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(BLOCK.size)
+            if len(header) < BLOCK.size:
+                return
+            magic, count, raw_len, comp_len, crc = BLOCK.unpack(header)
+            compressed = f.read(comp_len) if magic == BLOCK_MAGIC else b""
+            if magic != BLOCK_MAGIC or len(compressed) < comp_len or zlib.crc32(compressed) != crc:
+                logger.warning(f"Journal segment {path} is truncated or corrupt at offset {f.tell()}; stopping there")
+                return
+            yield count, zlib.decompress(compressed)
+
+
+def _decode(kind: int, body: memoryview):
+    if kind == BARS:
+        return _decode_bars(body)
+    if kind == TICK:
+        return _decode_tick(body)
+    return json.loads(bytes(body))
+
+
+def iter_records(day: Optional[date] = None, kinds: Optional[Iterable[str]] = None,
+                 root: Optional[str] = None) -> Iterator[Record]:
+    """
+    Every record of a day (today by default) in write order. Records of kinds that
+    were not asked for are skipped without being decoded.
+    """
+    wanted = {KINDS[k] for k in kinds} if kinds else None
+    for path in segments(day or date.today(), root):
+        for _, raw in iter_blocks(path):
+            buf = memoryview(raw)
+            pos = 0
+            while pos < len(buf):
+                kind, ts, length = RECORD.unpack_from(buf, pos)
+                pos += RECORD.size
+                if wanted is None or kind in wanted:
+                    yield Record(KIND_NAMES.get(kind, str(kind)), ts, _decode(kind, buf[pos:pos + length]))
+                pos += length
+
+
+def read_bars(exchange: str, security_id: str, day: Optional[date] = None,
+              until: Optional[float] = None, root: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    The minute bars of one instrument as the engine had fetched them, optionally only up
+    to wall-clock time `until` (what a decision at that time was based on). Later
+    versions of a bar replace earlier ones.
+    """
+    latest: Dict[int, tuple] = {}
+    for record in iter_records(day, ("bars",), root):
+        if until is not None and record.ts > until:
+            break
+        data = record.data
+        if data["exchange"] != exchange or data["security_id"] != security_id:
+            continue
+        for i, ts in enumerate(data["ts"]):
+            latest[int(ts)] = tuple(data[name][i] for name in COLUMNS)
+    rows = [latest[ts] for ts in sorted(latest)]
+    return {name: np.array([row[i] for row in rows], dtype=dtype) for i, (name, dtype) in enumerate(COLUMNS.items())}
+
+
+def summarize(day: Optional[date] = None, root: Optional[str] = None) -> dict:
+    """Record counts per kind and the covered time range of one day, for audits"""
+    counts = {name: 0 for name in KINDS}
+    first = last = None
+    t0 = time.perf_counter()
+    for path in segments(day or date.today(), root):
+        for _, raw in iter_blocks(path):
+            buf = memoryview(raw)
+            pos = 0
+            while pos < len(buf):
+                kind, ts, length = RECORD.unpack_from(buf, pos)
+                name = KIND_NAMES.get(kind, str(kind))
+                counts[name] = counts.get(name, 0) + 1
+                first = ts if first is None else first
+                last = ts
+                pos += RECORD.size + length
+    return {
+        "day": (day or date.today()).isoformat(),
+        "records": counts,
+        "from": datetime.fromtimestamp(first).isoformat() if first else None,
+        "to": datetime.fromtimestamp(last).isoformat() if last else None,
+        "scan_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+
+_journal: Optional[Journal] = None
+
+
+def start():
+    global _journal
+    if not settings.JOURNAL_ENABLED or _journal is not None:
+        return
+    _journal = Journal(
+        root=_default_root(),
+        maxsize=settings.JOURNAL_QUEUE_SIZE,
+        block_bytes=settings.JOURNAL_BLOCK_BYTES,
+        segment_bytes=settings.JOURNAL_SEGMENT_BYTES,
+        flush_interval=settings.JOURNAL_FLUSH_INTERVAL_SECONDS,
+        level=settings.JOURNAL_COMPRESSION_LEVEL,
+    )
+    _journal.start()
+
+
+def stop():
+    global _journal
+    journal, _journal = _journal, None
+    if journal is not None:
+        journal.stop()
+
+
+def stats() -> Optional[dict]:
+    return _journal.stats() if _journal is not None else None
+
+
+# Hot-path entry points: each is a no-op when the journal is not running
+
+def record_bars(exchange: str, security_id: str, candles: dict):
+    """A fetched candle response; only bars not journaled before are written"""
+    if _journal is not None:
+        _journal.put(BARS, (exchange, security_id, candles))
+
+
+def record_tick(exchange: str, symbol: str, price: float):
+    if _journal is not None:
+        _journal.put(TICK, (exchange, symbol, price))
+
+
+def record_intent(intent):
+    if _journal is not None:
+        _journal.put(INTENT, {field: getattr(intent, field, None) for field in INTENT_FIELDS})
+
+
+def record_risk(intent, approved: bool, reason: str, qty: int):
+    if _journal is not None:
+        _journal.put(RISK, {"strategy_id": intent.strategy_id, "exchange": intent.exchange, "symbol": intent.symbol,
+                            "side": intent.side, "requested": intent.qty, "approved": approved,
+                            "reason": reason, "qty": qty})
+
+
+def record_order(event: str, **fields):
+    if _journal is not None:
+        fields["event"] = event
+        _journal.put(ORDER, fields)
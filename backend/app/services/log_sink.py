@@ -0,0 +1,220 @@
+from sqlalchemy import insert, text, delete
+from app.db.base import SessionLocal, engine
+from app.models.order import LogEntry
+from app.core.config import settings
+from app.services.market_calendar import get_calendar
+from datetime import datetime, timezone, timedelta, date, time as dtime
+from typing import Optional, Tuple
+import threading
+import logging
+import queue
+import re
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_RE = re.compile(r"^logs_p(\d{8})$")
+_DEFAULT_PARTITION = "logs_default"
+
+
+def _local_today() -> date:
+    """Exchange-local date on the wall clock (not a replay's virtual clock)"""
+    return datetime.now(get_calendar().tz).date()
+
+
+def _day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """An exchange-local day as naive UTC, the way log timestamps are stored"""
+    tz = get_calendar().tz
+    start, end = (tz.localize(datetime.combine(d, dtime())).astimezone(timezone.utc).replace(tzinfo=None)
+                  for d in (day, day + timedelta(days=1)))
+    return start, end
+
+
+class LogSink:
+    """
+    Buffered writer for the logs table.
+    emit() only enqueues; a background thread batches rows into one
+    multi-row INSERT on its own connection and runs partition maintenance
+    once per exchange-local day. When the queue is full, entries are dropped rather than
+    blocking the caller.
+    """
+
+    def __init__(self, maxsize: int, batch_size: int, flush_interval: float):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._maintained_on: Optional[date] = None
+        self.dropped = 0
+
+    def emit(self, level: str, source: str, message: str, extra: dict = None):
+        try:
+            self._queue.put_nowait({
+                "timestamp": datetime.now(timezone.utc),
+                "level": level,
+                "source": source,
+                "message": message,
+                "extra": extra,
+            })
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Log sink queue full, {self.dropped} entries dropped so far")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._run_maintenance()
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+        logger.info("Log sink started")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        self._flush(self._drain())
+        logger.info("Log sink stopped")
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._flush(batch)
+            if self._maintained_on != _local_today():
+                self._run_maintenance()
+
+    def _drain(self, block: bool = False) -> list:
+        batch = []
+        if block:
+            try:
+                batch.append(self._queue.get(timeout=self._flush_interval))
+            except queue.Empty:
+                return batch
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: list):
+        if not batch:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(insert(LogEntry), batch)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Log sink flush of {len(batch)} entries failed: {e}")
+        finally:
+            db.close()
+
+    def _run_maintenance(self):
+        try:
+            run_maintenance()
+        except Exception as e:
+            logger.error(f"Log retention maintenance failed: {e}")
+        self._maintained_on = _local_today()
+
+
+def is_partitioned() -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :name"
+        ), {"name": LogEntry.__tablename__}).first() is not None
+
+
+def ensure_partitions(days_ahead: int):
+    """
+    Create the DEFAULT partition, so an insert outside every daily range still lands,
+    and one partition per exchange-local day from yesterday up to `days_ahead` days ahead
+    """
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {_DEFAULT_PARTITION} PARTITION OF logs DEFAULT"))
+    today = _local_today()
+    for offset in range(-1, days_ahead + 1):
+        day = today + timedelta(days=offset)
+        start, end = _day_bounds(day)
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS logs_p{day:%Y%m%d} PARTITION OF logs "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+        except Exception as e:
+            # e.g. it overlaps a partition created with UTC day bounds; those rows go to the default
+            logger.warning(f"Log partition for {day} not created, its rows go to {_DEFAULT_PARTITION}: {e}")
+
+
+def expire_partitions(retention_days: int, archive: bool) -> list:
+    """
+    Drop (or detach and rename to logs_archive_*) daily partitions older than the retention
+    window; expired rows in the DEFAULT partition are deleted
+    """
+    cutoff = _local_today() - timedelta(days=retention_days)
+    expired = []
+    with engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name"
+        ), {"name": LogEntry.__tablename__}).scalars().all()
+        for name in rows:
+            match = _PARTITION_RE.match(name)
+            if not match or datetime.strptime(match.group(1), "%Y%m%d").date() >= cutoff:
+                continue
+            if archive:
+                conn.execute(text(f"ALTER TABLE logs DETACH PARTITION {name}"))
+                conn.execute(text(f"ALTER TABLE {name} RENAME TO logs_archive_{match.group(1)}"))
+            else:
+                conn.execute(text(f"DROP TABLE {name}"))
+            expired.append(name)
+        if _DEFAULT_PARTITION in rows:
+            result = conn.execute(text(f"DELETE FROM {_DEFAULT_PARTITION} WHERE timestamp < :cutoff"),
+                                  {"cutoff": _day_bounds(cutoff)[0]})
+            if result.rowcount:
+                expired.append(f"{result.rowcount} rows of {_DEFAULT_PARTITION}")
+    return expired
+
+
+def run_maintenance():
+    """Create upcoming partitions and expire old ones (plain DELETE on non-partitioned tables)"""
+    if is_partitioned():
+        ensure_partitions(settings.LOG_PARTITION_DAYS_AHEAD)
+        expired = expire_partitions(settings.LOG_RETENTION_DAYS, settings.LOG_ARCHIVE_EXPIRED)
+        if expired:
+            action = "archived" if settings.LOG_ARCHIVE_EXPIRED else "dropped"
+            logger.info(f"Log partitions {action}: {', '.join(expired)}")
+        return
+    if engine.dialect.name == "postgresql":
+        logger.warning("logs table predates partitioning; falling back to row deletes for retention")
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.LOG_RETENTION_DAYS)
+    with engine.begin() as conn:
+        result = conn.execute(delete(LogEntry).where(LogEntry.timestamp < cutoff))
+    if result.rowcount:
+        logger.info(f"Deleted {result.rowcount} log entries older than {settings.LOG_RETENTION_DAYS} days")
+
+
+_sink = LogSink(
+    maxsize=settings.LOG_QUEUE_SIZE,
+    batch_size=settings.LOG_BATCH_SIZE,
+    flush_interval=settings.LOG_FLUSH_INTERVAL_SECONDS,
+)
+
+
+def emit(level: str, source: str, message: str, extra: dict = None):
+    _sink.emit(level, source, message, extra)
+
+
+def start():
+    _sink.start()
+
+
+def stop():
+    _sink.stop()
@@ -0,0 +1,158 @@
+from datetime import datetime, date, time as dtime, timedelta
+from typing import Dict, NamedTuple, Optional
+from app.core.config import settings
+import logging
+import json
+import time
+import os
+import pytz
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_CALENDAR_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "nse_calendar.json")
+
+
+class SessionWindow(NamedTuple):
+    """One trading day's timeline. Datetimes are tz-aware; *_ts are epoch seconds for cheap comparisons."""
+    day: date
+    name: str
+    pre_open: datetime
+    open: datetime
+    square_off: datetime
+    close: datetime
+    closing_session_end: datetime
+    open_ts: float
+    square_off_ts: float
+    close_ts: float
+
+
+def _parse_hhmm(value: str) -> dtime:
+    hour, minute = value.split(":")
+    return dtime(int(hour), int(minute))
+
+
+class ExchangeCalendar:
+    """
+    NSE/BSE session calendar built from a local holiday file.
+    Session windows are precomputed a year at a time, so lookups are a dict get.
+    """
+
+    def __init__(self, path: Optional[str] = None, tz_name: str = settings.TIMEZONE):
+        self.tz = pytz.timezone(tz_name)
+        self.holidays: Dict[date, str] = {}
+        self.special_sessions: Dict[date, dict] = {}
+        self._windows: Dict[date, Optional[SessionWindow]] = {}
+        self._years_built: set = set()
+        self._today: Optional[SessionWindow] = None
+        self._today_bounds = (0.0, -1.0)  # epoch range of the day _today was computed for
+        self.clock = time.time  # replaced by a virtual clock during market replay
+        self._load(path or settings.MARKET_CALENDAR_FILE or _DEFAULT_CALENDAR_FILE)
+
+    def _load(self, path: str):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logger.warning(f"Market calendar file not found: {path}; only weekends will be treated as holidays")
+            return
+        self.holidays = {date.fromisoformat(d): name for d, name in data.get("holidays", {}).items()}
+        self.special_sessions = {date.fromisoformat(d): s for d, s in data.get("special_sessions", {}).items()}
+        logger.info(f"Market calendar loaded: {len(self.holidays)} holidays, "
+                    f"{len(self.special_sessions)} special sessions")
+
+    def _at(self, day: date, t: dtime) -> datetime:
+        return self.tz.localize(datetime.combine(day, t))
+
+    def _build_window(self, day: date) -> Optional[SessionWindow]:
+        special = self.special_sessions.get(day)
+        if special:
+            open_t, close_t = _parse_hhmm(special["open"]), _parse_hhmm(special["close"])
+            pre_open = self._at(day, _parse_hhmm(special.get("pre_open", special["open"])))
+            open_dt, close_dt = self._at(day, open_t), self._at(day, close_t)
+            square_off = close_dt - timedelta(minutes=settings.SPECIAL_SESSION_SQUARE_OFF_BUFFER_MINUTES)
+            closing_end = close_dt
+            name = special.get("name", "Special Session")
+        else:
+            if day.weekday() >= 5 or day in self.holidays:
+                return None
+            pre_open = self._at(day, dtime(settings.PRE_OPEN_HOUR, settings.PRE_OPEN_MINUTE))
+            open_dt = self._at(day, dtime(settings.MARKET_OPEN_HOUR, settings.MARKET_OPEN_MINUTE))
+            close_dt = self._at(day, dtime(settings.MARKET_CLOSE_HOUR, settings.MARKET_CLOSE_MINUTE))
+            square_off = self._at(day, dtime(settings.SQUARE_OFF_HOUR, settings.SQUARE_OFF_MINUTE))
+            closing_end = self._at(day, dtime(settings.CLOSING_SESSION_END_HOUR, settings.CLOSING_SESSION_END_MINUTE))
+            name = "Regular"
+        return SessionWindow(
+            day=day, name=name, pre_open=pre_open, open=open_dt, square_off=square_off,
+            close=close_dt, closing_session_end=closing_end,
+            open_ts=open_dt.timestamp(), square_off_ts=square_off.timestamp(), close_ts=close_dt.timestamp(),
+        )
+
+    def _build_year(self, year: int):
+        day = date(year, 1, 1)
+        while day.year == year:
+            self._windows[day] = self._build_window(day)
+            day += timedelta(days=1)
+        self._years_built.add(year)
+
+    def session(self, day: date) -> Optional[SessionWindow]:
+        """Session window for a date, or None if the exchange is closed"""
+        if day.year not in self._years_built:
+            self._build_year(day.year)
+        return self._windows[day]
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock(), self.tz)
+
+    def today(self) -> Optional[SessionWindow]:
+        """Today's window; the date is only recomputed when the clock leaves the cached day"""
+        now_ts = self.clock()
+        start, end = self._today_bounds
+        if not (start <= now_ts < end):
+            today = self.now().date()
+            self._today = self.session(today)
+            day_start = self._at(today, dtime(0, 0))
+            self._today_bounds = (day_start.timestamp(), (day_start + timedelta(days=1)).timestamp())
+        return self._today
+
+    def is_open(self) -> bool:
+        window = self.today()
+        if window is None:
+            return False
+        return window.open_ts <= self.clock() <= window.close_ts
+
+    def is_past_square_off(self) -> bool:
+        window = self.today()
+        return window is not None and self.clock() >= window.square_off_ts
+
+    def has_holidays(self, year: int) -> bool:
+        return any(day.year == year for day in self.holidays)
+
+    def next_session(self, after: Optional[datetime] = None) -> SessionWindow:
+        """First session whose close is after `after` (the current one if a session is in progress)"""
+        after = after or self.now()
+        day = after.astimezone(self.tz).date()
+        for _ in range(366):
+            window = self.session(day)
+            if window is not None and window.closing_session_end > after:
+                if not self.has_holidays(window.day.year):
+                    self._warn_unlisted_year(window.day.year)
+                return window
+            day += timedelta(days=1)
+        raise RuntimeError("No trading session found in the next year; check the market calendar file")
+
+    def _warn_unlisted_year(self, year: int):
+        from app.services import alerts
+        message = (f"Market calendar has no holidays for {year}: every weekday is treated as a session. "
+                   f"Add the exchange's {year} holiday list to the calendar file.")
+        logger.warning(message)
+        alerts.emit("WARN", "calendar", message)
+
+
+_calendar: Optional[ExchangeCalendar] = None
+
+
+def get_calendar() -> ExchangeCalendar:
+    global _calendar
+    if _calendar is None:
+        _calendar = ExchangeCalendar()
+    return _calendar
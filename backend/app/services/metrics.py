@@ -0,0 +1,79 @@
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from app.db.base import engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Buckets tuned for a one-minute cycle: sub-millisecond stages up to a
+# cycle that eats most of its minute.
+_STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_CYCLE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0)
+_API_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CYCLE_SECONDS = Histogram(
+    "engine_cycle_seconds", "Duration of one strategy cycle", buckets=_CYCLE_BUCKETS
+)
+CYCLE_STAGE_SECONDS = Histogram(
+    "engine_cycle_stage_seconds", "Duration of a single stage inside the strategy cycle",
+    ["stage"], buckets=_STAGE_BUCKETS
+)
+CYCLE_ERRORS = Counter(
+    "engine_cycle_errors_total", "Errors raised while processing a cycle", ["scope"]
+)
+INTENTS_GENERATED = Counter(
+    "engine_intents_generated_total", "Trade intents returned by strategies", ["strategy"]
+)
+INTENTS_BLOCKED = Counter(
+    "engine_intents_blocked_total", "Trade intents rejected by the risk manager", ["strategy"]
+)
+ORDERS_SUBMITTED = Counter(
+    "engine_orders_submitted_total", "Orders submitted to the broker", ["mode", "result"]
+)
+DHAN_REQUEST_SECONDS = Histogram(
+    "dhan_request_seconds", "Latency of Dhan API calls", ["endpoint"], buckets=_API_BUCKETS
+)
+DHAN_REQUEST_ERRORS = Counter(
+    "dhan_request_errors_total", "Failed Dhan API calls (exceptions and failure responses)", ["endpoint"]
+)
+
+# Pre-bound children so the hot loop only pays for an observe(), not a label lookup
+STAGE_FETCH = CYCLE_STAGE_SECONDS.labels(stage="fetch")
+STAGE_DATAFRAME = CYCLE_STAGE_SECONDS.labels(stage="dataframe")
+STAGE_ON_BAR = CYCLE_STAGE_SECONDS.labels(stage="on_bar")
+STAGE_RISK = CYCLE_STAGE_SECONDS.labels(stage="risk_check")
+STAGE_ORDER_SUBMIT = CYCLE_STAGE_SECONDS.labels(stage="order_submit")
+STAGE_DB_COMMIT = CYCLE_STAGE_SECONDS.labels(stage="db_commit")
+STAGE_OPTIONS = CYCLE_STAGE_SECONDS.labels(stage="options")
+STAGE_CROSS_SECTION = CYCLE_STAGE_SECONDS.labels(stage="cross_section")
+
+
+class DBPoolCollector:
+    """Reads SQLAlchemy pool utilisation at scrape time, so nothing runs on the hot path"""
+
+    def collect(self):
+        pool = engine.pool
+        size = GaugeMetricFamily("db_pool_size", "Configured size of the DB connection pool")
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections currently checked out")
+        checked_in = GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool")
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections opened beyond pool_size")
+        try:
+            size.add_metric([], pool.size())
+            checked_out.add_metric([], pool.checkedout())
+            checked_in.add_metric([], pool.checkedin())
+            overflow.add_metric([], max(pool.overflow(), 0))
+        except AttributeError:
+            # Non-queue pools (e.g. SQLite's StaticPool) don't expose counters
+            return
+        yield size
+        yield checked_out
+        yield checked_in
+        yield overflow
+
+
+REGISTRY.register(DBPoolCollector())
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Serialize all registered metrics in Prometheus text format"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
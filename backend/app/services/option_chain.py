@@ -0,0 +1,235 @@
+from datetime import date, datetime, time as dtime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.services import metrics, topology
+from app.services.instruments import EXCHANGE_SEGMENTS, get_master
+from app.services.market_calendar import get_calendar
+from app.services.options import ChainAnalytics, RawChain, YEAR_SECONDS, analyze_chains
+import numpy as np
+import threading
+import logging
+import httpx
+import time
+
+logger = logging.getLogger(__name__)
+
+# Contracts expire at the close of the expiry day
+_EXPIRY_TIME = dtime(15, 30)
+
+ChainKey = Tuple[str, str]  # (exchange, security_id) of the underlying
+
+
+class OptionChainClient:
+    """
+    Dhan v2 option-chain endpoints (the dhanhq SDK has none). Dhan allows one
+    chain request every few seconds, so every request waits its turn here.
+    """
+
+    def __init__(self, client_id: str, access_token: str):
+        self.client_id = client_id
+        self.credentials = (client_id, access_token)
+        self._http = httpx.Client(
+            base_url=settings.DHAN_API_BASE_URL,
+            headers={
+                "access-token": access_token,
+                "client-id": client_id,
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            },
+            timeout=settings.DHAN_HTTP_TIMEOUT_SECONDS,
+        )
+        self._lock = threading.Lock()
+        self._last_request = 0.0
+
+    def _post(self, endpoint: str, path: str, body: dict) -> dict:
+        with self._lock:
+            wait = self._last_request + settings.OPTION_CHAIN_MIN_INTERVAL_SECONDS - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            start = time.perf_counter()
+            try:
+                response = self._http.post(path, json=body)
+                response.raise_for_status()
+                return response.json()
+            except (httpx.HTTPError, ValueError):
+                metrics.DHAN_REQUEST_ERRORS.labels(endpoint).inc()
+                raise
+            finally:
+                self._last_request = time.monotonic()
+                metrics.DHAN_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+
+    def expiries(self, security_id: str, segment: str) -> List[str]:
+        result = self._post("option_expiries", "/v2/optionchain/expirylist",
+                            {"UnderlyingScrip": int(security_id), "UnderlyingSeg": segment})
+        return sorted(result.get("data") or [])
+
+    def chain(self, security_id: str, segment: str, expiry: str) -> dict:
+        result = self._post("option_chain", "/v2/optionchain",
+                            {"UnderlyingScrip": int(security_id), "UnderlyingSeg": segment, "Expiry": expiry})
+        return result.get("data") or {}
+
+    def close(self):
+        self._http.close()
+
+
+_client: Optional[OptionChainClient] = None
+_expiry_cache: Dict[Tuple[ChainKey, date], List[str]] = {}
+_latest: Dict[ChainKey, ChainAnalytics] = {}
+
+
+def _get_client(db: Session) -> Optional[OptionChainClient]:
+    global _client
+    cfg = topology.get(db).dhan
+    if cfg is None or not cfg.client_id or not cfg.access_token:
+        return None
+    if _client is None or _client.credentials != (cfg.client_id, cfg.access_token):
+        if _client is not None:
+            _client.close()
+        _client = OptionChainClient(cfg.client_id, cfg.access_token)
+    return _client
+
+
+def _years_to_expiry(expiry: str, now_ts: float) -> float:
+    day = date.fromisoformat(expiry)
+    calendar = get_calendar()
+    window = calendar.session(day)
+    close_ts = window.close_ts if window else calendar.tz.localize(datetime.combine(day, _EXPIRY_TIME)).timestamp()
+    return max(close_ts - now_ts, 0.0) / YEAR_SECONDS
+
+
+def _parse(underlying: str, expiry: str, data: dict, now_ts: float, lot_size: int) -> RawChain:
+    rows = sorted((float(strike), sides) for strike, sides in (data.get("oc") or {}).items())
+
+    def side(sides: dict, key: str, field: str) -> float:
+        value = (sides.get(key) or {}).get(field)
+        return float(value) if value is not None else np.nan
+
+    return RawChain(
+        underlying=underlying, expiry=expiry, spot=float(data.get("last_price") or 0.0),
+        t=_years_to_expiry(expiry, now_ts),
+        strike=np.array([s for s, _ in rows], dtype=np.float64),
+        call_ltp=np.array([side(x, "ce", "last_price") for _, x in rows], dtype=np.float64),
+        put_ltp=np.array([side(x, "pe", "last_price") for _, x in rows], dtype=np.float64),
+        call_oi=np.array([side(x, "ce", "oi") for _, x in rows], dtype=np.float64),
+        put_oi=np.array([side(x, "pe", "oi") for _, x in rows], dtype=np.float64),
+        lot_size=lot_size,
+    )
+
+
+def nearest_expiry(client: OptionChainClient, key: ChainKey, today: date) -> Optional[str]:
+    """First expiry on or after today; the list is fetched once per underlying per day"""
+    cache_key = (key, today)
+    expiries = _expiry_cache.get(cache_key)
+    if expiries is None:
+        expiries = client.expiries(key[1], EXCHANGE_SEGMENTS.get(key[0], "IDX_I"))
+        for stale in [k for k in _expiry_cache if k[1] != today]:
+            del _expiry_cache[stale]
+        _expiry_cache[cache_key] = expiries
+    return next((e for e in expiries if e >= today.isoformat()), None)
+
+
+def refresh(db: Session, items: Iterable) -> Dict[ChainKey, ChainAnalytics]:
+    """
+    Fetch the nearest-expiry chain of every distinct underlying among `items`
+    (watchlist items or anything with exchange/security_id/symbol), then solve
+    IV and greeks for all of them in a single vectorized pass.
+    """
+    underlyings: Dict[ChainKey, str] = {}
+    for item in items:
+        underlyings.setdefault((item.exchange, str(item.security_id or item.symbol)), item.symbol)
+    if not underlyings:
+        return {}
+    client = _get_client(db)
+    if client is None:
+        logger.warning("Option chains skipped: Dhan credentials not configured")
+        return {}
+
+    calendar = get_calendar()
+    now_ts = calendar.clock()
+    today = calendar.now().date()
+    master = get_master()
+    raw: Dict[ChainKey, RawChain] = {}
+    for key, symbol in underlyings.items():
+        try:
+            expiry = nearest_expiry(client, key, today)
+            if expiry is None:
+                continue
+            data = client.chain(key[1], EXCHANGE_SEGMENTS.get(key[0], "IDX_I"), expiry)
+            raw[key] = _parse(symbol, expiry, data, now_ts, master.underlying_lot_size(symbol))
+        except Exception as e:
+            logger.error(f"Option chain fetch failed for {symbol}: {e}")
+
+    start = time.perf_counter()
+    analytics = analyze_chains(raw, settings.OPTIONS_RISK_FREE_RATE)
+    metrics.STAGE_OPTIONS.observe(time.perf_counter() - start)
+    _latest.update(analytics)
+    return analytics
+
+
+def latest() -> Dict[ChainKey, ChainAnalytics]:
+    """Analytics from the most recent refresh, per underlying"""
+    return dict(_latest)
+
+
+class _Underlying(NamedTuple):
+    exchange: str
+    security_id: str
+    symbol: str
+
+
+_tracked: Dict[ChainKey, str] = {}
+_tracked_lock = threading.Lock()
+_refresher: Optional[threading.Thread] = None
+_refresher_wake = threading.Event()
+_refresher_stop = threading.Event()
+
+
+def _refresh_loop():
+    while not _refresher_stop.is_set():
+        with _tracked_lock:
+            items = [_Underlying(exchange, security_id, symbol) for (exchange, security_id), symbol in _tracked.items()]
+        if items and get_calendar().is_open():
+            db = SessionLocal()
+            try:
+                refresh(db, items)
+            except Exception as e:
+                logger.error(f"Option chain refresh failed: {e}")
+            finally:
+                db.close()
+        _refresher_wake.wait(settings.OPTION_CHAIN_REFRESH_SECONDS)
+        _refresher_wake.clear()
+
+
+def track(items: Iterable) -> Dict[ChainKey, ChainAnalytics]:
+    """
+    The latest analytics of every underlying among `items`, which become the set the
+    background refresher fetches. Dhan allows one chain request every few seconds, so
+    fetching inline would hold the cycle for seconds per underlying; instead the cycle
+    gets the last refresh, and a newly tracked underlying wakes the refresher.
+    """
+    global _refresher
+    wanted: Dict[ChainKey, str] = {}
+    for item in items:
+        wanted.setdefault((item.exchange, str(item.security_id or item.symbol)), item.symbol)
+    with _tracked_lock:
+        added = wanted.keys() - _tracked.keys()
+        _tracked.clear()
+        _tracked.update(wanted)
+        if _refresher is None or not _refresher.is_alive():
+            _refresher_stop.clear()
+            _refresher = threading.Thread(target=_refresh_loop, name="option-chain-refresher", daemon=True)
+            _refresher.start()
+        elif added:
+            _refresher_wake.set()
+    return {key: _latest[key] for key in wanted if key in _latest}
+
+
+def stop_refresher():
+    global _refresher
+    _refresher_stop.set()
+    _refresher_wake.set()
+    if _refresher is not None:
+        _refresher.join(timeout=5.0)
+    _refresher = None
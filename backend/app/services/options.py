@@ -0,0 +1,244 @@
+from typing import Dict, Hashable, NamedTuple, Optional
+import numpy as np
+
+# Vectorized Black-Scholes (European, no dividends) for whole option chains.
+# Every function takes equal-shaped arrays; calls and puts are mixed in one
+# array and told apart by `is_call`, so a chain - or every chain of the
+# cycle concatenated - is priced in one pass.
+
+SQRT_2PI = np.sqrt(2 * np.pi)
+MIN_VOL = 1e-4
+MAX_VOL = 5.0
+YEAR_SECONDS = 365.0 * 86400
+# Below this much time value (two NSE ticks) an in-the-money premium carries no usable IV
+MIN_EXTRINSIC = 0.10
+
+
+def _erf(x: np.ndarray) -> np.ndarray:
+    """Abramowitz & Stegun 7.1.26 (|error| < 1.5e-7); numpy has no erf and scipy is not a dependency"""
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1.0 - poly * np.exp(-x * x))
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + _erf(x / np.sqrt(2.0)))
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / SQRT_2PI
+
+
+def _d1_d2(spot, strike, t, rate, vol):
+    vol_t = vol * np.sqrt(t)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * t) / vol_t
+    return d1, d1 - vol_t
+
+
+def price(spot, strike, t, rate, vol, is_call) -> np.ndarray:
+    d1, d2 = _d1_d2(spot, strike, t, rate, vol)
+    discounted = strike * np.exp(-rate * t)
+    call = spot * norm_cdf(d1) - discounted * norm_cdf(d2)
+    # Put-call parity keeps the put exact to the same precision as the call
+    return np.where(is_call, call, call - spot + discounted)
+
+
+def greeks(spot, strike, t, rate, vol, is_call) -> Dict[str, np.ndarray]:
+    """delta, gamma, theta (per calendar day) and vega (per 1 vol point)"""
+    d1, d2 = _d1_d2(spot, strike, t, rate, vol)
+    pdf = norm_pdf(d1)
+    sqrt_t = np.sqrt(t)
+    discounted = strike * np.exp(-rate * t)
+    cdf_d1, cdf_d2 = norm_cdf(d1), norm_cdf(d2)
+    decay = -spot * pdf * vol / (2 * sqrt_t)
+    theta_call = decay - rate * discounted * cdf_d2
+    theta_put = decay + rate * discounted * (1.0 - cdf_d2)
+    return {
+        "delta": np.where(is_call, cdf_d1, cdf_d1 - 1.0),
+        "gamma": pdf / (spot * vol * sqrt_t),
+        "theta": np.where(is_call, theta_call, theta_put) / 365.0,
+        "vega": spot * pdf * sqrt_t / 100.0,
+    }
+
+
+def implied_vol(premium, spot, strike, t, rate, is_call, iterations: int = 12, tol: float = 1e-6) -> np.ndarray:
+    """
+    Newton-Raphson from the Brenner-Subrahmanyam guess, every element at once.
+    Elements that stall (tiny vega deep in/out of the money) finish by bisection.
+    Premiums outside the no-arbitrage bounds give NaN.
+    """
+    premium, spot, strike, t, rate = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64)
+                                                           for a in (premium, spot, strike, t, rate)))
+    is_call = np.broadcast_to(np.asarray(is_call, dtype=bool), premium.shape)
+    discounted = strike * np.exp(-rate * t)
+    lower = np.where(is_call, np.maximum(spot - discounted, 0.0), np.maximum(discounted - spot, 0.0))
+    upper = np.where(is_call, spot, discounted)
+    valid = (premium > lower) & (premium < upper) & (t > 0) & (spot > 0) & (strike > 0)
+
+    vol = np.where(valid, np.sqrt(2 * np.pi / np.where(t > 0, t, 1.0)) * premium / np.where(spot > 0, spot, 1.0), np.nan)
+    vol = np.clip(vol, 0.05, 2.0)
+    active = valid.copy()
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for _ in range(iterations):
+            if not active.any():
+                break
+            idx = np.flatnonzero(active)
+            s, k, tt, r, c, v = spot.flat[idx], strike.flat[idx], t.flat[idx], rate.flat[idx], is_call.flat[idx], vol[idx]
+            diff = price(s, k, tt, r, v, c) - premium.flat[idx]
+            vega = s * norm_pdf(_d1_d2(s, k, tt, r, v)[0]) * np.sqrt(tt)
+            step = np.where(vega > 1e-8, diff / vega, np.nan)
+            new = v - step
+            ok = np.isfinite(new) & (new > MIN_VOL) & (new < MAX_VOL)
+            vol[idx] = np.where(ok, new, v)
+            done = ok & (np.abs(diff) < tol * np.maximum(premium.flat[idx], 1e-8))
+            # Stalled elements leave Newton and are bisected below
+            active[idx[done | ~ok]] = False
+            vol[idx[~ok]] = np.nan
+
+        stalled = valid & ~np.isfinite(vol)
+        if stalled.any():
+            idx = np.flatnonzero(stalled)
+            s, k, tt, r, c, target = (spot.flat[idx], strike.flat[idx], t.flat[idx], rate.flat[idx],
+                                      is_call.flat[idx], premium.flat[idx])
+            lo, hi = np.full(len(idx), MIN_VOL), np.full(len(idx), MAX_VOL)
+            for _ in range(60):
+                mid = 0.5 * (lo + hi)
+                above = price(s, k, tt, r, mid, c) > target
+                hi = np.where(above, mid, hi)
+                lo = np.where(above, lo, mid)
+            vol[idx] = 0.5 * (lo + hi)
+    return np.where(valid, vol, np.nan)
+
+
+class ChainAnalytics(NamedTuple):
+    """IV and greeks of one option chain, one row per strike (call and put side by side)"""
+    underlying: str
+    expiry: str
+    spot: float
+    t: float                   # years to expiry
+    strike: np.ndarray
+    call_ltp: np.ndarray
+    put_ltp: np.ndarray
+    call_oi: np.ndarray
+    put_oi: np.ndarray
+    call_iv: np.ndarray
+    put_iv: np.ndarray
+    call_delta: np.ndarray
+    put_delta: np.ndarray
+    gamma: np.ndarray          # identical for the call and the put of a strike
+    call_theta: np.ndarray
+    put_theta: np.ndarray
+    vega: np.ndarray           # identical for the call and the put of a strike
+    lot_size: int
+
+    @property
+    def atm_index(self) -> int:
+        return int(np.argmin(np.abs(self.strike - self.spot))) if len(self.strike) else -1
+
+    @property
+    def atm_iv(self) -> Optional[float]:
+        i = self.atm_index
+        if i < 0:
+            return None
+        ivs = np.array([self.call_iv[i], self.put_iv[i]])
+        ivs = ivs[np.isfinite(ivs)]
+        return float(ivs.mean()) if len(ivs) else None
+
+    @property
+    def pcr(self) -> Optional[float]:
+        """Put/call open-interest ratio"""
+        calls = float(np.nansum(self.call_oi))
+        return float(np.nansum(self.put_oi)) / calls if calls > 0 else None
+
+    @property
+    def max_pain(self) -> Optional[float]:
+        """Expiry price at which option writers pay out the least, over the listed strikes"""
+        if not len(self.strike):
+            return None
+        settle = self.strike[:, None]
+        payout = (np.maximum(settle - self.strike, 0) * np.nan_to_num(self.call_oi)
+                  + np.maximum(self.strike - settle, 0) * np.nan_to_num(self.put_oi)).sum(axis=1)
+        return float(self.strike[int(np.argmin(payout))])
+
+    def skew(self, delta: float = 0.25) -> Optional[float]:
+        """IV of the `delta` put minus IV of the `delta` call (positive = puts bid)"""
+        calls = np.isfinite(self.call_delta) & np.isfinite(self.call_iv)
+        puts = np.isfinite(self.put_delta) & np.isfinite(self.put_iv)
+        if not calls.any() or not puts.any():
+            return None
+        call_iv = self.call_iv[calls][np.argmin(np.abs(self.call_delta[calls] - delta))]
+        put_iv = self.put_iv[puts][np.argmin(np.abs(self.put_delta[puts] + delta))]
+        return float(put_iv - call_iv)
+
+    def summary(self) -> dict:
+        return {"underlying": self.underlying, "expiry": self.expiry, "spot": self.spot,
+                "strikes": int(len(self.strike)), "atm_strike": float(self.strike[self.atm_index]) if len(self.strike) else None,
+                "atm_iv": self.atm_iv, "pcr": self.pcr, "max_pain": self.max_pain, "skew_25d": self.skew()}
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({name: getattr(self, name) for name in (
+            "strike", "call_ltp", "call_oi", "call_iv", "call_delta", "call_theta",
+            "put_ltp", "put_oi", "put_iv", "put_delta", "put_theta", "gamma", "vega")})
+
+
+class RawChain(NamedTuple):
+    """One fetched chain before analytics: per-strike premiums and open interest"""
+    underlying: str
+    expiry: str
+    spot: float
+    t: float
+    strike: np.ndarray
+    call_ltp: np.ndarray
+    put_ltp: np.ndarray
+    call_oi: np.ndarray
+    put_oi: np.ndarray
+    lot_size: int = 1
+
+
+def analyze_chains(chains: Dict[Hashable, RawChain], rate: float) -> Dict[Hashable, ChainAnalytics]:
+    """
+    IV and greeks of every chain in one vectorized pass: all calls and puts of all
+    underlyings are concatenated, solved together and split back per chain.
+    """
+    keys = [k for k, c in chains.items() if len(c.strike)]
+    if not keys:
+        return {}
+    sizes = np.array([len(chains[k].strike) for k in keys])
+    strike = np.concatenate([chains[k].strike for k in keys]).astype(np.float64)
+    spot = np.repeat([chains[k].spot for k in keys], sizes).astype(np.float64)
+    t = np.repeat([max(chains[k].t, 1e-6) for k in keys], sizes)
+    premium = np.concatenate([np.concatenate([chains[k].call_ltp for k in keys]),
+                              np.concatenate([chains[k].put_ltp for k in keys])]).astype(np.float64)
+    strike2, spot2, t2 = np.tile(strike, 2), np.tile(spot, 2), np.tile(t, 2)
+    is_call = np.arange(len(premium)) < len(strike)
+
+    iv = implied_vol(premium, spot2, strike2, t2, rate, is_call)
+    n = len(strike)
+    # Deep in-the-money premiums are almost all intrinsic value; such a side takes the
+    # out-of-the-money side's IV, and a side without any IV borrows the other one's
+    extrinsic = premium - np.maximum(np.where(is_call, spot2 - strike2, strike2 - spot2), 0.0)
+    iv[extrinsic < MIN_EXTRINSIC] = np.nan
+    call_iv, put_iv = iv[:n], iv[n:]
+    fill_call = np.where(np.isfinite(call_iv), call_iv, put_iv)
+    fill_put = np.where(np.isfinite(put_iv), put_iv, call_iv)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        g = greeks(spot2, strike2, t2, rate, np.concatenate([fill_call, fill_put]), is_call)
+
+    result = {}
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    for j, key in enumerate(keys):
+        lo, hi = bounds[j], bounds[j + 1]
+        c = chains[key]
+        result[key] = ChainAnalytics(
+            underlying=c.underlying, expiry=c.expiry, spot=float(c.spot), t=float(c.t),
+            strike=strike[lo:hi], call_ltp=premium[lo:hi], put_ltp=premium[n + lo:n + hi],
+            call_oi=np.asarray(c.call_oi, dtype=np.float64), put_oi=np.asarray(c.put_oi, dtype=np.float64),
+            call_iv=call_iv[lo:hi], put_iv=put_iv[lo:hi],
+            call_delta=g["delta"][lo:hi], put_delta=g["delta"][n + lo:n + hi],
+            gamma=g["gamma"][lo:hi], call_theta=g["theta"][lo:hi], put_theta=g["theta"][n + lo:n + hi],
+            vega=g["vega"][lo:hi], lot_size=c.lot_size,
+        )
+    return result
@@ -0,0 +1,323 @@
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.services.candle_store import DHAN_EPOCH_OFFSET
+from app.services.candles import epoch_seconds
+import pandas as pd
+import numpy as np
+import itertools
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+InstrumentKey = Tuple[str, str]  # (exchange, symbol)
+
+
+class PaperOrder:
+    """A simulated order. SL-M orders trigger at `trigger`; LIMIT orders fill at `price` or better."""
+
+    def __init__(self, order_id: str, symbol: str, exchange: str, security_id: str, side: str,
+                 qty: int, order_type: str, price: float, trigger: float, product: str,
+                 submitted_ts: float, eligible_ts: float, strategy_id: Optional[int] = None,
+                 sl: float = None, target: float = None, oco_group: Optional[str] = None,
+                 reason: str = ""):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.exchange = exchange
+        self.security_id = security_id
+        self.side = side
+        self.qty = qty
+        self.order_type = order_type  # MARKET, LIMIT, SL-M
+        self.price = price
+        self.trigger = trigger
+        self.product = product
+        self.submitted_ts = submitted_ts
+        self.eligible_ts = eligible_ts
+        self.strategy_id = strategy_id
+        self.sl = sl
+        self.target = target
+        self.oco_group = oco_group
+        self.reason = reason
+        self.status = "PENDING"  # PENDING, FILLED, CANCELLED
+        self.fill_price: Optional[float] = None
+        self.fill_ts: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in self.__dict__.items()}
+
+
+class PaperPosition:
+    def __init__(self, symbol: str, exchange: str, security_id: str, product: str):
+        self.symbol = symbol
+        self.exchange = exchange
+        self.security_id = security_id
+        self.product = product
+        self.qty = 0
+        self.avg_price = 0.0
+        self.realized_pnl = 0.0
+        self.last_price = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "symbol": self.symbol,
+            "exchange": self.exchange,
+            "security_id": self.security_id,
+            "product": self.product,
+            "qty": self.qty,
+            "avg_price": round(self.avg_price, 4),
+            "last_price": self.last_price,
+            "realized_pnl": round(self.realized_pnl, 2),
+            "unrealized_pnl": round((self.last_price - self.avg_price) * self.qty, 2) if self.qty else 0.0,
+        }
+
+
+def bar_timestamps(df: pd.DataFrame) -> Optional[np.ndarray]:
+    """Epoch seconds of each bar of an intraday candle frame"""
+    ts = epoch_seconds(df)
+    if ts is not None:
+        return ts
+    if "start_Time" in df.columns:
+        return df["start_Time"].to_numpy(dtype=np.int64) + DHAN_EPOCH_OFFSET
+    if "timestamp" in df.columns:
+        return pd.to_numeric(df["timestamp"], errors="coerce").to_numpy(dtype=np.float64).astype(np.int64)
+    return None
+
+
+class PaperBroker:
+    """
+    In-memory execution simulator.
+    Orders become eligible `latency_ms` after submission and fill against the
+    first bar (or tick) that starts at or after that time:
+      MARKET  at the bar open, plus adverse slippage
+      LIMIT   at the open if it is already through the limit, else at the limit if the range touches it
+      SL-M    at the open if it gapped through the trigger, else at the trigger, plus adverse slippage
+    An entry with sl/target spawns an OCO pair (SL-M stop + LIMIT target). If a
+    bar touches both, the stop is assumed to have filled first.
+    """
+
+    def __init__(self, cash: float, slippage_bps: float, latency_ms: float, fee_per_order: float,
+                 clock=time.time):
+        self.starting_cash = cash
+        self.cash = cash
+        self.slippage = slippage_bps / 10000
+        self.latency = latency_ms / 1000
+        self.fee_per_order = fee_per_order
+        self.fees = 0.0
+        self.clock = clock
+        self._ids = itertools.count(1)
+        # Keyed by (exchange, symbol): the same symbol on NSE and BSE is two instruments
+        self._pending: Dict[InstrumentKey, List[PaperOrder]] = {}  # open orders
+        self._orders: Dict[str, PaperOrder] = {}
+        self._positions: Dict[InstrumentKey, PaperPosition] = {}
+        self._last_bar_ts: Dict[InstrumentKey, int] = {}
+        self._lock = threading.RLock()
+
+    def submit(self, symbol: str, exchange: str, side: str, qty: int, order_type: str = "MARKET",
+               price: float = 0, product: str = "INTRADAY", security_id: str = "",
+               sl: float = None, target: float = None, strategy_id: Optional[int] = None,
+               trigger: float = 0, oco_group: Optional[str] = None, reason: str = "") -> PaperOrder:
+        now = self.clock()
+        with self._lock:
+            order = PaperOrder(
+                order_id=f"PAPER_{next(self._ids)}", symbol=symbol, exchange=exchange,
+                security_id=security_id, side=side, qty=qty, order_type=order_type, price=price,
+                trigger=trigger, product=product, submitted_ts=now, eligible_ts=now + self.latency,
+                strategy_id=strategy_id, sl=sl, target=target, oco_group=oco_group, reason=reason,
+            )
+            self._orders[order.order_id] = order
+            self._pending.setdefault((exchange, symbol), []).append(order)
+        return order
+
+    def cancel(self, order_id: str) -> bool:
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None or order.status != "PENDING":
+                return False
+            order.status = "CANCELLED"
+            self._pending[(order.exchange, order.symbol)].remove(order)
+            return True
+
+    def on_frame(self, exchange: str, symbol: str, df: pd.DataFrame) -> List[PaperOrder]:
+        """Feed an intraday candle frame; only bars newer than the last one seen are simulated"""
+        if df is None or df.empty:
+            return []
+        key = (exchange, symbol)
+        last_close = float(df["close"].iloc[-1])
+        position = self._positions.get(key)
+        if position is not None:
+            position.last_price = last_close
+        if not self._pending.get(key):
+            return []
+        ts = bar_timestamps(df)
+        if ts is None:
+            return []
+        start = int(np.searchsorted(ts, self._last_bar_ts.get(key, -1), side="right"))
+        if start >= len(ts):
+            return []
+        # The newest bar may still be forming, so it is simulated again next time
+        self._last_bar_ts[key] = int(ts[-1]) - 1
+        opens = df["open"].to_numpy()[start:]
+        highs = df["high"].to_numpy()[start:]
+        lows = df["low"].to_numpy()[start:]
+        closes = df["close"].to_numpy()[start:]
+        fills = []
+        for i in range(len(opens)):
+            fills.extend(self.on_bar(exchange, symbol, int(ts[start + i]), float(opens[i]), float(highs[i]),
+                                     float(lows[i]), float(closes[i])))
+        return fills
+
+    def on_tick(self, exchange: str, symbol: str, ts: float, price: float) -> List[PaperOrder]:
+        return self.on_bar(exchange, symbol, ts, price, price, price, price)
+
+    def on_bar(self, exchange: str, symbol: str, ts: float, o: float, h: float, l: float,
+               c: float) -> List[PaperOrder]:
+        key = (exchange, symbol)
+        fills = []
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending:
+                # Stops before limits so an OCO pair hit in the same bar resolves pessimistically
+                for order in sorted(pending, key=lambda x: x.order_type != "SL-M"):
+                    if order.status != "PENDING" or ts < order.eligible_ts:
+                        continue
+                    fill = self._match(order, o, h, l)
+                    if fill is None:
+                        continue
+                    self._fill(order, fill, ts)
+                    fills.append(order)
+                self._pending[key] = [x for x in self._pending[key] if x.status == "PENDING"]
+            position = self._positions.get(key)
+            if position is not None:
+                position.last_price = c
+        return fills
+
+    def _match(self, order: PaperOrder, o: float, h: float, l: float) -> Optional[float]:
+        buy = order.side == "BUY"
+        slip = 1 + self.slippage if buy else 1 - self.slippage
+        if order.order_type == "MARKET":
+            return o * slip
+        if order.order_type == "LIMIT":
+            if buy:
+                return o if o <= order.price else (order.price if l <= order.price else None)
+            return o if o >= order.price else (order.price if h >= order.price else None)
+        if order.order_type == "SL-M":
+            if buy:
+                return (max(o, order.trigger) * slip) if h >= order.trigger else None
+            return (min(o, order.trigger) * slip) if l <= order.trigger else None
+        return None
+
+    def _fill(self, order: PaperOrder, price: float, ts: float):
+        order.status = "FILLED"
+        order.fill_price = price
+        order.fill_ts = ts
+        signed = order.qty if order.side == "BUY" else -order.qty
+        self.cash -= signed * price + self.fee_per_order
+        self.fees += self.fee_per_order
+
+        key = (order.exchange, order.symbol)
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._positions[key] = PaperPosition(order.symbol, order.exchange,
+                                                       order.security_id, order.product)
+        held = pos.qty
+        if held != 0 and (held > 0) != (signed > 0):
+            closed = min(abs(held), abs(signed))
+            pos.realized_pnl += (price - pos.avg_price) * closed * (1 if held > 0 else -1)
+        new_qty = held + signed
+        if new_qty == 0:
+            pos.avg_price = 0.0
+        elif held == 0 or (held > 0) != (new_qty > 0):
+            pos.avg_price = price
+        elif (held > 0) == (signed > 0):
+            pos.avg_price = (pos.avg_price * abs(held) + price * abs(signed)) / abs(new_qty)
+        pos.qty = new_qty
+        pos.last_price = price
+        pos.product = order.product
+
+        # The other leg of a filled OCO pair is cancelled
+        if order.oco_group:
+            for other in self._pending.get(key, []):
+                if other.oco_group == order.oco_group and other.status == "PENDING":
+                    other.status = "CANCELLED"
+
+        # Entry with protective levels: arm the bracket, eligible from the next bar
+        if order.sl or order.target:
+            exit_side = "SELL" if order.side == "BUY" else "BUY"
+            group = f"OCO_{order.order_id}"
+            now = ts + 1
+            for order_type, level, reason in (("SL-M", order.sl, "SL hit"), ("LIMIT", order.target, "Target hit")):
+                if not level:
+                    continue
+                child = PaperOrder(
+                    order_id=f"PAPER_{next(self._ids)}", symbol=order.symbol, exchange=order.exchange,
+                    security_id=order.security_id, side=exit_side, qty=order.qty, order_type=order_type,
+                    price=level if order_type == "LIMIT" else 0, trigger=level if order_type == "SL-M" else 0,
+                    product=order.product, submitted_ts=now, eligible_ts=now,
+                    strategy_id=order.strategy_id, oco_group=group, reason=reason,
+                )
+                self._orders[child.order_id] = child
+                self._pending.setdefault(key, []).append(child)
+
+    def flatten(self, product: Optional[str] = "INTRADAY") -> List[PaperOrder]:
+        """Close positions at their last price and cancel their working orders (auto square-off)"""
+        fills = []
+        with self._lock:
+            for key, pos in self._positions.items():
+                if pos.qty == 0 or (product and pos.product != product):
+                    continue
+                for order in self._pending.get(key, []):
+                    order.status = "CANCELLED"
+                self._pending[key] = []
+                order = self.submit(pos.symbol, pos.exchange, "SELL" if pos.qty > 0 else "BUY", abs(pos.qty),
+                                    product=pos.product, security_id=pos.security_id, reason="Auto square-off")
+                self._pending[key].remove(order)
+                self._fill(order, pos.last_price, self.clock())
+                fills.append(order)
+        return fills
+
+    def positions(self) -> List[dict]:
+        with self._lock:
+            return [p.to_dict() for p in self._positions.values() if p.qty or p.realized_pnl]
+
+    def open_orders(self) -> List[dict]:
+        with self._lock:
+            return [o.to_dict() for orders in self._pending.values() for o in orders]
+
+    def account(self) -> dict:
+        with self._lock:
+            market_value = sum(p.qty * p.last_price for p in self._positions.values())
+            realized = sum(p.realized_pnl for p in self._positions.values())
+            unrealized = sum((p.last_price - p.avg_price) * p.qty for p in self._positions.values() if p.qty)
+            margin = sum(abs(p.qty) * p.last_price * (settings.INTRADAY_MARGIN_PCT / 100 if p.product == "INTRADAY" else 1)
+                         for p in self._positions.values())
+        return {
+            "starting_cash": self.starting_cash,
+            "cash": round(self.cash, 2),
+            "equity": round(self.cash + market_value, 2),
+            "available_balance": round(self.cash + market_value - margin, 2),
+            "used_margin": round(margin, 2),
+            "realized_pnl": round(realized, 2),
+            "unrealized_pnl": round(unrealized, 2),
+            "fees": round(self.fees, 2),
+        }
+
+
+_broker: Optional[PaperBroker] = None
+
+
+def get_broker() -> PaperBroker:
+    global _broker
+    if _broker is None:
+        _broker = PaperBroker(
+            cash=settings.PAPER_CAPITAL,
+            slippage_bps=settings.PAPER_SLIPPAGE_BPS,
+            latency_ms=settings.PAPER_LATENCY_MS,
+            fee_per_order=settings.PAPER_FEE_PER_ORDER,
+        )
+    return _broker
+
+
+def is_active() -> bool:
+    """True once any paper order has been routed here in this process"""
+    return _broker is not None
@@ -0,0 +1,393 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from datetime import datetime, date, timezone
+from sqlalchemy.orm import Session
+from app.models.order import GlobalSettings, Order
+from app.models.config_dhan import ConfigDhan
+from app.services.risk_manager import calculate_position_size, is_paper_trading
+from app.core.config import settings
+import numpy as np
+import threading
+import logging
+import csv
+import os
+
+logger = logging.getLogger(__name__)
+
+InstrumentKey = Tuple[str, str]  # (exchange, symbol)
+
+_UNKNOWN_SECTOR = 0
+
+
+class RiskLimits(NamedTuple):
+    capital: float
+    risk_per_trade_pct: float
+    atr_multiplier: float
+    max_capital_per_trade_pct: float
+    max_symbol_exposure_pct: float
+    max_sector_exposure_pct: float
+    max_strategy_exposure_pct: float
+    max_gross_exposure_pct: float
+    max_net_exposure_pct: float
+    max_margin_pct: float
+    max_positions: int
+    max_daily_loss_pct: float
+
+
+class RiskDecision(NamedTuple):
+    approved: bool
+    reason: str
+    qty: int
+
+
+def load_limits(gs: GlobalSettings, capital: float, account: Optional[ConfigDhan] = None) -> RiskLimits:
+    """Global limits, with the account's own overrides where it sets them"""
+    def pick(field: str, default):
+        value = getattr(account, field, None) if account is not None else None
+        return value if value is not None else (getattr(gs, field) or default)
+
+    return RiskLimits(
+        capital=capital,
+        risk_per_trade_pct=settings.RISK_PER_TRADE_PCT,
+        atr_multiplier=settings.RISK_ATR_MULTIPLIER,
+        max_capital_per_trade_pct=pick("max_capital_per_trade_pct", 10.0),
+        max_symbol_exposure_pct=settings.MAX_SYMBOL_EXPOSURE_PCT,
+        max_sector_exposure_pct=settings.MAX_SECTOR_EXPOSURE_PCT,
+        max_strategy_exposure_pct=settings.MAX_STRATEGY_EXPOSURE_PCT,
+        max_gross_exposure_pct=settings.MAX_GROSS_EXPOSURE_PCT,
+        max_net_exposure_pct=settings.MAX_NET_EXPOSURE_PCT,
+        max_margin_pct=settings.MAX_MARGIN_PCT,
+        max_positions=pick("max_positions", 3),
+        max_daily_loss_pct=pick("max_daily_loss_pct", 2.0),
+    )
+
+
+def load_sector_map() -> Dict[str, str]:
+    """symbol -> sector from <DATA_DIR>/sectors.csv (columns: symbol, sector), if present"""
+    path = os.path.join(settings.DATA_DIR, "sectors.csv")
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="") as f:
+        return {row["symbol"]: row["sector"] for row in csv.DictReader(f)}
+
+
+class ExposureBook:
+    """
+    Positions as dense arrays: one column per instrument slot and one row per
+    strategy, so every aggregate (per symbol, sector, strategy, gross, net,
+    margin) is a single vector operation.
+    """
+
+    def __init__(self, capacity: int = 256, strategies: int = 16):
+        self._slots: Dict[InstrumentKey, int] = {}
+        self._symbols: List[str] = []
+        self._strategies: Dict[int, int] = {}
+        self._sectors: Dict[str, int] = {"UNKNOWN": _UNKNOWN_SECTOR}
+        self._sector_map = load_sector_map()
+        self.qty = np.zeros((strategies, capacity), dtype=np.int64)
+        self.avg_price = np.zeros((strategies, capacity))
+        self.price = np.zeros(capacity)
+        self.sector = np.zeros(capacity, dtype=np.int64)
+        self.margin_rate = np.ones(capacity)
+        self.intraday = np.zeros(capacity, dtype=bool)
+        self.realized_pnl = 0.0
+        self.lock = threading.RLock()
+
+    def _grow(self, rows: int, cols: int):
+        r, c = self.qty.shape
+        if rows <= r and cols <= c:
+            return
+        new_r, new_c = max(r, rows * 2 if rows > r else r), max(c, cols * 2 if cols > c else c)
+        for name in ("qty", "avg_price"):
+            old = getattr(self, name)
+            grown = np.zeros((new_r, new_c), dtype=old.dtype)
+            grown[:r, :c] = old
+            setattr(self, name, grown)
+        for name, fill in (("price", 0.0), ("sector", 0), ("margin_rate", 1.0), ("intraday", False)):
+            old = getattr(self, name)
+            grown = np.full(new_c, fill, dtype=old.dtype)
+            grown[:c] = old
+            setattr(self, name, grown)
+
+    def slot(self, key: InstrumentKey, symbol: str = "") -> int:
+        idx = self._slots.get(key)
+        if idx is None:
+            idx = len(self._slots)
+            self._grow(self.qty.shape[0], idx + 1)
+            self._slots[key] = idx
+            self._symbols.append(symbol or key[1])
+            sector = self._sector_map.get(symbol, "UNKNOWN")
+            self.sector[idx] = self._sectors.setdefault(sector, len(self._sectors))
+        return idx
+
+    def strategy_row(self, strategy_id: Optional[int]) -> int:
+        sid = strategy_id or 0
+        row = self._strategies.get(sid)
+        if row is None:
+            row = len(self._strategies)
+            self._grow(row + 1, self.qty.shape[1])
+            self._strategies[sid] = row
+        return row
+
+    def mark(self, key: InstrumentKey, price: float):
+        idx = self._slots.get(key)
+        if idx is not None and price > 0:
+            self.price[idx] = price
+
+    def has_positions(self, strategy_id: Optional[int]) -> bool:
+        row = self._strategies.get(strategy_id or 0)
+        return row is not None and bool(self.qty[row].any())
+
+    def position(self, strategy_id: Optional[int], key: InstrumentKey) -> int:
+        idx, row = self._slots.get(key), self._strategies.get(strategy_id or 0)
+        if idx is None or row is None:
+            return 0
+        return int(self.qty[row, idx])
+
+    def apply_fill(self, strategy_id: Optional[int], key: InstrumentKey, symbol: str,
+                   side: str, qty: int, price: float, product: str = "INTRADAY"):
+        with self.lock:
+            idx, row = self.slot(key, symbol), self.strategy_row(strategy_id)
+            signed = qty if side == "BUY" else -qty
+            held = int(self.qty[row, idx])
+            if held != 0 and (held > 0) != (signed > 0):
+                closed = min(abs(held), abs(signed))
+                direction = 1 if held > 0 else -1
+                self.realized_pnl += (price - self.avg_price[row, idx]) * closed * direction
+            new_qty = held + signed
+            if new_qty == 0:
+                self.avg_price[row, idx] = 0.0
+            elif held == 0 or (held > 0) != (new_qty > 0):
+                self.avg_price[row, idx] = price
+            elif (held > 0) == (signed > 0):
+                self.avg_price[row, idx] = (self.avg_price[row, idx] * abs(held) + price * abs(signed)) / abs(new_qty)
+            self.qty[row, idx] = new_qty
+            if price > 0:
+                self.price[idx] = price
+            self.intraday[idx] = product == "INTRADAY"
+            self.margin_rate[idx] = (settings.INTRADAY_MARGIN_PCT if product == "INTRADAY" else 100.0) / 100
+
+    def snapshot(self) -> dict:
+        """All exposure aggregates in one vectorized pass"""
+        n, s = len(self._slots), len(self._strategies)
+        qty = self.qty[:s, :n]
+        price = self.price[:n]
+        net_qty = qty.sum(axis=0)
+        symbol_notional = net_qty * price
+        abs_notional = np.abs(symbol_notional)
+        unrealized = float(((price - self.avg_price[:s, :n]) * qty).sum())
+        return {
+            "symbol_notional": symbol_notional,
+            "sector_gross": np.bincount(self.sector[:n], weights=abs_notional, minlength=len(self._sectors)),
+            "strategy_gross": np.abs(qty) @ price if s else np.zeros(0),
+            "gross": float(abs_notional.sum()),
+            "net": float(symbol_notional.sum()),
+            "margin": float((abs_notional * self.margin_rate[:n]).sum()),
+            "open_positions": int(np.count_nonzero(net_qty)),
+            "realized_pnl": self.realized_pnl,
+            "unrealized_pnl": unrealized,
+        }
+
+    def summary(self) -> dict:
+        with self.lock:
+            snap = self.snapshot()
+            sectors = {name: float(snap["sector_gross"][i]) for name, i in self._sectors.items()
+                       if i < len(snap["sector_gross"]) and snap["sector_gross"][i]}
+            strategies = {sid: float(snap["strategy_gross"][row]) for sid, row in self._strategies.items()
+                          if snap["strategy_gross"][row]}
+            symbols = {self._symbols[i]: float(v) for i, v in enumerate(snap["symbol_notional"]) if v}
+        return {
+            "gross_exposure": snap["gross"],
+            "net_exposure": snap["net"],
+            "margin_used": snap["margin"],
+            "open_positions": snap["open_positions"],
+            "realized_pnl": round(snap["realized_pnl"], 2),
+            "unrealized_pnl": round(snap["unrealized_pnl"], 2),
+            "by_symbol": symbols,
+            "by_sector": sectors,
+            "by_strategy": strategies,
+        }
+
+    def reset_day(self):
+        """Start of day: intraday positions were squared off and realized PnL restarts"""
+        with self.lock:
+            self.qty[:, self.intraday] = 0
+            self.avg_price[:, self.intraday] = 0.0
+            self.realized_pnl = 0.0
+
+    def check_batch(self, intents: list, limits: RiskLimits) -> List[RiskDecision]:
+        """
+        Size and pre-trade check a whole cycle's intents against one exposure
+        snapshot. Approved intents count against the limits of later ones in
+        the same batch. Entries are downsized to fit the tightest limit
+        rather than rejected outright.
+        """
+        with self.lock:
+            for intent in intents:
+                self.slot((intent.exchange, intent.symbol), intent.symbol)
+                self.strategy_row(intent.strategy_id)
+            snap = self.snapshot()
+            symbol_notional = snap["symbol_notional"].copy()
+            sector_gross = snap["sector_gross"].copy()
+            strategy_gross = snap["strategy_gross"].copy()
+            gross, net, margin = snap["gross"], snap["net"], snap["margin"]
+            open_positions = snap["open_positions"]
+            pending: Dict[tuple, int] = {}
+
+            capital = limits.capital
+            loss_breached = (capital > 0 and snap["realized_pnl"] + snap["unrealized_pnl"]
+                             <= -capital * limits.max_daily_loss_pct / 100)
+
+            decisions = []
+            for intent in intents:
+                idx = self._slots[(intent.exchange, intent.symbol)]
+                row = self._strategies[intent.strategy_id or 0]
+                price = intent.price or intent.ref_price or float(self.price[idx])
+                sign = 1 if intent.side == "BUY" else -1
+
+                if intent.is_exit:
+                    held = int(self.qty[row, idx]) + pending.get((row, idx), 0)
+                    if held == 0 or (held > 0) == (sign > 0):
+                        decisions.append(RiskDecision(False, "No open position to exit", 0))
+                        continue
+                    qty = abs(held)
+                    pending[(row, idx)] = pending.get((row, idx), 0) + sign * qty
+                    old = symbol_notional[idx]
+                    symbol_notional[idx] = old + sign * qty * price
+                    gross += abs(symbol_notional[idx]) - abs(old)
+                    net += sign * qty * price
+                    decisions.append(RiskDecision(True, "OK (exit)", qty))
+                    continue
+
+                if loss_breached:
+                    decisions.append(RiskDecision(False, f"Daily loss limit ({limits.max_daily_loss_pct}%) reached", 0))
+                    continue
+                if capital <= 0:
+                    decisions.append(RiskDecision(False, "No capital available", 0))
+                    continue
+                if not price or price <= 0:
+                    decisions.append(RiskDecision(False, "No reference price to size the trade", 0))
+                    continue
+
+                old = symbol_notional[idx]
+                if old == 0 and open_positions >= limits.max_positions:
+                    decisions.append(RiskDecision(False, f"Max positions ({limits.max_positions}) reached", 0))
+                    continue
+
+                # Risk-based size from ATR (or the explicit SL if wider), capped by capital per trade
+                stop_distance = (intent.atr or price * 0.01) * limits.atr_multiplier
+                if intent.sl:
+                    stop_distance = max(stop_distance, abs(price - intent.sl))
+                qty = calculate_position_size(capital, limits.risk_per_trade_pct, stop_distance, price)
+                qty = min(qty, int(capital * limits.max_capital_per_trade_pct / 100 / price))
+
+                # Remaining room under each notional limit for this direction
+                rate = (settings.INTRADAY_MARGIN_PCT if intent.product == "INTRADAY" else 100.0) / 100
+                rooms = {
+                    "symbol": capital * limits.max_symbol_exposure_pct / 100 - sign * old,
+                    "strategy": capital * limits.max_strategy_exposure_pct / 100 - strategy_gross[row],
+                    "gross": capital * limits.max_gross_exposure_pct / 100 - gross,
+                    "net": capital * limits.max_net_exposure_pct / 100 - sign * net,
+                    "margin": (capital * limits.max_margin_pct / 100 - margin) / rate,
+                }
+                if self.sector[idx] != _UNKNOWN_SECTOR:
+                    rooms["sector"] = capital * limits.max_sector_exposure_pct / 100 - sector_gross[self.sector[idx]]
+                binding = min(rooms, key=rooms.get)
+                qty = min(qty, int(max(rooms[binding], 0) / price))
+                if qty < 1:
+                    reason = f"{binding} exposure limit reached" if rooms[binding] < price else "Risk budget too small"
+                    decisions.append(RiskDecision(False, reason, 0))
+                    continue
+
+                notional = qty * price
+                symbol_notional[idx] = old + sign * notional
+                gross += abs(symbol_notional[idx]) - abs(old)
+                net += sign * notional
+                margin += notional * rate
+                strategy_gross[row] += notional
+                sector_gross[self.sector[idx]] += notional
+                if old == 0:
+                    open_positions += 1
+                pending[(row, idx)] = pending.get((row, idx), 0) + sign * qty
+                decisions.append(RiskDecision(True, "OK", qty))
+            return decisions
+
+    def rebuild_from_orders(self, db: Session, account_id: Optional[int] = None):
+        """
+        Replay one account's recorded fills so a restart doesn't forget open exposure:
+        carried products (CNC, MARGIN) from every earlier session, then all of today's.
+        Paper orders are recorded EXECUTED once the paper broker fills them, like live ones.
+        """
+        today = date.today()
+        today_start = datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
+        filled = db.query(Order).filter(
+            Order.status == "EXECUTED",
+            Order.account_id.is_(None) if account_id is None else Order.account_id == account_id,
+        )
+        carried = filled.filter(Order.product != "INTRADAY", Order.timestamp < today_start).order_by(Order.timestamp).all()
+        for o in carried:
+            self.apply_fill(o.strategy_id, (o.exchange, o.symbol), o.symbol, o.side, o.qty,
+                            o.price or 0.0, o.product)
+        self.reset_day()  # earlier sessions' round trips are not today's PnL
+        orders = filled.filter(Order.timestamp >= today_start).order_by(Order.timestamp).all()
+        for o in orders:
+            self.apply_fill(o.strategy_id, (o.exchange, o.symbol), o.symbol, o.side, o.qty,
+                            o.price or 0.0, o.product or "INTRADAY")
+        if carried or orders:
+            logger.info(f"Exposure book rebuilt from {len(carried)} carried and {len(orders)} of today's orders")
+
+
+_book: Optional[ExposureBook] = None
+_account_books: Dict[int, ExposureBook] = {}
+_book_lock = threading.Lock()
+
+
+def get_book(db: Optional[Session] = None) -> ExposureBook:
+    """Book of the primary account (and of paper trading)"""
+    global _book
+    with _book_lock:
+        if _book is None:
+            _book = ExposureBook()
+            if db is not None:
+                try:
+                    _book.rebuild_from_orders(db)
+                except Exception as e:
+                    logger.error(f"Exposure book rebuild failed: {e}")
+    return _book
+
+
+def get_account_book(db: Optional[Session], account_id: int) -> ExposureBook:
+    """Book of a secondary account, rebuilt from its own orders on first use"""
+    with _book_lock:
+        book = _account_books.get(account_id)
+        if book is None:
+            book = _account_books[account_id] = ExposureBook()
+            if db is not None:
+                try:
+                    book.rebuild_from_orders(db, account_id)
+                except Exception as e:
+                    logger.error(f"Exposure book rebuild failed for account {account_id}: {e}")
+    return book
+
+
+def account_books() -> Dict[int, ExposureBook]:
+    with _book_lock:
+        return dict(_account_books)
+
+
+def get_capital(db: Session, gs: GlobalSettings, account: Optional[ConfigDhan] = None) -> float:
+    """Trading capital: the account's configured capital, paper capital, or the broker's start-of-day limit"""
+    if account is not None and account.capital:
+        return float(account.capital)
+    if is_paper_trading(gs):
+        return settings.PAPER_CAPITAL
+    from app.services import dhan_client
+    funds = dhan_client.get_fund_limits(db, account)
+    data = funds.get("data", funds) if isinstance(funds, dict) else {}
+    for field in ("sodLimit", "availabelBalance", "availableBalance"):
+        try:
+            value = float(data.get(field) or 0)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            return value
+    return 0.0
@@ -0,0 +1,222 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+import threading
+import tracemalloc
+import logging
+import sys
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class OnBarStats:
+    """Running on_bar timings per (strategy, symbol)"""
+
+    def __init__(self):
+        # (strategy, symbol) -> [calls, total_s, max_s, last_s]
+        self._stats: Dict[Tuple[str, str], list] = {}
+
+    def record(self, strategy: str, symbol: str, seconds: float):
+        entry = self._stats.get((strategy, symbol))
+        if entry is None:
+            self._stats[(strategy, symbol)] = [1, seconds, seconds, seconds]
+            return
+        entry[0] += 1
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+        entry[3] = seconds
+
+    def slowest(self, n: int = 10, by: str = "max") -> List[dict]:
+        rows = []
+        for (strategy, symbol), (calls, total, worst, last) in list(self._stats.items()):
+            rows.append({
+                "strategy": strategy,
+                "symbol": symbol,
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total / calls * 1000, 3),
+                "max_ms": round(worst * 1000, 3),
+                "last_ms": round(last * 1000, 3),
+            })
+        key = {"max": "max_ms", "mean": "mean_ms", "last": "last_ms", "total": "total_ms"}.get(by, "max_ms")
+        rows.sort(key=lambda r: r[key], reverse=True)
+        return rows[:n]
+
+    def reset(self):
+        self._stats.clear()
+
+
+class _StackSampler(threading.Thread):
+    """Samples the call stack of one thread at a fixed interval (statistical CPU profile)"""
+
+    def __init__(self, target_thread_id: int, interval: float, samples: Counter):
+        super().__init__(name="cycle-profiler", daemon=True)
+        self._target = target_thread_id
+        self._interval = interval
+        self._samples = samples
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self._samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1)
+
+
+class CycleCapture:
+    """CPU samples and a memory allocation diff over the next K strategy cycles"""
+
+    def __init__(self, cycles: int, interval_ms: float, top_allocations: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.cycles = cycles
+        self.interval = interval_ms / 1000
+        self.top_allocations = top_allocations
+        self.cycles_done = 0
+        self.status = "pending"  # pending, running, done, failed
+        self.requested_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.cpu_path: Optional[str] = None
+        self.memory_path: Optional[str] = None
+        self._samples: Counter = Counter()
+        self._sampler: Optional[_StackSampler] = None
+        self._baseline = None
+        self._owns_tracemalloc = False
+
+    def to_dict(self) -> dict:
+        return {
+            "capture_id": self.id,
+            "status": self.status,
+            "cycles": self.cycles,
+            "cycles_done": self.cycles_done,
+            "interval_ms": self.interval * 1000,
+            "requested_at": self.requested_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "cpu_samples": sum(self._samples.values()),
+            "cpu_artifact": self.cpu_path is not None,
+            "memory_artifact": self.memory_path is not None,
+        }
+
+
+_on_bar_stats = OnBarStats()
+_captures: Dict[str, CycleCapture] = {}
+_active: Optional[CycleCapture] = None
+_lock = threading.Lock()
+
+
+def record_on_bar(strategy: str, symbol: str, seconds: float):
+    _on_bar_stats.record(strategy, symbol, seconds)
+
+
+def slowest_on_bar(n: int = 10, by: str = "max") -> List[dict]:
+    return _on_bar_stats.slowest(n, by)
+
+
+def reset_on_bar_stats():
+    _on_bar_stats.reset()
+
+
+def request_capture(cycles: int = 1, interval_ms: float = 5.0, top_allocations: int = 50) -> CycleCapture:
+    """Arm a capture for the next `cycles` strategy cycles"""
+    global _active
+    with _lock:
+        if _active is not None and _active.status in ("pending", "running"):
+            raise RuntimeError(f"Capture {_active.id} is already in progress")
+        capture = CycleCapture(cycles, interval_ms, top_allocations)
+        _captures[capture.id] = capture
+        _active = capture
+    logger.info(f"Profiling capture {capture.id} armed for {cycles} cycle(s)")
+    return capture
+
+
+def get_capture(capture_id: str) -> Optional[CycleCapture]:
+    return _captures.get(capture_id)
+
+
+def list_captures() -> List[dict]:
+    return [c.to_dict() for c in _captures.values()]
+
+
+def cycle_started():
+    """Engine hook: called at the start of every cycle that does real work"""
+    capture = _active
+    if capture is None or capture.status not in ("pending", "running"):
+        return
+    try:
+        if capture.status == "pending":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+                capture._owns_tracemalloc = True
+            capture._baseline = tracemalloc.take_snapshot()
+            capture.status = "running"
+        capture._sampler = _StackSampler(threading.get_ident(), capture.interval, capture._samples)
+        capture._sampler.start()
+    except Exception as e:
+        capture.status = "failed"
+        logger.error(f"Profiling capture {capture.id} failed to start: {e}")
+
+
+def cycle_finished():
+    """Engine hook: called when a cycle that called cycle_started() ends"""
+    global _active
+    capture = _active
+    if capture is None or capture.status != "running":
+        return
+    if capture._sampler is not None:
+        capture._sampler.stop()
+        capture._sampler = None
+    capture.cycles_done += 1
+    if capture.cycles_done < capture.cycles:
+        return
+    try:
+        _write_artifacts(capture)
+        capture.status = "done"
+        logger.info(f"Profiling capture {capture.id} complete")
+    except Exception as e:
+        capture.status = "failed"
+        logger.error(f"Profiling capture {capture.id} failed: {e}")
+    finally:
+        if capture._owns_tracemalloc:
+            tracemalloc.stop()
+        capture._baseline = None
+        capture.finished_at = datetime.now()
+        with _lock:
+            _active = None
+
+
+def _write_artifacts(capture: CycleCapture):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    prefix = os.path.join(settings.PROFILE_DIR, f"cycle_{capture.id}")
+
+    # Folded stacks: loadable by speedscope, flamegraph.pl and py-spy tooling
+    capture.cpu_path = f"{prefix}.collapsed"
+    with open(capture.cpu_path, "w") as f:
+        for stack, count in capture._samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+    diff = snapshot.compare_to(capture._baseline, "lineno")
+    capture.memory_path = f"{prefix}.memory.txt"
+    with open(capture.memory_path, "w") as f:
+        current, peak = tracemalloc.get_traced_memory()
+        f.write(f"# capture {capture.id}: {capture.cycles_done} cycle(s), "
+                f"traced current={current / 1024:.1f} KiB peak={peak / 1024:.1f} KiB\n")
+        f.write(f"# top {capture.top_allocations} allocation sites by growth since capture start\n")
+        for stat in diff[:capture.top_allocations]:
+            f.write(f"{stat}\n")
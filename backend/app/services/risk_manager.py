@@ -2,23 +2,35 @@ from sqlalchemy.orm import Session
 from app.models.order import GlobalSettings, Order
 from app.models.strategy import Strategy
 from datetime import datetime, timezone, date
+from typing import Optional
 from app.core.config import settings
+from app.services import topology
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 def get_global_settings(db: Session) -> GlobalSettings:
-    """Get or create global settings"""
-    gs = db.query(GlobalSettings).first()
+    """Global settings from the engine topology; the row is created on first use"""
+    gs = topology.get(db).settings
     if not gs:
         gs = GlobalSettings(id=1)
         db.add(gs)
         db.commit()
         db.refresh(gs)
+        topology.notify("global settings created")
     return gs
 
 
+def is_paper_trading(gs: Optional[GlobalSettings]) -> bool:
+    """
+    Paper mode is on if either switch says so: the PAPER_TRADING setting or the
+    dashboard's global setting. Order routing, booking, sizing and the dashboard
+    all resolve it here so they never disagree.
+    """
+    return settings.PAPER_TRADING or bool(gs and gs.paper_trading)
+
+
 def can_open_new_trade(db: Session, strategy: Strategy) -> tuple[bool, str]:
     """Check if a new trade can be opened"""
     gs = get_global_settings(db)
@@ -28,7 +40,7 @@ def can_open_new_trade(db: Session, strategy: Strategy) -> tuple[bool, str]:
         return False, "Trading is disabled globally"
 
     # Check paper trading mode
-    if gs.paper_trading:
+    if is_paper_trading(gs):
         logger.info("Paper trading mode - trade would be allowed")
         # In paper mode, allow signals but mark as paper
         return True, "OK (Paper)"
@@ -0,0 +1,206 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.services import backtest, candles
+import multiprocessing
+import itertools
+import numpy as np
+import pandas as pd
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _distribution(values: np.ndarray) -> Dict[str, float]:
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return {"mean": 0.0, "std": 0.0, **{f"p{p}": 0.0 for p in PERCENTILES}}
+    summary = {"mean": float(finite.mean()), "std": float(finite.std())}
+    summary.update({f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(finite, PERCENTILES))})
+    return summary
+
+
+def _resample_metrics(trade_pnls: np.ndarray, capital: float, resamples: int, method: str,
+                      trades_per_year: float, seed) -> Dict[str, np.ndarray]:
+    """
+    Return, max drawdown and Sharpe of `resamples` reshuffled trade sequences.
+    Every equity curve is one row of a (resamples x trades) matrix, so the whole
+    batch is a handful of array operations.
+    """
+    rng = np.random.default_rng(seed)
+    k = len(trade_pnls)
+    if method == "shuffle":
+        idx = rng.permuted(np.broadcast_to(np.arange(k), (resamples, k)), axis=1)
+    else:
+        idx = rng.integers(0, k, size=(resamples, k))
+    pnls = trade_pnls[idx]
+    equity = capital + np.cumsum(pnls, axis=1)
+    peaks = np.maximum(np.maximum.accumulate(equity, axis=1), capital)
+    drawdown = ((peaks - equity) / peaks).max(axis=1)
+    # Per-trade returns on the equity each trade started from
+    start_equity = np.concatenate([np.full((resamples, 1), capital), equity[:, :-1]], axis=1)
+    returns = pnls / start_equity
+    std = returns.std(axis=1, ddof=1) if k > 1 else np.zeros(resamples)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, returns.mean(axis=1) / std * np.sqrt(trades_per_year), 0.0)
+    return {
+        "return": equity[:, -1] / capital - 1,
+        "max_drawdown": drawdown,
+        "sharpe": sharpe,
+    }
+
+
+def monte_carlo(trade_pnls: np.ndarray, capital: Optional[float] = None, resamples: int = 5000,
+                method: str = "bootstrap", trades_per_year: Optional[float] = None,
+                seed: Optional[int] = None, workers: int = 1) -> dict:
+    """
+    Distributions of return, drawdown and Sharpe over resampled trade sequences.
+    method: "bootstrap" draws trades with replacement (varies the outcome itself);
+    "shuffle" permutes them (same total, varies the path and so the drawdown).
+    """
+    trade_pnls = np.asarray(trade_pnls, dtype=np.float64)
+    capital = capital or settings.PAPER_CAPITAL
+    if method not in ("bootstrap", "shuffle"):
+        raise ValueError(f"Unknown resampling method: {method}")
+    if len(trade_pnls) < 2:
+        return {"resamples": 0, "trades": int(len(trade_pnls)), "message": "Need at least 2 trades"}
+    trades_per_year = trades_per_year or float(len(trade_pnls))
+
+    t0 = time.perf_counter()
+    seeds = np.random.SeedSequence(seed).spawn(max(workers, 1))
+    chunks = [len(part) for part in np.array_split(np.arange(resamples), len(seeds)) if len(part)]
+    if len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=len(chunks), mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts = list(pool.map(_resample_metrics, itertools.repeat(trade_pnls), itertools.repeat(capital),
+                                  chunks, itertools.repeat(method), itertools.repeat(trades_per_year), seeds))
+        metrics = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    else:
+        metrics = _resample_metrics(trade_pnls, capital, resamples, method, trades_per_year, seeds[0])
+    elapsed = time.perf_counter() - t0
+
+    logger.info(f"Monte Carlo: {resamples} {method} resamples of {len(trade_pnls)} trades in {elapsed * 1000:.0f} ms")
+    return {
+        "resamples": resamples,
+        "trades": int(len(trade_pnls)),
+        "method": method,
+        "return": _distribution(metrics["return"]),
+        "max_drawdown": _distribution(metrics["max_drawdown"]),
+        "sharpe": _distribution(metrics["sharpe"]),
+        "probability_of_loss": float((metrics["return"] < 0).mean()),
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }
+
+
+def _param_grid(grid: Optional[Dict[str, List[Any]]]) -> List[Dict[str, Any]]:
+    if not grid:
+        return [{}]
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _evaluate(module_name: str, params: Dict[str, Any], df: pd.DataFrame, trade_from: int,
+              periods_per_year: float, lookback: int) -> backtest.BacktestResult:
+    """Process-pool task: one backtest of one parameter set on one slice"""
+    logging.getLogger("app.strategies").setLevel(logging.WARNING)
+    return backtest.run_backtest(module_name, params, df, periods_per_year=periods_per_year,
+                                 trade_from=trade_from, lookback=lookback)
+
+
+def walk_forward(module_name: str, df: pd.DataFrame, base_params: Optional[Dict[str, Any]] = None,
+                 param_grid: Optional[Dict[str, List[Any]]] = None, train_bars: int = 2000,
+                 test_bars: int = 500, step_bars: Optional[int] = None, objective: str = "sharpe",
+                 timeframe: str = "1", lookback: int = 300, workers: Optional[int] = None) -> dict:
+    """
+    Rolling walk-forward: on every window the parameter set with the best in-sample
+    `objective` is chosen on `train_bars`, then run untouched on the following
+    `test_bars`. Every backtest of every window runs in parallel on a process pool.
+    """
+    n = len(df)
+    step_bars = step_bars or test_bars
+    combos = [{**(base_params or {}), **combo} for combo in _param_grid(param_grid)]
+    windows = []
+    start = 0
+    while start + train_bars + test_bars <= n:
+        windows.append((start, start + train_bars, start + train_bars + test_bars))
+        start += step_bars
+    if not windows:
+        raise ValueError(f"Not enough bars ({n}) for train={train_bars} + test={test_bars}")
+
+    periods = backtest.bars_per_year(timeframe)
+    workers = workers or settings.ROBUSTNESS_WORKERS
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        train_jobs = {
+            (w, c): pool.submit(_evaluate, module_name, combo, df.iloc[lo:mid], 0, periods, lookback)
+            for w, (lo, mid, hi) in enumerate(windows)
+            for c, combo in enumerate(combos)
+        }
+        best = []
+        for w in range(len(windows)):
+            scores = [train_jobs[(w, c)].result().stats[objective] for c in range(len(combos))]
+            best.append(int(np.argmax([np.inf if s is None else s for s in scores])))
+        # Test slices carry `lookback` bars of history so indicators are warm on the first test bar
+        test_jobs = [
+            pool.submit(_evaluate, module_name, combos[best[w]], df.iloc[max(0, mid - lookback):hi],
+                        mid - max(0, mid - lookback), periods, lookback)
+            for w, (lo, mid, hi) in enumerate(windows)
+        ]
+        tests = [job.result() for job in test_jobs]
+
+    ts = candles.epoch_seconds(df)
+    if ts is None:
+        ts = np.arange(n)
+    results = []
+    for w, (lo, mid, hi) in enumerate(windows):
+        in_sample = train_jobs[(w, best[w])].result().stats
+        results.append({
+            "train": [int(ts[lo]), int(ts[mid - 1])],
+            "test": [int(ts[mid]), int(ts[hi - 1])],
+            "params": combos[best[w]],
+            "in_sample": in_sample,
+            "out_of_sample": tests[w].stats,
+        })
+
+    # Stitch the out-of-sample segments into one curve by compounding their returns
+    capital = settings.PAPER_CAPITAL
+    segments = [t.equity / t.equity[0] for t in tests if len(t.equity)]
+    scale, curve = 1.0, []
+    for seg in segments:
+        curve.append(seg * scale)
+        scale *= seg[-1]
+    oos_equity = capital * np.concatenate(curve) if curve else np.array([capital])
+    oos_trades = np.concatenate([t.trade_pnls for t in tests]) if tests else np.empty(0)
+    is_sharpe = np.median([r["in_sample"]["sharpe"] for r in results])
+    oos_sharpe = np.median([r["out_of_sample"]["sharpe"] for r in results])
+    elapsed = time.perf_counter() - t0
+    logger.info(f"Walk-forward: {len(windows)} windows x {len(combos)} parameter sets in {elapsed:.1f}s")
+    return {
+        "windows": results,
+        "parameter_sets": len(combos),
+        "out_of_sample": backtest.performance(oos_equity, oos_trades, periods),
+        "out_of_sample_trades": oos_trades,
+        "out_of_sample_bars": int(sum(hi - mid for lo, mid, hi in windows)),
+        "efficiency": float(oos_sharpe / is_sharpe) if is_sharpe > 0 else None,
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def analyze(module_name: str, exchange: str, security_id: str, timeframe: str = "1",
+            base_params: Optional[Dict[str, Any]] = None, param_grid: Optional[Dict[str, List[Any]]] = None,
+            train_bars: int = 2000, test_bars: int = 500, step_bars: Optional[int] = None,
+            objective: str = "sharpe", resamples: int = 5000, method: str = "bootstrap",
+            seed: Optional[int] = None, workers: Optional[int] = None) -> dict:
+    """Walk-forward over the candle store history, then Monte Carlo over the out-of-sample trades"""
+    df = backtest.load_frame(exchange, security_id, timeframe)
+    if df.empty:
+        raise ValueError(f"No {timeframe} candles stored for {exchange}:{security_id}")
+    wf = walk_forward(module_name, df, base_params, param_grid, train_bars, test_bars, step_bars,
+                      objective, timeframe, workers=workers)
+    trades = wf.pop("out_of_sample_trades")
+    years = wf["out_of_sample_bars"] / backtest.bars_per_year(timeframe)
+    mc = monte_carlo(trades, resamples=resamples, method=method, seed=seed,
+                     trades_per_year=len(trades) / years if years > 0 else None)
+    return {"walk_forward": wf, "monte_carlo": mc}
@@ -0,0 +1,258 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Union
+from sqlalchemy.orm import Session
+from app.models.strategy import WatchlistItem
+from app.services.candle_store import get_store
+from app.services import topology
+from app.strategies import indicators
+from app.core.config import settings
+import numpy as np
+import logging
+import time
+import csv
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Condition DSL (JSON):
+#   {"all": [cond, ...]}  {"any": [cond, ...]}  {"not": cond}
+#   {"gt" | "gte" | "lt" | "lte": [operand, operand]}
+#   {"cross_above" | "cross_below": [operand, operand], "within": 1}
+# Operands: numbers, price fields (open/high/low/close/volume) and
+# indicators: ema(n), sma(n), rsi(n), atr(n), with an optional field for
+# ema/sma, e.g. "ema(20,high)".
+# Example: EMA9 crossed EMA21 on the last bar with RSI above 55:
+#   {"all": [{"cross_above": ["ema(9)", "ema(21)"]}, {"gt": ["rsi(14)", 55]}]}
+
+FIELDS = ("open", "high", "low", "close", "volume")
+INDICATORS = ("ema", "sma", "rsi", "atr")
+COMPARISONS = {"gt": np.greater, "gte": np.greater_equal, "lt": np.less, "lte": np.less_equal}
+CROSSES = ("cross_above", "cross_below")
+_INDICATOR_RE = re.compile(r"^(ema|sma|rsi|atr)\((\d+)(?:,\s*(open|high|low|close|volume))?\)$")
+_UNIVERSE_FILE_RE = re.compile(r"^universe_([A-Z]+)\.csv$")
+
+
+class ScreenerError(ValueError):
+    pass
+
+
+class Panel:
+    """(instruments x bars) OHLCV arrays on one timestamp grid, with memoized indicator panels"""
+
+    def __init__(self, security_ids: List[str], columns: Dict[str, np.ndarray]):
+        self.security_ids = security_ids
+        self.columns = columns
+        self._memo: Dict[str, np.ndarray] = {}
+
+    def operand(self, spec: Union[str, int, float]) -> Union[np.ndarray, float]:
+        if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+            return float(spec)
+        if not isinstance(spec, str):
+            raise ScreenerError(f"Invalid operand: {spec!r}")
+        key = spec.replace(" ", "").lower()
+        if key in FIELDS:
+            return self.columns[key]
+        cached = self._memo.get(key)
+        if cached is not None:
+            return cached
+        match = _INDICATOR_RE.match(key)
+        if not match:
+            raise ScreenerError(f"Unknown operand: {spec!r}")
+        name, length, field = match.group(1), int(match.group(2)), match.group(3) or "close"
+        if length < 1:
+            raise ScreenerError(f"Indicator length must be positive: {spec!r}")
+        c = self.columns
+        if name == "ema":
+            value = indicators.ema_panel(c[field], length)
+        elif name == "sma":
+            value = indicators.sma_panel(c[field], length)
+        elif name == "rsi":
+            value = indicators.rsi_panel(c["close"], length)
+        else:
+            value = indicators.atr_panel(c["high"], c["low"], c["close"], length)
+        self._memo[key] = value
+        return value
+
+
+def _last(value: Union[np.ndarray, float], bars: int = 1) -> Union[np.ndarray, float]:
+    return value[:, -bars:] if isinstance(value, np.ndarray) else value
+
+
+def evaluate(condition: Dict[str, Any], panel: Panel) -> np.ndarray:
+    """Evaluate a condition tree; returns one bool per instrument"""
+    if not isinstance(condition, dict) or not condition:
+        raise ScreenerError(f"Invalid condition: {condition!r}")
+    if "all" in condition:
+        result = np.ones(len(panel.security_ids), dtype=bool)
+        for sub in condition["all"]:
+            result &= evaluate(sub, panel)
+        return result
+    if "any" in condition:
+        result = np.zeros(len(panel.security_ids), dtype=bool)
+        for sub in condition["any"]:
+            result |= evaluate(sub, panel)
+        return result
+    if "not" in condition:
+        return ~evaluate(condition["not"], panel)
+    for op, compare in COMPARISONS.items():
+        if op in condition:
+            left, right = _pair(condition[op], op)
+            a, b = _last(panel.operand(left)), _last(panel.operand(right))
+            with np.errstate(invalid='ignore'):
+                return np.broadcast_to(compare(a, b), (len(panel.security_ids), 1))[:, -1].copy()
+    for op in CROSSES:
+        if op in condition:
+            left, right = _pair(condition[op], op)
+            bars = panel.columns["close"].shape[1]
+            try:
+                within = int(condition.get("within", 1))
+            except (TypeError, ValueError):
+                raise ScreenerError(f"Invalid within: {condition.get('within')!r}")
+            # A cross compares each bar with the one before it, so the lookback bounds the window
+            if not 1 <= within < bars:
+                raise ScreenerError(f"within must be between 1 and {bars - 1} (lookback - 1)")
+            a, b = panel.operand(left), panel.operand(right)
+            a_now, b_now = _last(a, within), _last(b, within)
+            a_prev = a[:, -within - 1:-1] if isinstance(a, np.ndarray) else a
+            b_prev = b[:, -within - 1:-1] if isinstance(b, np.ndarray) else b
+            with np.errstate(invalid='ignore'):
+                if op == "cross_above":
+                    crossed = (a_prev <= b_prev) & (a_now > b_now)
+                else:
+                    crossed = (a_prev >= b_prev) & (a_now < b_now)
+            crossed = np.broadcast_to(crossed, (len(panel.security_ids), within))
+            return crossed.any(axis=1)
+    raise ScreenerError(f"Unknown condition: {list(condition.keys())}")
+
+
+def _pair(args, op: str):
+    if not isinstance(args, (list, tuple)) or len(args) != 2:
+        raise ScreenerError(f"'{op}' takes exactly two operands")
+    return args
+
+
+def load_universe(exchange: str) -> Dict[str, str]:
+    """
+    security_id -> symbol for an exchange.
+    Read from <DATA_DIR>/universe_<EXCHANGE>.csv (columns: symbol, security_id, e.g. cut
+    from Dhan's scrip master); falls back to every instrument in the candle store.
+    """
+    path = os.path.join(settings.DATA_DIR, f"universe_{exchange}.csv")
+    if os.path.exists(path):
+        with open(path, newline="") as f:
+            return {row["security_id"]: row["symbol"] for row in csv.DictReader(f)}
+    return {sid: sid for sid in get_store().instruments(exchange)}
+
+
+class UniverseItem(NamedTuple):
+    symbol: str
+    exchange: str
+    security_id: str
+
+
+def universe_items() -> List[UniverseItem]:
+    """Instruments of every <DATA_DIR>/universe_<EXCHANGE>.csv list"""
+    items = []
+    if not os.path.isdir(settings.DATA_DIR):
+        return items
+    for name in sorted(os.listdir(settings.DATA_DIR)):
+        match = _UNIVERSE_FILE_RE.match(name)
+        if match:
+            exchange = match.group(1)
+            items.extend(UniverseItem(symbol, exchange, security_id)
+                         for security_id, symbol in load_universe(exchange).items())
+    return items
+
+
+def with_universe(items: Iterable) -> list:
+    """
+    `items` (e.g. watchlist items) plus the universe lists, one per instrument. The
+    candle store is filled for these, so a scan has data beyond the watchlists.
+    """
+    merged = {}
+    for item in [*universe_items(), *items]:
+        merged[(item.exchange, str(item.security_id or item.symbol))] = item
+    return list(merged.values())
+
+
+def build_panel(exchange: str, security_ids: List[str], bars: int, timeframe: str = "1") -> Panel:
+    """
+    The last `bars` bars of every instrument on a shared grid: the newest `bars`
+    timestamps seen across the universe, right-aligned. A column is the same bar for
+    every row, so an instrument without that bar (no trade, or data that stopped
+    updating) has NaN there instead of an older bar shifted into place.
+    """
+    store = get_store()
+    n = len(security_ids)
+    columns = {field: np.full((n, bars), np.nan) for field in FIELDS}
+    tails = [store.tail(exchange, security_id, bars, timeframe) for security_id in security_ids]
+    stamps = [tail["ts"] for tail in tails if len(tail["ts"])]
+    if not stamps:
+        return Panel(security_ids, columns)
+    grid = np.unique(np.concatenate(stamps))[-bars:]
+    offset = bars - len(grid)
+    for row, tail in enumerate(tails):
+        ts = np.asarray(tail["ts"])
+        keep = np.isin(ts, grid, assume_unique=True)
+        if not keep.any():
+            continue
+        cols = offset + np.searchsorted(grid, ts[keep])
+        for field in FIELDS:
+            columns[field][row, cols] = np.asarray(tail[field])[keep]
+    return Panel(security_ids, columns)
+
+
+def scan(condition: Dict[str, Any], exchange: str = "NSE", timeframe: str = "1",
+         lookback: int = 200, universe: Optional[List[str]] = None) -> dict:
+    """Evaluate a condition over the whole universe panel in one vectorized pass"""
+    t0 = time.perf_counter()
+    names = load_universe(exchange)
+    security_ids = list(universe) if universe else list(names.keys())
+    panel = build_panel(exchange, security_ids, lookback, timeframe)
+    t1 = time.perf_counter()
+    mask = evaluate(condition, panel)
+    t2 = time.perf_counter()
+    close = panel.columns["close"][:, -1]
+    hits = [
+        {
+            "security_id": security_ids[i],
+            "symbol": names.get(security_ids[i], security_ids[i]),
+            "exchange": exchange,
+            "close": float(close[i]),
+        }
+        for i in np.flatnonzero(mask)
+    ]
+    logger.info(f"Screener: {len(hits)}/{len(security_ids)} hits "
+                f"(load {(t1 - t0) * 1000:.0f} ms, eval {(t2 - t1) * 1000:.0f} ms)")
+    return {
+        "scanned": len(security_ids),
+        "hits": hits,
+        "load_ms": round((t1 - t0) * 1000, 2),
+        "eval_ms": round((t2 - t1) * 1000, 2),
+    }
+
+
+def push_to_watchlist(db: Session, strategy_id: int, hits: List[dict], replace: bool = False) -> dict:
+    """Add screener hits to a strategy's watchlist (optionally dropping items that no longer match)"""
+    existing = db.query(WatchlistItem).filter(WatchlistItem.strategy_id == strategy_id).all()
+    by_key = {(item.exchange, item.security_id or item.symbol): item for item in existing}
+    hit_keys = set()
+    added = 0
+    for hit in hits:
+        key = (hit["exchange"], hit["security_id"])
+        hit_keys.add(key)
+        if key not in by_key:
+            db.add(WatchlistItem(strategy_id=strategy_id, symbol=hit["symbol"],
+                                 exchange=hit["exchange"], security_id=hit["security_id"]))
+            added += 1
+    removed = 0
+    if replace:
+        for key, item in by_key.items():
+            if key not in hit_keys:
+                db.delete(item)
+                removed += 1
+    db.commit()
+    if added or removed:
+        topology.notify(f"screener pushed to strategy {strategy_id}")
+    logger.info(f"Screener pushed to strategy {strategy_id}: +{added} -{removed}")
+    return {"added": added, "removed": removed}
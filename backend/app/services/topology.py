@@ -0,0 +1,255 @@
+from typing import Dict, List, Optional
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session, selectinload
+from app.db.base import engine
+from app.models.strategy import Strategy, WatchlistItem
+from app.models.order import GlobalSettings
+from app.models.config_dhan import ConfigDhan
+from app.core.config import settings as app_settings
+import threading
+import hashlib
+import logging
+import select as select_io
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel the API notifies after changing anything the engine's topology holds;
+# triggers on TABLES notify it too, so direct SQL edits are picked up as well
+CHANNEL = "engine_topology"
+TABLES = (Strategy.__tablename__, WatchlistItem.__tablename__,
+          GlobalSettings.__tablename__, ConfigDhan.__tablename__)
+
+
+class Topology:
+    """
+    Snapshot of the engine's configuration: global settings, every strategy with its
+    watchlist, and the Dhan accounts. The rows are detached from any session and
+    must be treated as read-only; a change is made in the database and then notify()'d.
+    """
+
+    def __init__(self, settings: Optional[GlobalSettings], strategies: List[Strategy],
+                 accounts: List[ConfigDhan], version: int):
+        self.settings = settings
+        self.strategies: Dict[int, Strategy] = {s.id: s for s in strategies}
+        self.enabled = [s for s in strategies if s.is_enabled]
+        self.dhan = accounts[0] if accounts else None  # primary account
+        # Further enabled accounts with credentials; orders fan out to them in live mode
+        self.secondary_accounts = [a for a in accounts[1:]
+                                   if a.is_enabled is not False and a.client_id and a.access_token]
+        self.version = version
+        self.loaded_at = time.time()
+
+    def strategy(self, strategy_id: Optional[int]) -> Optional[Strategy]:
+        return self.strategies.get(strategy_id)
+
+    def watchlist(self, enabled_only: bool = False) -> List[WatchlistItem]:
+        strategies = self.enabled if enabled_only else self.strategies.values()
+        return [item for s in strategies for item in s.watchlist_items]
+
+
+def _load(bind, version: int) -> Topology:
+    """Four queries: settings, accounts, strategies, and their watchlists in one IN-batch"""
+    session = Session(bind=bind, expire_on_commit=False)
+    try:
+        strategies = session.scalars(
+            select(Strategy).options(selectinload(Strategy.watchlist_items)).order_by(Strategy.id)
+        ).all()
+        gs = session.scalars(select(GlobalSettings).limit(1)).first()
+        accounts = session.scalars(select(ConfigDhan).order_by(ConfigDhan.id)).all()
+    finally:
+        session.close()
+    topology = Topology(gs, list(strategies), list(accounts), version)
+    logger.info(f"Engine topology v{version} loaded: {len(topology.strategies)} strategies "
+                f"({len(topology.enabled)} enabled), {len(topology.watchlist())} watchlist items, "
+                f"{1 + len(topology.secondary_accounts) if topology.dhan else 0} accounts")
+    return topology
+
+
+class TopologyCache:
+    """
+    Holds the current Topology; invalidate() only bumps a version, and the next get()
+    reloads. A reload racing an invalidation carries the older version and is
+    replaced on the following get().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Optional[Topology] = None
+        self._version = 0
+        self.loads = 0
+
+    def get(self, db: Session) -> Topology:
+        current = self._current
+        if current is not None and current.version == self._version:
+            return current
+        with self._lock:
+            if self._current is None or self._current.version != self._version:
+                self._current = _load(db.get_bind(), self._version)
+                self.loads += 1
+            return self._current
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            "version": self._version,
+            "loaded_version": current.version if current else None,
+            "loaded_at": current.loaded_at if current else None,
+            "loads": self.loads,
+            "listening": _listener is not None and _listener.is_alive(),
+            "polling": _poller is not None and _poller.is_alive(),
+        }
+
+
+_cache: Optional[TopologyCache] = None
+
+
+def get_cache() -> TopologyCache:
+    global _cache
+    if _cache is None:
+        _cache = TopologyCache()
+    return _cache
+
+
+def get(db: Session) -> Topology:
+    return get_cache().get(db)
+
+
+def invalidate():
+    get_cache().invalidate()
+
+
+def notify(reason: str = ""):
+    """
+    Call after committing a change to strategies, watchlists, global settings or
+    credentials: invalidates this process's topology and, on Postgres, every other
+    process listening on CHANNEL.
+    """
+    invalidate()
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                         {"channel": CHANNEL, "payload": f"{os.getpid()}:{reason}"})
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Topology change notification failed: {e}")
+
+
+_listener: Optional[threading.Thread] = None
+_listener_stop = threading.Event()
+
+
+def _listen():
+    backoff = 1.0
+    while not _listener_stop.is_set():
+        conn = None
+        try:
+            conn = engine.raw_connection()
+            dbapi = conn.driver_connection
+            dbapi.autocommit = True
+            with dbapi.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            # Changes made while nobody was listening are unknown
+            invalidate()
+            backoff = 1.0
+            while not _listener_stop.is_set():
+                if select_io.select([dbapi], [], [], 1.0)[0]:
+                    dbapi.poll()
+                    if dbapi.notifies:
+                        dbapi.notifies.clear()
+                        invalidate()
+        except Exception as e:
+            logger.warning(f"Topology listener error, reconnecting in {backoff:.0f}s: {e}")
+            _listener_stop.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+        finally:
+            if conn is not None:
+                # A LISTENing autocommit connection must not go back to the pool
+                conn.invalidate()
+
+
+_poller: Optional[threading.Thread] = None
+
+
+def install_triggers():
+    """Statement-level triggers that notify CHANNEL on any write to the topology tables"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION engine_topology_notify() RETURNS trigger AS $$ "
+            f"BEGIN PERFORM pg_notify('{CHANNEL}', 'db:' || TG_TABLE_NAME); RETURN NULL; END "
+            "$$ LANGUAGE plpgsql"
+        ))
+        for table in TABLES:
+            conn.execute(text(
+                "DO $$ BEGIN "
+                "IF NOT EXISTS (SELECT 1 FROM pg_trigger "
+                f"WHERE tgname = 'engine_topology_notify' AND tgrelid = '{table}'::regclass) THEN "
+                "CREATE TRIGGER engine_topology_notify AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE "
+                f"ON {table} FOR EACH STATEMENT EXECUTE PROCEDURE engine_topology_notify(); "
+                "END IF; END $$"
+            ))
+
+
+def fingerprint() -> str:
+    """Digest of every topology row; a few small reads, for the poll fallback"""
+    digest = hashlib.sha1()
+    with engine.connect() as conn:
+        for table in TABLES:
+            digest.update(repr(conn.execute(text(f"SELECT * FROM {table} ORDER BY id")).all()).encode())
+    return digest.hexdigest()
+
+
+def _poll(interval: float):
+    last = None
+    while not _listener_stop.is_set():
+        try:
+            current = fingerprint()
+            if last is not None and current != last:
+                logger.info("Topology tables changed outside the API, reloading")
+                invalidate()
+            last = current
+        except Exception as e:
+            logger.warning(f"Topology poll failed: {e}")
+        _listener_stop.wait(interval)
+
+
+def start_listener():
+    """
+    Follow changes made by other processes or directly in the database. On Postgres
+    the tables' triggers notify CHANNEL; elsewhere (or if the triggers cannot be
+    installed) a thread compares a fingerprint of the tables every
+    TOPOLOGY_POLL_SECONDS. In-process API changes are notify()'d either way.
+    """
+    global _listener, _poller
+    _listener_stop.clear()
+    poll = engine.dialect.name != "postgresql"
+    if not poll and (_listener is None or not _listener.is_alive()):
+        try:
+            install_triggers()
+        except Exception as e:
+            logger.warning(f"Topology triggers not installed, polling instead: {e}")
+            poll = True
+        _listener = threading.Thread(target=_listen, name="topology-listener", daemon=True)
+        _listener.start()
+        logger.info(f"Listening for topology changes on '{CHANNEL}'")
+    if poll and app_settings.TOPOLOGY_POLL_SECONDS > 0 and (_poller is None or not _poller.is_alive()):
+        _poller = threading.Thread(target=_poll, args=(app_settings.TOPOLOGY_POLL_SECONDS,),
+                                   name="topology-poller", daemon=True)
+        _poller.start()
+        logger.info(f"Polling topology tables every {app_settings.TOPOLOGY_POLL_SECONDS:.0f}s")
+
+
+def stop_listener():
+    global _listener, _poller
+    _listener_stop.set()
+    for thread in (_listener, _poller):
+        if thread is not None:
+            thread.join(timeout=5.0)
+    _listener = _poller = None
@@ -0,0 +1,363 @@
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from app.services import journal
+import itertools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+InstrumentKey = Tuple[str, str]  # (exchange, symbol)
+
+# Dhan market feed exchange segment codes
+_FEED_SEGMENTS = {"IDX": 0, "NSE": 1, "NFO": 2, "BSE": 4, "BFO": 8}
+_FEED_RECONNECT_SECONDS = 5
+
+
+class ProtectedPosition:
+    """An open position with its stop, target and optional trailing distance"""
+
+    def __init__(self, position_id: int, strategy_id: Optional[int], exchange: str, symbol: str,
+                 security_id: str, side: str, qty: int, product: str, entry_price: float,
+                 stop: Optional[float], target: Optional[float], trail: Optional[float]):
+        self.position_id = position_id
+        self.strategy_id = strategy_id
+        self.exchange = exchange
+        self.symbol = symbol
+        self.security_id = security_id
+        self.side = side  # side of the entry: BUY = long, SELL = short
+        self.qty = qty
+        self.product = product
+        self.entry_price = entry_price
+        self.stop = stop
+        self.target = target
+        self.trail = trail
+        # Best price seen since entry (highest for longs, lowest for shorts)
+        self.extreme = entry_price
+
+    @property
+    def exit_side(self) -> str:
+        return "SELL" if self.side == "BUY" else "BUY"
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class _SideIndex:
+    """
+    Sorted trigger levels for one (instrument, side).
+    Levels are stored sign-adjusted so that "triggered" is always a prefix or
+    suffix found with one bisect: longs keep (level, id), shorts keep (-level, id).
+    """
+
+    def __init__(self, long: bool):
+        self.sign = 1.0 if long else -1.0
+        self.stops: List[Tuple[float, int]] = []
+        self.targets: List[Tuple[float, int]] = []
+        self.extremes: List[Tuple[float, int]] = []  # trailing positions only
+
+    @staticmethod
+    def _remove(levels: List[Tuple[float, int]], entry: Tuple[float, int]):
+        i = bisect_left(levels, entry)
+        if i < len(levels) and levels[i] == entry:
+            del levels[i]
+
+    def add(self, position: ProtectedPosition):
+        s, pid = self.sign, position.position_id
+        if position.stop is not None:
+            insort(self.stops, (s * position.stop, pid))
+        if position.target is not None:
+            insort(self.targets, (s * position.target, pid))
+        if position.trail:
+            insort(self.extremes, (s * position.extreme, pid))
+
+    def remove(self, position: ProtectedPosition):
+        s, pid = self.sign, position.position_id
+        if position.stop is not None:
+            self._remove(self.stops, (s * position.stop, pid))
+        if position.target is not None:
+            self._remove(self.targets, (s * position.target, pid))
+        if position.trail:
+            self._remove(self.extremes, (s * position.extreme, pid))
+
+    def stopped(self, adverse: float) -> List[int]:
+        """Ids whose stop is at or beyond the adverse price (low for longs, high for shorts)"""
+        i = bisect_left(self.stops, (self.sign * adverse, -1))
+        return [pid for _, pid in self.stops[i:]]
+
+    def reached(self, favourable: float) -> List[int]:
+        """Ids whose target is at or before the favourable price (high for longs, low for shorts)"""
+        i = bisect_right(self.targets, (self.sign * favourable, float("inf")))
+        return [pid for _, pid in self.targets[:i]]
+
+    def new_extremes(self, favourable: float) -> List[int]:
+        """Trailing ids whose best price is beaten by the favourable price"""
+        i = bisect_left(self.extremes, (self.sign * favourable, -1))
+        return [pid for _, pid in self.extremes[:i]]
+
+    def __len__(self):
+        return len(self.stops) + len(self.targets)
+
+
+class TriggerMonitor:
+    """
+    Stop-loss / target / trailing-stop book for every open position.
+    Each price update costs O(log n) per (instrument, side) plus the triggered
+    or trailed positions themselves; untouched positions are never visited.
+    Triggered exits are handed to the exit handler on a worker thread so the
+    price feed is never blocked by order placement (inline=True calls it directly,
+    for deterministic replays).
+    """
+
+    def __init__(self, inline: bool = False):
+        self.inline = inline
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._positions: Dict[int, ProtectedPosition] = {}
+        self._index: Dict[Tuple[str, str, str], _SideIndex] = {}
+        self._armed: Dict[str, dict] = {}  # order_id -> protection waiting for the entry fill
+        self._handler: Optional[Callable[[ProtectedPosition, str, float], None]] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trigger-exit")
+
+    def set_exit_handler(self, handler: Callable[[ProtectedPosition, str, float], None]):
+        """handler(position, kind, price) is called once per triggered position; kind is SL, TARGET or TRAIL"""
+        self._handler = handler
+
+    def arm(self, order_id: str, **protection):
+        """Remember the stop/target of an entry order until it fills"""
+        with self._lock:
+            self._armed[order_id] = protection
+
+    def on_fill(self, order_id: str, fill_price: float) -> Optional[ProtectedPosition]:
+        """Activate the protection armed for an entry order at its fill price"""
+        with self._lock:
+            protection = self._armed.pop(order_id, None)
+        if protection is None:
+            return None
+        return self.add(entry_price=fill_price, **protection)
+
+    def add(self, strategy_id: Optional[int], exchange: str, symbol: str, side: str, qty: int,
+            entry_price: float, stop: Optional[float] = None, target: Optional[float] = None,
+            trail: Optional[float] = None, security_id: str = "", product: str = "INTRADAY") -> Optional[ProtectedPosition]:
+        if stop is None and target is None and not trail:
+            return None
+        if trail and stop is None:
+            stop = entry_price - trail if side == "BUY" else entry_price + trail
+        with self._lock:
+            position = ProtectedPosition(next(self._ids), strategy_id, exchange, symbol, security_id,
+                                         side, qty, product, entry_price, stop, target, trail)
+            self._positions[position.position_id] = position
+            self._side(exchange, symbol, side).add(position)
+        logger.info(f"Protecting {side} {qty} {symbol} @ {entry_price:.2f}: "
+                    f"stop={stop} target={target} trail={trail}")
+        return position
+
+    def _side(self, exchange: str, symbol: str, side: str) -> _SideIndex:
+        key = (exchange, symbol, side)
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = _SideIndex(long=side == "BUY")
+        return index
+
+    def _drop(self, position_id: int) -> Optional[ProtectedPosition]:
+        position = self._positions.pop(position_id, None)
+        if position is not None:
+            self._side(position.exchange, position.symbol, position.side).remove(position)
+        return position
+
+    def remove_for(self, strategy_id: Optional[int], exchange: str, symbol: str) -> int:
+        """Drop a strategy's protection on an instrument after it exits by itself"""
+        with self._lock:
+            ids = [pid for pid, p in self._positions.items()
+                   if p.strategy_id == strategy_id and p.exchange == exchange and p.symbol == symbol]
+            for pid in ids:
+                self._drop(pid)
+        return len(ids)
+
+    def clear(self, product: Optional[str] = None) -> int:
+        with self._lock:
+            ids = [pid for pid, p in self._positions.items() if product is None or p.product == product]
+            for pid in ids:
+                self._drop(pid)
+            if product is None:
+                self._armed.clear()
+            else:
+                self._armed = {k: v for k, v in self._armed.items() if v.get("product") != product}
+        return len(ids)
+
+    def on_price(self, exchange: str, symbol: str, price: float) -> List[Tuple[ProtectedPosition, str, float]]:
+        return self.on_range(exchange, symbol, price, price)
+
+    def on_range(self, exchange: str, symbol: str, high: float, low: float) -> List[Tuple[ProtectedPosition, str, float]]:
+        """
+        Check one price update (a tick, or a bar's high/low) and dispatch the exits it triggers.
+        When a bar touches both the stop and the target, the stop is assumed to have filled first.
+        """
+        triggered = []
+        with self._lock:
+            for side, adverse, favourable in (("BUY", low, high), ("SELL", high, low)):
+                index = self._index.get((exchange, symbol, side))
+                if not index:
+                    continue
+                for pid in index.stopped(adverse):
+                    position = self._drop(pid)
+                    triggered.append((position, "TRAIL" if position.trail else "SL", position.stop))
+                for pid in index.reached(favourable):
+                    position = self._drop(pid)
+                    triggered.append((position, "TARGET", position.target))
+                for pid in index.new_extremes(favourable):
+                    self._trail(self._positions[pid], favourable)
+        for position, kind, level in triggered:
+            logger.warning(f"{kind} hit for {position.side} {position.qty} {symbol} "
+                           f"(strategy {position.strategy_id}) at {level:.2f}")
+            if self._handler is None:
+                continue
+            if self.inline:
+                self._dispatch(position, kind, level)
+            else:
+                self._executor.submit(self._dispatch, position, kind, level)
+        return triggered
+
+    def _trail(self, position: ProtectedPosition, price: float):
+        index = self._side(position.exchange, position.symbol, position.side)
+        index.remove(position)
+        position.extreme = price
+        if position.side == "BUY":
+            position.stop = max(position.stop, price - position.trail)
+        else:
+            position.stop = min(position.stop, price + position.trail)
+        index.add(position)
+
+    def _dispatch(self, position: ProtectedPosition, kind: str, level: float):
+        try:
+            self._handler(position, kind, level)
+        except Exception as e:
+            logger.error(f"Exit handler failed for {position.symbol} ({kind}): {e}")
+
+    def instruments(self) -> List[Tuple[str, str]]:
+        """(exchange, security_id) of every protected position, for feed subscriptions"""
+        with self._lock:
+            return sorted({(p.exchange, p.security_id) for p in self._positions.values() if p.security_id})
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [p.to_dict() for p in self._positions.values()]
+
+    def __len__(self):
+        return len(self._positions)
+
+
+class MarketFeed:
+    """
+    Dhan live market feed (ticker mode) pushing LTPs into the trigger monitor.
+    Runs the dhanhq websocket client on its own thread and event loop.
+    """
+
+    def __init__(self, monitor: TriggerMonitor, client_id: str, access_token: str,
+                 instruments: List[Tuple[str, str, str]]):
+        self.monitor = monitor
+        self.client_id = client_id
+        self.access_token = access_token
+        # (exchange, security_id, symbol)
+        self._symbols = {(_FEED_SEGMENTS.get(ex, 1), str(sid)): (ex, symbol) for ex, sid, symbol in instruments}
+        self._thread: Optional[threading.Thread] = None
+        self._feed = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._thread is not None or not self._symbols:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="market-feed", daemon=True)
+        self._thread.start()
+
+    def _create_feed(self):
+        """DhanFeed bound to a fresh event loop on the calling thread, subscribed in ticker mode"""
+        import asyncio
+        from dhanhq import marketfeed
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        return marketfeed.DhanFeed(
+            self.client_id, self.access_token,
+            [(segment, sid, marketfeed.Ticker) for segment, sid in self._symbols]
+        )
+
+    def _run(self):
+        feed = self._feed = self._create_feed()
+        logger.info(f"Market feed subscribing to {len(self._symbols)} instruments")
+        try:
+            while not self._stopping.is_set():
+                try:
+                    # connect() is a no-op while the socket is open, so this also reconnects after a drop
+                    feed.run_forever()
+                    while not self._stopping.is_set():
+                        self._on_message(feed.get_data())
+                except Exception as e:
+                    if self._stopping.is_set():
+                        break
+                    logger.error(f"Market feed dropped, reconnecting: {e}")
+                    self._stopping.wait(_FEED_RECONNECT_SECONDS)
+        finally:
+            try:
+                feed.close_connection()
+            except Exception as e:
+                logger.warning(f"Market feed close error: {e}")
+            feed.loop.close()
+
+    def _on_message(self, message):
+        if not isinstance(message, dict) or "LTP" not in message:
+            return
+        key = self._symbols.get((message.get("exchange_segment"), str(message.get("security_id"))))
+        if key is None:
+            return
+        try:
+            price = float(message["LTP"])
+        except (TypeError, ValueError):
+            return
+        journal.record_tick(key[0], key[1], price)
+        self.monitor.on_price(key[0], key[1], price)
+
+    def stop(self):
+        self._stopping.set()
+        feed, self._feed = self._feed, None
+        thread, self._thread = self._thread, None
+        if feed is not None and feed.ws is not None:
+            # get_data() blocks on recv(); closing the socket on the feed's own loop wakes it,
+            # and the feed thread then runs close_connection() itself
+            import asyncio
+            try:
+                asyncio.run_coroutine_threadsafe(feed.ws.close(), feed.loop)
+            except Exception as e:
+                logger.warning(f"Market feed disconnect error: {e}")
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+
+
+_monitor: Optional[TriggerMonitor] = None
+_feed: Optional[MarketFeed] = None
+
+
+def get_monitor() -> TriggerMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = TriggerMonitor()
+    return _monitor
+
+
+def start_feed(client_id: str, access_token: str, instruments: List[Tuple[str, str, str]]):
+    """(Re)start the live feed for the session's instruments: (exchange, security_id, symbol)"""
+    global _feed
+    stop_feed()
+    _feed = MarketFeed(get_monitor(), client_id, access_token, instruments)
+    _feed.start()
+
+
+def feed_running() -> bool:
+    return _feed is not None and _feed._thread is not None and _feed._thread.is_alive()
+
+
+def stop_feed():
+    global _feed
+    if _feed is not None:
+        _feed.stop()
+        _feed = None
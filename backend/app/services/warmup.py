@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+from app.core.config import settings
+from app.services import candles
+from app.services.candle_store import COLUMNS, get_store
+from app.services.market_calendar import get_calendar
+import pandas as pd
+import numpy as np
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+InstrumentKey = Tuple[str, str]  # (exchange, security_id)
+
+
+class WarmupHistory:
+    """
+    Previous sessions' minute bars of every watched instrument, loaded from the
+    candle store before the open. Prepended to each cycle's intraday frame so
+    indicators (and strategies that derive their state from the frame) start the
+    day with their full lookback instead of needing an hour of today's bars.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns: Dict[InstrumentKey, Dict[str, np.ndarray]] = {}
+        self.session_open: Optional[float] = None
+        self.loaded = 0
+        self.cold = 0
+        self.seconds = 0.0
+
+    def load(self, keys: Iterable[InstrumentKey], bars: int, before_ts: float, workers: int) -> int:
+        """Read the last `bars` bars before `before_ts` of each instrument, in parallel"""
+        keys = list(dict.fromkeys(keys))
+        store = get_store()
+        start = time.perf_counter()
+
+        def one(key: InstrumentKey) -> Optional[Dict[str, np.ndarray]]:
+            cols = store.read(key[0], key[1], end=int(before_ts))
+            if len(cols["ts"]) == 0:
+                return None
+            # Copied out of the memory maps so cycles never fault pages back in from disk
+            return {name: np.array(values[-bars:]) for name, values in cols.items()}
+
+        columns = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(keys) or 1)),
+                                thread_name_prefix="warmup") as pool:
+            for key, result in zip(keys, pool.map(one, keys)):
+                if result is not None:
+                    columns[key] = result
+        with self._lock:
+            self._columns = columns
+            self.session_open = before_ts
+            self.loaded = len(columns)
+            self.cold = len(keys) - len(columns)
+            self.seconds = time.perf_counter() - start
+        logger.info(f"Warm-up: {self.loaded} instruments loaded ({self.cold} without history) "
+                    f"in {self.seconds:.2f}s")
+        return self.loaded
+
+    def extend(self, key: InstrumentKey, df: pd.DataFrame) -> pd.DataFrame:
+        """Today's frame with the stored bars before its first bar in front of it"""
+        history = self._columns.get(key)
+        epochs = candles.epoch_seconds(df)
+        if history is None or epochs is None or len(epochs) == 0:
+            return df
+        cut = int(np.searchsorted(history["ts"], epochs[0], side="left"))
+        if cut == 0:
+            return df
+        cols = {"ts": np.concatenate((history["ts"][:cut], epochs))}
+        for name in candles.FRAME_COLUMNS:
+            cols[name] = np.concatenate((history[name][:cut], df[name].to_numpy(dtype=COLUMNS[name])))
+        return candles.to_frame(cols)
+
+    def stats(self) -> dict:
+        return {"instruments": self.loaded, "without_history": self.cold,
+                "load_seconds": round(self.seconds, 3), "session_open": self.session_open}
+
+
+_history: Optional[WarmupHistory] = None
+
+
+def get_history() -> WarmupHistory:
+    global _history
+    if _history is None:
+        _history = WarmupHistory()
+    return _history
+
+
+def warm_up(items: Iterable) -> int:
+    """Load history for watchlist items ahead of today's session (pre-open hook)"""
+    if settings.WARMUP_BARS <= 0:
+        return 0
+    calendar = get_calendar()
+    window = calendar.today()
+    before_ts = window.open_ts if window else calendar.clock()
+    return get_history().load(((item.exchange, str(item.security_id or item.symbol)) for item in items),
+                              settings.WARMUP_BARS, before_ts, settings.WARMUP_WORKERS)
+
+
+def active() -> Optional[WarmupHistory]:
+    """The loaded history if it belongs to today's session, else None"""
+    history = get_history()
+    window = get_calendar().today()
+    if history.session_open is None or (window is not None and history.session_open != window.open_ts):
+        return None
+    return history
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 import pandas as pd
 from typing import List, Dict, Any, Optional
+from app.strategies import indicators
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,7 +13,8 @@ class TradeIntent:
                  order_type: str = "MARKET", price: float = 0,
                  product: str = "INTRADAY", sl: float = None,
                  target: float = None, security_id: str = "",
-                 reason: str = ""):
+                 reason: str = "", is_exit: bool = False, trail: float = None,
+                 group: str = None):
         self.symbol = symbol
         self.exchange = exchange
         self.side = side  # BUY, SELL, EXIT_BUY, EXIT_SELL
@@ -22,8 +24,17 @@ class TradeIntent:
         self.product = product
         self.sl = sl
         self.target = target
+        self.trail = trail  # trailing-stop distance in price units
         self.security_id = security_id
         self.reason = reason
+        self.is_exit = is_exit  # closes (part of) an existing position; never blocked by exposure limits
+        # Entries of one strategy sharing a group (e.g. the legs of a pair) are risk-checked as a
+        # unit: all approved or none, scaled by one factor so their qty ratio is kept
+        self.group = group
+        # Filled in by the engine before risk checks
+        self.strategy_id: Optional[int] = None
+        self.ref_price: Optional[float] = None  # last close, used to value MARKET intents
+        self.atr: Optional[float] = None
 
     def __repr__(self):
         return f"TradeIntent({self.side} {self.qty} {self.symbol} @ {self.order_type})"
@@ -35,11 +46,23 @@ class BaseStrategy(ABC):
     name: str = "BaseStrategy"
     description: str = ""
     default_params: Dict[str, Any] = {}
+    # Set to have the engine fetch the option chain of each watched underlying every
+    # cycle; on_bar then finds its IV and greeks in self.options
+    uses_option_chain: bool = False
+    # Set to have the engine maintain rolling correlations and pair spreads across every
+    # symbol such strategies watch; on_bar then finds this symbol's row in self.cross_section
+    uses_cross_section: bool = False
 
     def __init__(self, config: Dict[str, Any], params: Optional[Dict[str, Any]] = None):
         self.config = config
         self.params = {**self.default_params, **(params or {})}
         self._data_cache: Dict[str, pd.DataFrame] = {}
+        # Set by the engine to the cycle-wide FeatureCache of the symbol being processed
+        self.features = None
+        # ChainAnalytics of the symbol being processed (uses_option_chain strategies only)
+        self.options = None
+        # CrossSectionView of the symbol being processed (uses_cross_section strategies only)
+        self.cross_section = None
         logger.info(f"Strategy '{self.name}' initialized with params: {self.params}")
 
     @abstractmethod
@@ -54,12 +77,15 @@ class BaseStrategy(ABC):
         """
         raise NotImplementedError
 
+    def on_position_closed(self, symbol: str):
+        """Called when a stop, target or trailing stop closes this strategy's position outside on_bar"""
+        pass
+
     def calculate_sl_atr(self, df: pd.DataFrame, multiplier: float = 1.5) -> float:
         """Calculate ATR-based stop loss distance"""
         try:
-            import pandas_ta as ta
-            atr = ta.atr(df['high'], df['low'], df['close'], length=14)
-            if atr is not None and len(atr) > 0:
+            atr = self.cached_atr(df, 14)
+            if atr is not None and len(atr) > 0 and not pd.isna(atr.iloc[-1]):
                 return float(atr.iloc[-1]) * multiplier
         except Exception:
             pass
@@ -67,18 +93,32 @@ class BaseStrategy(ABC):
         return float(df['close'].iloc[-1]) * 0.01
 
     def get_ema(self, series: pd.Series, period: int) -> pd.Series:
-        return series.ewm(span=period, adjust=False).mean()
+        return indicators.ema(series, period)
 
     def get_sma(self, series: pd.Series, period: int) -> pd.Series:
-        return series.rolling(window=period).mean()
+        return indicators.sma(series, period)
 
     def get_rsi(self, series: pd.Series, period: int = 14) -> pd.Series:
-        try:
-            import pandas_ta as ta
-            return ta.rsi(series, length=period)
-        except Exception:
-            delta = series.diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-            rs = gain / loss
-            return 100 - (100 / (1 + rs))
+        return indicators.rsi(series, period)
+
+    # Indicators of a df column, shared with every other strategy that watches the
+    # same symbol in this cycle. The df passed to on_bar is shared too: treat it as read-only.
+
+    def _shared(self, df: pd.DataFrame):
+        return self.features if self.features is not None and self.features.df is df else None
+
+    def cached_ema(self, df: pd.DataFrame, period: int, column: str = 'close') -> pd.Series:
+        shared = self._shared(df)
+        return shared.ema(period, column) if shared else self.get_ema(df[column], period)
+
+    def cached_sma(self, df: pd.DataFrame, period: int, column: str = 'close') -> pd.Series:
+        shared = self._shared(df)
+        return shared.sma(period, column) if shared else self.get_sma(df[column], period)
+
+    def cached_rsi(self, df: pd.DataFrame, period: int = 14, column: str = 'close') -> pd.Series:
+        shared = self._shared(df)
+        return shared.rsi(period, column) if shared else self.get_rsi(df[column], period)
+
+    def cached_atr(self, df: pd.DataFrame, period: int = 14) -> pd.Series:
+        shared = self._shared(df)
+        return shared.atr(period) if shared else indicators.atr(df, period)
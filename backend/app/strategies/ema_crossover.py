@@ -22,6 +22,7 @@ class EMACrossoverStrategy(BaseStrategy):
         "rsi_sell_threshold": 45,
         "sl_pct": 1.0,
         "target_pct": 2.0,
+        "trail_pct": 0.0,  # 0 disables the trailing stop
         "qty": 1,
         "product": "INTRADAY"
     }
@@ -37,9 +38,9 @@ class EMACrossoverStrategy(BaseStrategy):
                 return intents
 
             close = df['close']
-            fast_ema = self.get_ema(close, self.params['ema_fast'])
-            slow_ema = self.get_ema(close, self.params['ema_slow'])
-            rsi = self.get_rsi(close, self.params['rsi_period'])
+            fast_ema = self.cached_ema(df, self.params['ema_fast'])
+            slow_ema = self.cached_ema(df, self.params['ema_slow'])
+            rsi = self.cached_rsi(df, self.params['rsi_period'])
 
             if fast_ema.isna().iloc[-1] or slow_ema.isna().iloc[-1]:
                 return intents
@@ -59,6 +60,7 @@ class EMACrossoverStrategy(BaseStrategy):
 
             sl_pct = self.params.get('sl_pct', 1.0) / 100
             target_pct = self.params.get('target_pct', 2.0) / 100
+            trail = curr_price * self.params.get('trail_pct', 0.0) / 100 or None
 
             # Bullish crossover: fast EMA crosses above slow EMA
             bullish_cross = prev_fast <= prev_slow and curr_fast > curr_slow
@@ -72,14 +74,15 @@ class EMACrossoverStrategy(BaseStrategy):
                         intents.append(TradeIntent(
                             symbol=symbol, exchange=exchange, side='BUY',
                             qty=qty, order_type='MARKET', product=product,
-                            security_id=security_id, reason='Exit Short + EMA Cross'
+                            security_id=security_id, reason='Exit Short + EMA Cross',
+                            is_exit=True
                         ))
                     sl = curr_price * (1 - sl_pct)
                     target = curr_price * (1 + target_pct)
                     intents.append(TradeIntent(
                         symbol=symbol, exchange=exchange, side='BUY',
                         qty=qty, order_type='MARKET', product=product,
-                        sl=sl, target=target, security_id=security_id,
+                        sl=sl, target=target, trail=trail, security_id=security_id,
                         reason=f'EMA Cross BUY: fast={curr_fast:.2f} slow={curr_slow:.2f} rsi={curr_rsi:.1f}'
                     ))
                     self._positions[symbol] = 'BUY'
@@ -92,14 +95,15 @@ class EMACrossoverStrategy(BaseStrategy):
                         intents.append(TradeIntent(
                             symbol=symbol, exchange=exchange, side='SELL',
                             qty=qty, order_type='MARKET', product=product,
-                            security_id=security_id, reason='Exit Long + EMA Cross'
+                            security_id=security_id, reason='Exit Long + EMA Cross',
+                            is_exit=True
                         ))
                     sl = curr_price * (1 + sl_pct)
                     target = curr_price * (1 - target_pct)
                     intents.append(TradeIntent(
                         symbol=symbol, exchange=exchange, side='SELL',
                         qty=qty, order_type='MARKET', product=product,
-                        sl=sl, target=target, security_id=security_id,
+                        sl=sl, target=target, trail=trail, security_id=security_id,
                         reason=f'EMA Cross SELL: fast={curr_fast:.2f} slow={curr_slow:.2f} rsi={curr_rsi:.1f}'
                     ))
                     self._positions[symbol] = 'SELL'
@@ -109,3 +113,6 @@ class EMACrossoverStrategy(BaseStrategy):
             logger.error(f"EMACrossover.on_bar error for {symbol}: {e}")
 
         return intents
+
+    def on_position_closed(self, symbol: str):
+        self._positions.pop(symbol, None)
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+
+def ema(series: pd.Series, period: int) -> pd.Series:
+    return series.ewm(span=period, adjust=False).mean()
+
+
+def sma(series: pd.Series, period: int) -> pd.Series:
+    return series.rolling(window=period).mean()
+
+
+def rsi(series: pd.Series, period: int = 14) -> pd.Series:
+    try:
+        import pandas_ta as ta
+        return ta.rsi(series, length=period)
+    except Exception:
+        delta = series.diff()
+        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+        rs = gain / loss
+        return 100 - (100 / (1 + rs))
+
+
+def atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
+    try:
+        import pandas_ta as ta
+        result = ta.atr(df['high'], df['low'], df['close'], length=period)
+        if result is not None:
+            return result
+    except Exception:
+        pass
+    prev_close = df['close'].shift(1)
+    true_range = pd.concat([
+        df['high'] - df['low'],
+        (df['high'] - prev_close).abs(),
+        (df['low'] - prev_close).abs(),
+    ], axis=1).max(axis=1)
+    return true_range.ewm(alpha=1 / period, adjust=False).mean()
+
+
+# Panel versions: rows are instruments, columns are bars (oldest first).
+# Shorter histories are left-padded with NaN; every function keeps NaN
+# until an instrument's first valid bar, then recurses across the whole
+# universe with one vector op per bar.
+
+def ema_panel(x: np.ndarray, period: int) -> np.ndarray:
+    return _ewm_panel(x, 2.0 / (period + 1))
+
+
+def rma_panel(x: np.ndarray, period: int) -> np.ndarray:
+    """Wilder's moving average (the smoothing used by RSI and ATR)"""
+    return _ewm_panel(x, 1.0 / period)
+
+
+def _ewm_panel(x: np.ndarray, alpha: float) -> np.ndarray:
+    out = np.empty_like(x, dtype=np.float64)
+    prev = x[:, 0].astype(np.float64)
+    out[:, 0] = prev
+    for t in range(1, x.shape[1]):
+        cur = x[:, t]
+        nxt = alpha * cur + (1 - alpha) * prev
+        # Seed from the first valid value and carry the state across gaps
+        prev = np.where(np.isnan(prev), cur, np.where(np.isnan(cur), prev, nxt))
+        out[:, t] = prev
+    return out
+
+
+def sma_panel(x: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < period:
+        return out
+    csum = np.cumsum(np.nan_to_num(x, nan=0.0), axis=1)
+    valid = np.cumsum(~np.isnan(x), axis=1)
+    window_sum = csum[:, period - 1:].copy()
+    window_sum[:, 1:] -= csum[:, :-period]
+    window_valid = valid[:, period - 1:].copy()
+    window_valid[:, 1:] -= valid[:, :-period]
+    out[:, period - 1:] = np.where(window_valid == period, window_sum / period, np.nan)
+    return out
+
+
+def rsi_panel(close: np.ndarray, period: int = 14) -> np.ndarray:
+    delta = np.full(close.shape, np.nan)
+    delta[:, 1:] = np.diff(close, axis=1)
+    gain = rma_panel(np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None)), period)
+    loss = rma_panel(np.where(np.isnan(delta), np.nan, np.clip(-delta, 0, None)), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi_values = 100 - 100 / (1 + gain / loss)
+    rsi_values = np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), rsi_values)
+    # Not meaningful until `period` changes have been seen
+    seen = np.cumsum(~np.isnan(delta), axis=1)
+    return np.where(seen >= period, rsi_values, np.nan)
+
+
+def atr_panel(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    prev_close = np.full(close.shape, np.nan)
+    prev_close[:, 1:] = close[:, :-1]
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return rma_panel(true_range, period)
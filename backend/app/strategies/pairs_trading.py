@@ -0,0 +1,126 @@
+import pandas as pd
+import math
+from typing import List, Dict, Any, Tuple
+from app.strategies.base import BaseStrategy, TradeIntent
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PairsTradingStrategy(BaseStrategy):
+    """
+    Mean-reversion on the spread of correlated pairs.
+    The spread is log(A) - beta * log(B) over the engine's rolling window; when its
+    z-score passes entry_z the spread is sold (SELL A, BUY B) or bought (BUY A,
+    SELL B), sized roughly value-neutral by beta, and both legs are closed once
+    it reverts inside exit_z. Each pair is handled on the bars of its first leg.
+    The entry legs share a TradeIntent.group, so the engine approves them together
+    and scales both to the risk-allowed size at the hedge ratio.
+    """
+    name = "pairs_trading"
+    description = "Pairs trading on rolling hedge-ratio spreads - add both legs to the watchlist"
+    uses_cross_section = True
+    default_params = {
+        "pairs": [],  # ["HDFCBANK/ICICIBANK", ...]; empty = any watched pair above min_correlation
+        "min_correlation": 0.7,
+        "min_bars": 60,
+        "entry_z": 2.0,
+        "exit_z": 0.5,
+        "stop_z": 4.0,  # close the pair if the spread keeps diverging
+        "qty": 1,       # of leg A; leg B is sized from the hedge ratio
+        "product": "INTRADAY"
+    }
+
+    def __init__(self, config: Dict[str, Any], params: Dict[str, Any] = None):
+        super().__init__(config, params)
+        # (symbol A, symbol B) -> (spread side, qty A, qty B, exchange/security_id of A, of B)
+        self._positions: Dict[Tuple[str, str], Tuple[str, int, int, str, str, str, str]] = {}
+        # Exits of surviving legs after the other leg was closed outside on_bar
+        self._closing: List[TradeIntent] = []
+        self._pairs = [tuple(p.split("/", 1)) for p in self.params.get("pairs") or [] if "/" in p]
+
+    def _partners(self, symbol: str, view) -> List[str]:
+        if self._pairs:
+            return [b for a, b in self._pairs if a == symbol]
+        # Without configured pairs, each correlated pair is traded from its alphabetically first leg
+        return [p.symbol for p in view.peers(self.params['min_correlation']) if symbol < p.symbol]
+
+    def _leg(self, symbol: str, exchange: str, security_id: str, side: str, qty: int,
+             reason: str, is_exit: bool = False, group: str = None) -> TradeIntent:
+        return TradeIntent(
+            symbol=symbol, exchange=exchange, side=side, qty=qty, order_type='MARKET',
+            product=self.params.get('product', 'INTRADAY'), security_id=security_id,
+            reason=reason, is_exit=is_exit, group=group
+        )
+
+    def on_bar(self, symbol: str, df: pd.DataFrame) -> List[TradeIntent]:
+        intents, self._closing = self._closing, []
+        view = self.cross_section
+        try:
+            if view is None or view.bars < self.params['min_bars'] or len(df) == 0:
+                return intents
+
+            exchange = self.config.get('exchange', 'NSE')
+            security_id = self.config.get('security_id', '')
+            price_a = float(df['close'].iloc[-1])
+            entry_z = self.params['entry_z']
+
+            for partner in self._partners(symbol, view):
+                peer = view.peer(partner)
+                if peer is None or not math.isfinite(peer.zscore) or not math.isfinite(peer.beta):
+                    continue
+                key = (symbol, partner)
+                z = peer.zscore
+                held = self._positions.get(key)
+
+                if held is not None:
+                    side, qty_a, qty_b, _, _, b_exchange, b_security_id = held
+                    reverted = abs(z) <= self.params['exit_z']
+                    stopped = abs(z) >= self.params['stop_z']
+                    if reverted or stopped:
+                        why = 'reverted' if reverted else 'stop'
+                        reason = f'Pair exit ({why}): {symbol}/{partner} z={z:.2f}'
+                        intents.append(self._leg(symbol, exchange, security_id,
+                                                 'SELL' if side == 'LONG' else 'BUY', qty_a, reason, True))
+                        intents.append(self._leg(partner, b_exchange, b_security_id,
+                                                 'BUY' if side == 'LONG' else 'SELL', qty_b, reason, True))
+                        del self._positions[key]
+                        logger.info(f"Pair exit: {symbol}/{partner} z={z:.2f} ({why})")
+                    continue
+
+                if abs(z) < entry_z or abs(z) >= self.params['stop_z'] or peer.correlation < self.params['min_correlation']:
+                    continue
+                if peer.beta <= 0 or peer.close <= 0:
+                    continue
+                qty_a = int(self.params.get('qty', 1))
+                qty_b = max(1, round(qty_a * peer.beta * price_a / peer.close))
+                side = 'SHORT' if z > 0 else 'LONG'  # spread rich -> sell A, buy B
+                reason = (f'Pair entry {side} spread: {symbol}/{partner} z={z:.2f} '
+                          f'beta={peer.beta:.2f} corr={peer.correlation:.2f}')
+                # qty_a:qty_b is the ratio the engine keeps when it scales the pair
+                group = f'{symbol}/{partner}'
+                intents.append(self._leg(symbol, exchange, security_id,
+                                         'SELL' if side == 'SHORT' else 'BUY', qty_a, reason, group=group))
+                intents.append(self._leg(partner, peer.exchange, peer.security_id,
+                                         'BUY' if side == 'SHORT' else 'SELL', qty_b, reason, group=group))
+                self._positions[key] = (side, qty_a, qty_b, exchange, security_id, peer.exchange, peer.security_id)
+                logger.info(f"Pair entry: {side} {symbol}/{partner} z={z:.2f}")
+
+        except Exception as e:
+            logger.error(f"PairsTrading.on_bar error for {symbol}: {e}")
+
+        return intents
+
+    def on_position_closed(self, symbol: str):
+        # A leg was closed outside on_bar (stop, target): close the other one on the next bar
+        # rather than leave a naked position. Exits are sized by the engine to what is held.
+        for key in [k for k in self._positions if symbol in k]:
+            side, qty_a, qty_b, a_exchange, a_security_id, b_exchange, b_security_id = self._positions.pop(key)
+            reason = f'Pair exit (other leg {symbol} closed): {key[0]}/{key[1]}'
+            if symbol == key[0]:
+                self._closing.append(self._leg(key[1], b_exchange, b_security_id,
+                                               'BUY' if side == 'LONG' else 'SELL', qty_b, reason, True))
+            else:
+                self._closing.append(self._leg(key[0], a_exchange, a_security_id,
+                                               'SELL' if side == 'LONG' else 'BUY', qty_a, reason, True))
+            logger.info(f"Pair {key[0]}/{key[1]}: {symbol} closed, closing the other leg")
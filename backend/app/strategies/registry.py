@@ -1,7 +1,9 @@
 from app.strategies.ema_crossover import EMACrossoverStrategy
+from app.strategies.pairs_trading import PairsTradingStrategy
 
 STRATEGY_REGISTRY = {
     "ema_crossover": EMACrossoverStrategy,
+    "pairs_trading": PairsTradingStrategy,
 }
 
 
@@ -0,0 +1,127 @@
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.services import dhan_client, metrics, journal
+from app.strategies import indicators
+import pandas as pd
+import numpy as np
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+InstrumentKey = Tuple[str, str]  # (exchange, security_id)
+
+
+class FeatureCache:
+    """
+    Memoized indicators for one instrument's DataFrame within a cycle. export() and
+    merge() move them as bare arrays (the index is the df's) to and from strategy
+    worker processes, so isolated strategies share them too.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._memo: Dict[tuple, pd.Series] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: tuple, compute: Callable[[], pd.Series]) -> pd.Series:
+        value = self._memo.get(key)
+        if value is None:
+            self.misses += 1
+            value = compute()
+            self._memo[key] = value
+        else:
+            self.hits += 1
+        return value
+
+    def ema(self, period: int, column: str = 'close') -> pd.Series:
+        return self._get(("ema", column, period), lambda: indicators.ema(self.df[column], period))
+
+    def sma(self, period: int, column: str = 'close') -> pd.Series:
+        return self._get(("sma", column, period), lambda: indicators.sma(self.df[column], period))
+
+    def rsi(self, period: int = 14, column: str = 'close') -> pd.Series:
+        return self._get(("rsi", column, period), lambda: indicators.rsi(self.df[column], period))
+
+    def atr(self, period: int = 14) -> pd.Series:
+        return self._get(("atr", period), lambda: indicators.atr(self.df, period))
+
+    def export(self, exclude=()) -> Dict[tuple, np.ndarray]:
+        return {key: series.to_numpy() for key, series in list(self._memo.items()) if key not in exclude}
+
+    def merge(self, arrays: Dict[tuple, np.ndarray], hits: int = 0, misses: int = 0):
+        """Adopt indicators computed on a copy of this df elsewhere, with that copy's counts"""
+        for key, values in arrays.items():
+            self._memo.setdefault(key, pd.Series(values, index=self.df.index))
+        self.hits += hits
+        self.misses += misses
+
+
+class CycleData:
+    """
+    Market data for one strategy cycle.
+    Each unique instrument is fetched and converted once, however many
+    strategies watch it, and its FeatureCache is shared between them.
+    With a `history` (WarmupHistory), earlier sessions' bars are prepended.
+    """
+
+    def __init__(self, db: Session, to_frame: Callable[[object], pd.DataFrame],
+                 fetch: Optional[Callable] = None, min_bars: int = 5, history=None):
+        self.db = db
+        self._to_frame = to_frame
+        self._fetch = fetch or dhan_client.get_intraday_data
+        self._history = history
+        self.min_bars = min_bars
+        self._frames: Dict[InstrumentKey, Optional[pd.DataFrame]] = {}
+        self._features: Dict[InstrumentKey, FeatureCache] = {}
+
+    def prefetch(self, instruments: Iterable[InstrumentKey]):
+        for key in dict.fromkeys(instruments):
+            self._load(key)
+
+    def _load(self, key: InstrumentKey) -> Optional[pd.DataFrame]:
+        if key in self._frames:
+            return self._frames[key]
+        exchange, security_id = key
+        df = None
+        try:
+            t0 = time.perf_counter()
+            candles = self._fetch(db=self.db, security_id=security_id, exchange=exchange)
+            t1 = time.perf_counter()
+            metrics.STAGE_FETCH.observe(t1 - t0)
+            if candles:
+                journal.record_bars(exchange, security_id, candles)
+                df = self._to_frame(candles)
+                if self._history is not None and not df.empty:
+                    df = self._history.extend(key, df)
+                metrics.STAGE_DATAFRAME.observe(time.perf_counter() - t1)
+                if df.empty or len(df) < self.min_bars:
+                    df = None
+        except Exception as e:
+            metrics.CYCLE_ERRORS.labels("fetch").inc()
+            logger.error(f"Market data fetch failed for {exchange}:{security_id}: {e}")
+        self._frames[key] = df
+        return df
+
+    def frame(self, exchange: str, security_id: str) -> Optional[pd.DataFrame]:
+        return self._load((exchange, security_id))
+
+    def features(self, exchange: str, security_id: str) -> Optional[FeatureCache]:
+        key = (exchange, security_id)
+        cache = self._features.get(key)
+        if cache is None:
+            df = self._load(key)
+            if df is None:
+                return None
+            cache = self._features[key] = FeatureCache(df)
+        return cache
+
+    @property
+    def instruments(self) -> int:
+        return len(self._frames)
+
+    def feature_stats(self) -> Tuple[int, int]:
+        hits = sum(c.hits for c in self._features.values())
+        misses = sum(c.misses for c in self._features.values())
+        return hits, misses
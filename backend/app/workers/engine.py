@@ -1,203 +1,543 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
 from app.db.base import SessionLocal
-from app.models.strategy import Strategy, WatchlistItem
+from app.models.strategy import Strategy
 from app.models.order import Order, LogEntry, GlobalSettings
 from app.strategies.registry import get_strategy_class
-from app.services import dhan_client, risk_manager
+from app.strategies.base import TradeIntent
+from app.services import dhan_client, risk_manager, metrics, profiler, portfolio_risk, paper_broker, trigger_monitor, journal, topology, option_chain, accounts, candles, alerts, warmup, cross_section
+from app.services.instruments import get_master as get_instruments
+from app.services.market_calendar import get_calendar, SessionWindow
+from app.workers.cycle_data import CycleData
+from app.workers import strategy_pool
 from app.core.config import settings
 from datetime import datetime
-import pytz
 import pandas as pd
 import logging
 import json
+import time
 
 logger = logging.getLogger(__name__)
 
 _scheduler = BackgroundScheduler()
-_strategy_instances = {}
 _is_market_open = False
 
 
 def is_market_open() -> bool:
-    """Check if Indian stock market is open"""
-    ist = pytz.timezone(settings.TIMEZONE)
-    now = datetime.now(ist)
-    # Market is closed on weekends
-    if now.weekday() >= 5:  # Saturday=5, Sunday=6
-        return False
-    market_open = now.replace(
-        hour=settings.MARKET_OPEN_HOUR,
-        minute=settings.MARKET_OPEN_MINUTE,
-        second=0, microsecond=0
+    """Check if Indian stock market is open (holiday and special-session aware)"""
+    return get_calendar().is_open()
+
+
+def _check_intents(db, gs: GlobalSettings, cycle_intents: list) -> list:
+    """Run the portfolio pre-trade checks for the whole cycle as one batch; returns approved pairs"""
+    past_square_off = get_calendar().is_past_square_off()
+    legs = {}
+    for strategy, intent in cycle_intents:
+        key = _group_key(strategy, intent)
+        if key is not None:
+            legs[key] = legs.get(key, 0) + 1
+    candidates = []
+    for strategy, intent in cycle_intents:
+        if past_square_off and intent.product == "INTRADAY" and not intent.is_exit:
+            metrics.INTENTS_BLOCKED.labels(strategy.name).inc()
+            journal.record_risk(intent, False, "Past intraday square-off time", 0)
+            logger.info(f"Trade blocked for {intent.symbol}: past intraday square-off time")
+            alerts.emit("WARN", "risk", f"{strategy.name}: {intent.side} {intent.symbol} blocked, past square-off")
+            continue
+        candidates.append((strategy, intent))
+    if not candidates:
+        return []
+
+    t0 = time.perf_counter()
+    book = portfolio_risk.get_book(db)
+    primary = topology.get(db).dhan
+    limits = portfolio_risk.load_limits(gs, portfolio_risk.get_capital(db, gs, primary), primary)
+    decisions = book.check_batch([intent for _, intent in candidates], limits)
+    metrics.STAGE_RISK.observe(time.perf_counter() - t0)
+
+    sized = []
+    for (strategy, intent), decision in zip(candidates, decisions):
+        # F&O orders go out in whole lots; the risk-sized quantity is rounded down
+        lot = get_instruments().lot_size(intent.exchange, intent.security_id)
+        qty = decision.qty - decision.qty % lot
+        if decision.approved and qty <= 0:
+            decision = decision._replace(approved=False, reason=f"Sized below one lot ({decision.qty} < {lot})")
+        sized.append((strategy, intent, decision._replace(qty=qty), lot))
+    sized = _size_groups(sized, legs)
+
+    approved = []
+    for strategy, intent, decision, _ in sized:
+        journal.record_risk(intent, decision.approved, decision.reason, decision.qty)
+        if not decision.approved:
+            metrics.INTENTS_BLOCKED.labels(strategy.name).inc()
+            logger.info(f"Trade blocked for {intent.symbol}: {decision.reason}")
+            alerts.emit("WARN", "risk", f"{strategy.name}: {intent.side} {intent.symbol} blocked, {decision.reason}")
+            continue
+        intent.qty = decision.qty
+        approved.append((strategy, intent))
+    return approved
+
+
+def _group_key(strategy: Strategy, intent):
+    return (strategy.id, intent.group) if intent.group is not None and not intent.is_exit else None
+
+
+def _size_groups(sized: list, legs: dict) -> list:
+    """
+    Grouped entries (TradeIntent.group) pass or fail together: if any leg was blocked,
+    here or before the risk checks, all are; otherwise every leg is scaled by the
+    smallest approved/requested ratio among them, so the strategy's qty ratio (e.g. a
+    pair's hedge ratio) holds at the risk-allowed size.
+    """
+    groups = {}
+    for i, (strategy, intent, _, _) in enumerate(sized):
+        key = _group_key(strategy, intent)
+        if key is not None:
+            groups.setdefault(key, []).append(i)
+    for key, members in groups.items():
+        decisions = [sized[i][2] for i in members]
+        blocked = next((f"{sized[i][1].symbol}: {d.reason}" for i, d in zip(members, decisions) if not d.approved), None)
+        if blocked is None and len(members) < legs[key]:
+            blocked = "a leg was blocked before the risk checks"
+        if blocked is None:
+            scale = min(d.qty / max(sized[i][1].qty, 1) for i, d in zip(members, decisions))
+            for i, decision in zip(members, decisions):
+                strategy, intent, _, lot = sized[i]
+                qty = int(scale * max(intent.qty, 1))
+                qty -= qty % lot
+                if qty <= 0:
+                    blocked = f"{intent.symbol} scaled below one lot"
+                    break
+                sized[i] = (strategy, intent, decision._replace(qty=qty), lot)
+        if blocked is not None:
+            for i in members:
+                strategy, intent, decision, lot = sized[i]
+                reason = decision.reason if not decision.approved else f"Group {intent.group} blocked ({blocked})"
+                sized[i] = (strategy, intent, decision._replace(approved=False, reason=reason, qty=0), lot)
+    return sized
+
+
+def _execute_intent(db, gs: GlobalSettings, strategy: Strategy, intent):
+    """Submit and record one risk-approved intent, fanned out concurrently to every live account"""
+    orders = accounts.allocate(db, gs, topology.get(db), strategy, intent)
+    t0 = time.perf_counter()
+    results = accounts.submit(orders, lambda order: dhan_client.place_order(
+        db=db,
+        symbol=intent.symbol,
+        exchange=intent.exchange,
+        side=intent.side,
+        qty=order.qty,
+        order_type=intent.order_type,
+        price=intent.price,
+        product=intent.product,
+        security_id=intent.security_id,
+        sl=intent.sl,
+        target=intent.target,
+        strategy_id=strategy.id,
+        reason=intent.reason,
+        account=order.account
+    ))
+    metrics.STAGE_ORDER_SUBMIT.observe(time.perf_counter() - t0)
+    for order, result in zip(orders, results):
+        _record_order(db, gs, order, result)
+    t0 = time.perf_counter()
+    db.commit()
+    metrics.STAGE_DB_COMMIT.observe(time.perf_counter() - t0)
+
+    if results[0].get('success'):
+        protection = None
+        if not intent.is_exit and (intent.sl is not None or intent.target is not None or intent.trail):
+            # Protection follows the primary position; its exit fans out like any other intent
+            protection = dict(strategy_id=strategy.id, exchange=intent.exchange, symbol=intent.symbol,
+                              side=intent.side, qty=intent.qty, stop=intent.sl, target=intent.target,
+                              trail=intent.trail, security_id=intent.security_id, product=intent.product)
+        if protection and results[0].get('paper'):
+            trigger_monitor.get_monitor().arm(results[0]['orderId'], **protection)
+        elif protection:
+            trigger_monitor.get_monitor().add(entry_price=intent.price or intent.ref_price or 0.0, **protection)
+
+
+def _record_order(db, gs: GlobalSettings, order: accounts.AccountOrder, result: dict):
+    """Journal, persist and book one account's submitted order (the caller commits)"""
+    strategy, intent, account, qty = order
+    account_id = account.id if account is not None else None
+    journal.record_order("submit", strategy_id=strategy.id, exchange=intent.exchange, symbol=intent.symbol,
+                         side=intent.side, qty=qty, order_type=intent.order_type, price=intent.price,
+                         product=intent.product, is_exit=intent.is_exit, reason=intent.reason,
+                         success=bool(result.get('success')), paper=bool(result.get('paper')),
+                         order_id=result.get('orderId'), account_id=account_id)
+
+    # Log to DB. Paper orders stay PENDING until the paper broker fills them; a
+    # rejected or failed submission is recorded as REJECTED and never booked.
+    is_paper = risk_manager.is_paper_trading(gs) or bool(result.get('paper'))
+    metrics.ORDERS_SUBMITTED.labels(
+        "paper" if is_paper else "live",
+        "ok" if result.get('success') else "error"
+    ).inc()
+    fill_price = intent.price or intent.ref_price
+    order_entry = Order(
+        strategy_id=strategy.id,
+        account_id=account_id,
+        symbol=intent.symbol,
+        exchange=intent.exchange,
+        side=intent.side,
+        qty=qty,
+        price=fill_price,
+        order_type=intent.order_type,
+        product=intent.product,
+        sl=intent.sl,
+        target=intent.target,
+        is_paper=is_paper,
+        status="REJECTED" if not result.get('success') else "PENDING" if is_paper else "EXECUTED",
+        dhan_order_id=result.get('orderId') if result.get('success') else None,
+        notes=intent.reason
     )
-    market_close = now.replace(
-        hour=settings.MARKET_CLOSE_HOUR,
-        minute=settings.MARKET_CLOSE_MINUTE,
-        second=0, microsecond=0
-    )
-    return market_open <= now <= market_close
-
-
-def get_or_create_strategy_instance(strategy: Strategy):
-    """Get or create strategy instance from registry"""
-    global _strategy_instances
-    if strategy.id not in _strategy_instances:
-        cls = get_strategy_class(strategy.module_name)
-        if cls is None:
-            logger.error(f"Strategy class not found: {strategy.module_name}")
-            return None
-        config = {"product": "INTRADAY"}
-        params = strategy.params or {}
-        _strategy_instances[strategy.id] = cls(config=config, params=params)
-    return _strategy_instances[strategy.id]
-
-
-def candles_to_df(candle_data: list) -> pd.DataFrame:
-    """Convert Dhan candle data to DataFrame"""
-    if not candle_data:
-        return pd.DataFrame()
+    db.add(order_entry)
+
+    if result.get('success') and not result.get('paper'):
+        book = portfolio_risk.get_book() if account is None else portfolio_risk.get_account_book(db, account.id)
+        book.apply_fill(strategy.id, (intent.exchange, intent.symbol), intent.symbol,
+                        intent.side, qty, fill_price or 0.0, intent.product)
+
+    label = f" [{account.name or account.client_id}]" if account is not None else ""
+    logger.info(f"{'[PAPER]' if is_paper else '[LIVE]'}{label} {intent.side} {qty} {intent.symbol}: {intent.reason}")
+    summary = f"{'[PAPER]' if is_paper else '[LIVE]'}{label} {strategy.name}: {intent.side} {qty} {intent.symbol}"
+    if result.get('success'):
+        alerts.emit("INFO", "order", f"{summary} - {intent.reason}")
+    else:
+        alerts.emit("ERROR", "order", f"{summary} failed: {result.get('error')}")
+
+
+def _record_paper_fills(db, fills: list):
+    """Apply simulated fills to the exposure book and the orders table"""
+    if not fills:
+        return
+    book = portfolio_risk.get_book()
+    monitor = trigger_monitor.get_monitor()
+    for fill in fills:
+        book.apply_fill(fill.strategy_id, (fill.exchange, fill.symbol), fill.symbol,
+                        fill.side, fill.qty, fill.fill_price, fill.product)
+        monitor.on_fill(fill.order_id, fill.fill_price)
+        journal.record_order("fill", strategy_id=fill.strategy_id, exchange=fill.exchange, symbol=fill.symbol,
+                             side=fill.side, qty=fill.qty, price=fill.fill_price, product=fill.product,
+                             reason=fill.reason, paper=True, order_id=fill.order_id)
+        order = db.query(Order).filter(Order.dhan_order_id == fill.order_id).first()
+        if order is None:
+            # Bracket legs and square-offs originate in the paper broker
+            order = Order(
+                strategy_id=fill.strategy_id, symbol=fill.symbol, exchange=fill.exchange,
+                side=fill.side, qty=fill.qty, order_type=fill.order_type, product=fill.product,
+                is_paper=True, dhan_order_id=fill.order_id, notes=fill.reason
+            )
+            db.add(order)
+        order.status = "EXECUTED"
+        order.price = fill.fill_price
+        logger.info(f"[PAPER] Filled {fill.order_id}: {fill.side} {fill.qty} {fill.symbol} @ {fill.fill_price:.2f}"
+                    f"{' (' + fill.reason + ')' if fill.reason else ''}")
+    db.commit()
+
+
+def _on_trigger(position: trigger_monitor.ProtectedPosition, kind: str, level: float):
+    """Exit handler of the trigger monitor: close the position right away, outside the minute cycle"""
+    db = SessionLocal()
     try:
-        df = pd.DataFrame(candle_data)
-        # Dhan returns: open, high, low, close, volume, timestamp
-        col_map = {
-            'open': 'open', 'high': 'high', 'low': 'low',
-            'close': 'close', 'volume': 'volume'
-        }
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        return df
+        topo = topology.get(db)
+        gs = topo.settings
+        strategy = topo.strategy(position.strategy_id)
+        if gs is None or strategy is None:
+            logger.error(f"{kind} exit for {position.symbol} dropped: strategy {position.strategy_id} not found")
+            return
+        intent = TradeIntent(
+            symbol=position.symbol, exchange=position.exchange, side=position.exit_side,
+            qty=position.qty, order_type="MARKET", product=position.product,
+            security_id=position.security_id, reason=f"{kind} hit @ {level:.2f}", is_exit=True
+        )
+        intent.strategy_id = strategy.id
+        intent.ref_price = level
+        _execute_intent(db, gs, strategy, intent)
+        strategy_pool.get_runner().position_closed(strategy.id, position.symbol)
     except Exception as e:
-        logger.error(f"candles_to_df error: {e}")
-        return pd.DataFrame()
+        metrics.CYCLE_ERRORS.labels("order").inc()
+        db.rollback()
+        logger.error(f"Error executing {kind} exit for {position.symbol}: {e}")
+        alerts.emit("ERROR", "error", f"{kind} exit for {position.symbol} failed: {e}")
+    finally:
+        db.close()
 
 
-def run_strategy_cycle():
-    """Main strategy execution cycle - runs every minute"""
+def _prepare_intents(strategy: Strategy, result: strategy_pool.CallResult, data: CycleData) -> list:
+    """Account one on_bar call and stamp its intents with what the risk checks need"""
+    item = result.item
+    metrics.STAGE_ON_BAR.observe(result.seconds)
+    profiler.record_on_bar(strategy.name, item.symbol, result.seconds)
+    if not result.intents:
+        return []
+    metrics.INTENTS_GENERATED.labels(strategy.name).inc(len(result.intents))
+    for intent in result.intents:
+        # Usually the bar's own symbol, but e.g. a pairs strategy also trades the other leg
+        key = (intent.exchange, intent.security_id or intent.symbol)
+        features = data.features(*key) or data.features(item.exchange, item.security_id or item.symbol)
+        atr = features.atr(14).iloc[-1]
+        intent.strategy_id = strategy.id
+        intent.ref_price = float(features.df['close'].iloc[-1])
+        intent.atr = None if pd.isna(atr) else float(atr)
+        journal.record_intent(intent)
+    return result.intents
+
+
+def run_strategy_cycle(fetch=None):
+    """Main strategy execution cycle - runs every minute. `fetch` overrides the market data source (replay)."""
     if not is_market_open():
         return
 
+    cycle_start = time.perf_counter()
+    profiler.cycle_started()
     db = SessionLocal()
     try:
-        gs = db.query(GlobalSettings).first()
+        # Settings, strategies and watchlists come from the cached topology:
+        # no configuration queries unless the API changed something.
+        topo = topology.get(db)
+        gs = topo.settings
         if not gs or not gs.trading_enabled:
             if gs and not gs.trading_enabled:
                 pass  # Trading disabled, skip
             return
 
-        active_strategies = db.query(Strategy).filter(Strategy.is_enabled == True).all()
+        active_strategies = topo.enabled
         if not active_strategies:
             return
 
         logger.info(f"Running {len(active_strategies)} active strategies")
 
-        for strategy in active_strategies:
-            try:
-                watchlist = db.query(WatchlistItem).filter(
-                    WatchlistItem.strategy_id == strategy.id
-                ).all()
-
-                if not watchlist:
+        # Build the strategy x watchlist plan first so market data can be
+        # fetched once per unique instrument instead of once per pair.
+        plan = [(strategy, item) for strategy in active_strategies for item in strategy.watchlist_items]
+
+        # Live cycles see earlier sessions' bars ahead of today's (loaded pre-open);
+        # replayed days have no matching warm-up
+        data = CycleData(db, to_frame=candles.from_dhan, fetch=fetch,
+                         history=warmup.active() if fetch is None else None)
+        data.prefetch((item.exchange, item.security_id or item.symbol) for _, item in plan)
+
+        # Chains are fetched and solved off the cycle by the option-chain refresher; the
+        # cycle takes its latest analytics. Replayed sessions have no recorded chains.
+        chains = {}
+        if fetch is None:
+            chain_items = [item for strategy, item in plan
+                           if getattr(get_strategy_class(strategy.module_name), "uses_option_chain", False)]
+            if chain_items:
+                chains = option_chain.track(chain_items)
+
+        # Rolling correlations and pair spreads across everything cross-sectional strategies watch
+        cross = None
+        cross_items = [item for strategy, item in plan
+                       if getattr(get_strategy_class(strategy.module_name), "uses_cross_section", False)]
+        if cross_items:
+            cross = cross_section.refresh(cross_items, data.frame)
+
+        book = portfolio_risk.get_book(db)
+
+        # Simulate paper fills on the bars that arrived since the last cycle
+        if paper_broker.is_active():
+            broker = paper_broker.get_broker()
+            fills, simulated = [], set()
+            for _, item in plan:
+                if (item.exchange, item.symbol) in simulated:
                     continue
-
-                strategy_instance = get_or_create_strategy_instance(strategy)
-                if not strategy_instance:
+                simulated.add((item.exchange, item.symbol))
+                fills.extend(broker.on_frame(item.exchange, item.symbol,
+                                             data.frame(item.exchange, item.security_id or item.symbol)))
+            _record_paper_fills(db, fills)
+
+        # Without a live feed, stops and targets are checked against the latest bar
+        monitor = trigger_monitor.get_monitor()
+        if len(monitor) and not trigger_monitor.feed_running():
+            checked = set()
+            for _, item in plan:
+                df = data.frame(item.exchange, item.security_id or item.symbol)
+                if df is None or (item.exchange, item.symbol) in checked:
                     continue
-
-                for item in watchlist:
+                checked.add((item.exchange, item.symbol))
+                monitor.on_range(item.exchange, item.symbol, float(df['high'].iloc[-1]), float(df['low'].iloc[-1]))
+
+        calls = {}
+        for strategy, item in plan:
+            security_id = item.security_id or item.symbol
+            df = data.frame(item.exchange, security_id)
+            if df is None:
+                continue
+            book.mark((item.exchange, item.symbol), float(df['close'].iloc[-1]))
+            config = {
+                'exchange': item.exchange,
+                'security_id': item.security_id or '',
+                'product': strategy.params.get('product', 'INTRADAY') if strategy.params else 'INTRADAY'
+            }
+            calls.setdefault(strategy.id, []).append(
+                strategy_pool.StrategyCall(item, df, config, data.features(item.exchange, security_id),
+                                           chains.get((item.exchange, str(security_id))),
+                                           cross.view((item.exchange, str(security_id))) if cross else None)
+            )
+
+        # Strategies with positions or recent signals run first and their orders go out
+        # before the rest is even started; each strategy is held to its own time budget.
+        runner = strategy_pool.get_runner()
+        for tier in runner.tiers([s for s in active_strategies if s.id in calls], book):
+            cycle_intents = []
+            for strategy, results in runner.run([(s, calls[s.id]) for s in tier]):
+                for result in results:
                     try:
-                        # Fetch intraday data
-                        candles = dhan_client.get_intraday_data(
-                            db=db,
-                            security_id=item.security_id or item.symbol,
-                            exchange=item.exchange
-                        )
-
-                        if not candles:
-                            continue
-
-                        df = candles_to_df(candles)
-                        if df.empty or len(df) < 5:
-                            continue
-
-                        # Run strategy
-                        config = {
-                            'exchange': item.exchange,
-                            'security_id': item.security_id or '',
-                            'product': strategy.params.get('product', 'INTRADAY') if strategy.params else 'INTRADAY'
-                        }
-                        strategy_instance.config = config
-
-                        intents = strategy_instance.on_bar(item.symbol, df)
-
-                        for intent in intents:
-                            # Check risk
-                            can_trade, reason = risk_manager.can_open_new_trade(db, strategy)
-                            if not can_trade:
-                                logger.info(f"Trade blocked for {item.symbol}: {reason}")
-                                continue
-
-                            # Place order
-                            result = dhan_client.place_order(
-                                db=db,
-                                symbol=intent.symbol,
-                                exchange=intent.exchange,
-                                side=intent.side,
-                                qty=intent.qty,
-                                order_type=intent.order_type,
-                                price=intent.price,
-                                product=intent.product,
-                                security_id=intent.security_id,
-                                sl=intent.sl,
-                                target=intent.target
-                            )
-
-                            # Log to DB
-                            is_paper = gs.paper_trading
-                            order_entry = Order(
-                                strategy_id=strategy.id,
-                                symbol=intent.symbol,
-                                exchange=intent.exchange,
-                                side=intent.side,
-                                qty=intent.qty,
-                                order_type=intent.order_type,
-                                product=intent.product,
-                                sl=intent.sl,
-                                target=intent.target,
-                                is_paper=is_paper,
-                                status="PAPER" if is_paper else "EXECUTED",
-                                dhan_order_id=result.get('orderId') if result.get('success') else None,
-                                notes=intent.reason
-                            )
-                            db.add(order_entry)
-                            db.commit()
-
-                            logger.info(f"{'[PAPER]' if is_paper else '[LIVE]'} {intent.side} {intent.qty} {intent.symbol}: {intent.reason}")
-
+                        cycle_intents.extend((strategy, intent) for intent in
+                                             _prepare_intents(strategy, result, data))
                     except Exception as e:
-                        logger.error(f"Error processing {item.symbol} for strategy {strategy.name}: {e}")
-
-            except Exception as e:
-                logger.error(f"Error running strategy {strategy.name}: {e}")
+                        metrics.CYCLE_ERRORS.labels("symbol").inc()
+                        logger.error(f"Error processing {result.item.symbol} for strategy {strategy.name}: {e}")
+
+            for strategy, intent in _check_intents(db, gs, cycle_intents):
+                try:
+                    if intent.is_exit:
+                        monitor.remove_for(strategy.id, intent.exchange, intent.symbol)
+                    _execute_intent(db, gs, strategy, intent)
+                except Exception as e:
+                    metrics.CYCLE_ERRORS.labels("order").inc()
+                    db.rollback()
+                    logger.error(f"Error executing {intent} for strategy {strategy.name}: {e}")
+                    alerts.emit("ERROR", "error", f"{strategy.name}: executing {intent} failed: {e}")
+
+        hits, misses = data.feature_stats()
+        logger.info(f"Cycle data: {len(plan)} strategy/symbol pairs over {data.instruments} instruments, "
+                    f"feature cache {hits} hits / {misses} computed")
 
     except Exception as e:
+        metrics.CYCLE_ERRORS.labels("cycle").inc()
         logger.error(f"run_strategy_cycle error: {e}")
+        alerts.emit("ERROR", "error", f"Strategy cycle failed: {e}")
+    finally:
+        db.close()
+        metrics.CYCLE_SECONDS.observe(time.perf_counter() - cycle_start)
+        profiler.cycle_finished()
+
+
+def on_pre_open():
+    """Pre-open hook: reset per-day state before the session starts"""
+    db = SessionLocal()
+    try:
+        risk_manager.reset_daily_stats(db)
+        portfolio_risk.get_book(db).reset_day()
+        for book in portfolio_risk.account_books().values():
+            book.reset_day()
+        strategy_pool.get_runner().warm_up(topology.get(db).enabled)
+        _load_instruments()
+        _warm_up_history(db)
+        _start_trigger_feed(db)
+    finally:
+        db.close()
+
+
+def _load_instruments():
+    """Load today's scrip master before the open, so lot-size lookups never download it mid-cycle"""
+    try:
+        get_instruments().load()
+    except Exception as e:
+        logger.error(f"Instrument master load failed: {e}")
+
+
+def _warm_up_history(db):
+    """Load earlier sessions' bars of every watchlist instrument, so indicators start the day warm"""
+    try:
+        warmup.warm_up(topology.get(db).watchlist())
+    except Exception as e:
+        logger.error(f"Indicator warm-up failed, strategies start cold: {e}")
+
+
+def _start_trigger_feed(db):
+    """Stream LTPs of every watchlist instrument into the trigger monitor (live mode only)"""
+    topo = topology.get(db)
+    gs = topo.settings
+    if not settings.TRIGGER_FEED_ENABLED or risk_manager.is_paper_trading(gs):
+        return
+    cfg = topo.dhan
+    if cfg is None or not cfg.client_id or not cfg.access_token:
+        return
+    instruments = {(item.exchange, item.security_id, item.symbol)
+                   for item in topo.watchlist() if item.security_id}
+    try:
+        trigger_monitor.start_feed(cfg.client_id, cfg.access_token, sorted(instruments))
+    except Exception as e:
+        logger.error(f"Market feed start failed, falling back to per-cycle trigger checks: {e}")
+
+
+def square_off_intraday():
+    """Auto square-off time: no further INTRADAY entries are accepted this session"""
+    logger.warning("Intraday square-off time reached - new INTRADAY entries are blocked for this session")
+    if paper_broker.is_active():
+        db = SessionLocal()
+        try:
+            _record_paper_fills(db, paper_broker.get_broker().flatten("INTRADAY"))
+        finally:
+            db.close()
+    trigger_monitor.get_monitor().clear("INTRADAY")
+
+
+def ingest_session_candles():
+    """Persist today's minute bars for every watchlist and screener-universe symbol into the candle store"""
+    from app.services.candle_store import ingest_intraday
+    from app.services.screener import with_universe
+    db = SessionLocal()
+    try:
+        ingest_intraday(db, with_universe(topology.get(db).watchlist()))
     finally:
         db.close()
 
 
+def _on_session_end():
+    trigger_monitor.stop_feed()
+    _schedule_session(get_calendar().next_session())
+    try:
+        ingest_session_candles()
+    except Exception as e:
+        logger.error(f"Candle ingestion error: {e}")
+
+
+def _schedule_session(window: SessionWindow):
+    """Arm the jobs for one session. Between sessions no job is due, so the scheduler just sleeps."""
+    tz = get_calendar().tz
+    now = datetime.now(tz)
+    if window.pre_open > now:
+        _scheduler.add_job(on_pre_open, DateTrigger(run_date=window.pre_open),
+                           id='pre_open', replace_existing=True)
+    # Strategy cycle every minute at :05 seconds, only inside the session
+    _scheduler.add_job(
+        run_strategy_cycle,
+        CronTrigger(second=5, start_date=window.open, end_date=window.close, timezone=tz),
+        id='strategy_cycle',
+        replace_existing=True
+    )
+    if window.square_off > now:
+        _scheduler.add_job(square_off_intraday, DateTrigger(run_date=window.square_off),
+                           id='square_off', replace_existing=True)
+    _scheduler.add_job(_on_session_end, DateTrigger(run_date=window.closing_session_end),
+                       id='session_end', replace_existing=True)
+    logger.info(f"Next session scheduled: {window.day} {window.name} "
+                f"{window.open:%H:%M}-{window.close:%H:%M} (square-off {window.square_off:%H:%M})")
+
+
 def start_scheduler():
     """Start the APScheduler"""
     global _scheduler
     if not _scheduler.running:
-        # Run strategy cycle every minute at :05 seconds
-        _scheduler.add_job(
-            run_strategy_cycle,
-            CronTrigger(second=5),  # Every minute at :05
-            id='strategy_cycle',
-            replace_existing=True
-        )
+        window = get_calendar().next_session()
+        _schedule_session(window)
+        trigger_monitor.get_monitor().set_exit_handler(_on_trigger)
+        topology.start_listener()
+        if window.pre_open <= datetime.now(get_calendar().tz):
+            # Started mid-session, after on_pre_open would have warmed up and started the feed
+            db = SessionLocal()
+            try:
+                _warm_up_history(db)
+                _start_trigger_feed(db)
+            finally:
+                db.close()
         _scheduler.start()
         logger.info("Strategy scheduler started")
 
@@ -207,6 +547,11 @@ def stop_scheduler():
     global _scheduler
     if _scheduler.running:
         _scheduler.shutdown(wait=False)
+        trigger_monitor.stop_feed()
+        option_chain.stop_refresher()
+        topology.stop_listener()
+        strategy_pool.shutdown()
+        accounts.shutdown()
         logger.info("Strategy scheduler stopped")
 
 
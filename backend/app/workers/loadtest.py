@@ -0,0 +1,441 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from app.services.candle_store import DHAN_EPOCH_OFFSET
+import numpy as np
+import subprocess
+import threading
+import platform
+import argparse
+import tempfile
+import asyncio
+import logging
+import random
+import httpx
+import json
+import time
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+SESSION_BARS = 375
+
+# (weight, method, path) of one virtual user's request mix. Kept fixed so results of
+# different versions are comparable; {sid} is a seeded strategy id.
+SCENARIO = [
+    (10, "GET", "/api/dashboard/status"),
+    (8, "GET", "/api/dashboard/positions"),
+    (8, "GET", "/api/dashboard/orders"),
+    (6, "GET", "/api/dashboard/pnl"),
+    (5, "GET", "/api/dashboard/funds"),
+    (5, "GET", "/api/dashboard/portfolio"),
+    (5, "GET", "/api/dashboard/logs"),
+    (4, "GET", "/api/dashboard/exposure"),
+    (3, "GET", "/api/dashboard/triggers"),
+    (3, "GET", "/api/dashboard/strategy-runtime"),
+    (2, "GET", "/api/dashboard/topology"),
+    (2, "GET", "/api/dashboard/accounts"),
+    (6, "GET", "/api/strategies/"),
+    (4, "GET", "/api/strategies/{sid}"),
+    (2, "GET", "/api/strategies/available/list"),
+    (4, "GET", "/api/control/scheduler-status"),
+    (1, "GET", "/api/control/profile/slowest"),
+    (1, "POST", "/api/control/reset-daily-pnl"),
+]
+
+
+def _percentiles(values_ms: List[float]) -> dict:
+    if not values_ms:
+        return {"n": 0, "p50": None, "p90": None, "p99": None, "max": None, "mean": None}
+    arr = np.asarray(values_ms)
+    return {
+        "n": int(arr.size),
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p90": round(float(np.percentile(arr, 90)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "max": round(float(arr.max()), 3),
+        "mean": round(float(arr.mean()), 3),
+    }
+
+
+# ---------------------------------------------------------------- mock broker
+
+class MockBroker:
+    """
+    Stand-in for the Dhan REST API on localhost: empty funds, positions, holdings and
+    order book, and acknowledged orders, each after `latency_ms` like a remote call.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        broker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, body):
+                broker.requests += 1
+                if broker.latency:
+                    time.sleep(broker.latency)
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                path = self.path.split("?")[0].rstrip("/")
+                if path == "/fundlimit":
+                    self._reply({"availabelBalance": 1_000_000.0, "sodLimit": 1_000_000.0,
+                                 "utilizedAmount": 0.0, "withdrawableBalance": 1_000_000.0})
+                else:
+                    self._reply([])  # positions, holdings, orders, trades
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                self._reply({"orderId": f"MOCK{broker.requests}", "orderStatus": "TRANSIT"})
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-broker", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ---------------------------------------------------------------- server process
+
+class SyntheticSession:
+    """Seeded random-walk minute bars per instrument, served like the intraday endpoint at the virtual time"""
+
+    def __init__(self, security_ids: List[str], open_ts: float, clock, seed: int = 7):
+        rng = np.random.default_rng(seed)
+        self.clock = clock
+        ts = (int(open_ts) + 60 * np.arange(SESSION_BARS)).astype(np.int64)
+        self.bars: Dict[str, dict] = {}
+        for security_id in security_ids:
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, SESSION_BARS)))
+            spread = close * rng.uniform(0, 2e-3, SESSION_BARS)
+            self.bars[security_id] = {
+                "ts": ts, "open": np.roll(close, 1), "high": close + spread, "low": close - spread,
+                "close": close, "volume": rng.integers(100, 10_000, SESSION_BARS),
+            }
+
+    def fetch(self, db, security_id: str, exchange: str = "NSE", **kwargs) -> Optional[dict]:
+        cols = self.bars.get(str(security_id))
+        if cols is None:
+            return None
+        cut = int(np.searchsorted(cols["ts"], self.clock() - 60, side="right"))
+        if cut == 0:
+            return None
+        return {
+            "open": cols["open"][:cut], "high": cols["high"][:cut], "low": cols["low"][:cut],
+            "close": cols["close"][:cut], "volume": cols["volume"][:cut],
+            "start_Time": cols["ts"][:cut] - DHAN_EPOCH_OFFSET,
+        }
+
+
+def _seed(session_factory, strategies: int, symbols: int) -> List[str]:
+    from app.models.strategy import Strategy, WatchlistItem
+    from app.models.order import GlobalSettings
+    from app.models.config_dhan import ConfigDhan
+    db = session_factory()
+    try:
+        db.add(ConfigDhan(id=1, client_id="LOADTEST", access_token="loadtest", name="loadtest"))
+        db.add(GlobalSettings(id=1, trading_enabled=True, paper_trading=True))
+        security_ids = [str(10_000 + i) for i in range(symbols)]
+        for n in range(strategies):
+            strategy = Strategy(name=f"loadtest_{n}", module_name="ema_crossover", class_name="EMACrossoverStrategy",
+                                is_enabled=True, params={"ema_fast": 5 + n % 5, "ema_slow": 13 + n % 8})
+            strategy.watchlist_items = [WatchlistItem(symbol=f"SYM{sid}", exchange="NSE", security_id=sid)
+                                        for sid in security_ids]
+            db.add(strategy)
+        db.commit()
+        return security_ids
+    finally:
+        db.close()
+
+
+def serve(port: int, strategies: int, symbols: int, cycle_interval: float, seed: int):
+    """
+    Child process: the real app on `port` plus a cycle driver that runs
+    run_strategy_cycle every `cycle_interval` seconds on synthetic bars. The market
+    calendar runs on a virtual clock an hour into the next session, so the engine
+    trades regardless of wall-clock market hours. /loadtest/cycles reports timings.
+    """
+    import uvicorn
+    import app.main as main
+    from app.db.base import Base, SessionLocal, engine as db_engine
+    from app.services.market_calendar import get_calendar
+    from app.workers import engine, strategy_pool
+
+    Base.metadata.create_all(bind=db_engine)
+    security_ids = _seed(SessionLocal, strategies, symbols)
+
+    calendar = get_calendar()
+    window = calendar.next_session()
+    offset = window.open_ts + 3600 - time.time()
+    calendar.clock = lambda: time.time() + offset
+    calendar._today_bounds = (0.0, -1.0)
+    session = SyntheticSession(security_ids, window.open_ts, calendar.clock, seed)
+    # The driver below replaces the cron-triggered cycle
+    main.start_scheduler = lambda: None
+
+    timings: List[tuple] = []  # (wall time at start, seconds)
+    stop = threading.Event()
+
+    def drive():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            engine.run_strategy_cycle(fetch=session.fetch)
+            elapsed = time.perf_counter() - t0
+            timings.append((time.time(), elapsed))
+            stop.wait(max(cycle_interval - elapsed, 0.0))
+
+    def cycles(since: float = 0.0):
+        return {"cycles_ms": [round(s * 1000, 3) for t, s in timings if t >= since]}
+
+    main.app.add_api_route("/loadtest/cycles", cycles, methods=["GET"], include_in_schema=False)
+    driver = threading.Thread(target=drive, name="loadtest-cycles", daemon=True)
+    driver.start()
+    try:
+        uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+    finally:
+        stop.set()
+        driver.join(timeout=cycle_interval + 30)
+        strategy_pool.shutdown()
+
+
+# ---------------------------------------------------------------- load driver
+
+async def _request(client: httpx.AsyncClient, method: str, url: str, key: str,
+                   errors: Dict[str, int]) -> httpx.Response:
+    try:
+        return await client.request(method, url)
+    except (httpx.ReadError, httpx.RemoteProtocolError):
+        # uvicorn closes a connection after an unhandled 500; a request sent on it from
+        # the keep-alive pool fails unserved, and a browser would resend it on a new one.
+        # The failed attempt is still an error the user would have waited on.
+        errors[key] = errors.get(key, 0) + 1
+        return await client.request(method, url)
+
+
+async def _virtual_user(client: httpx.AsyncClient, rng: random.Random, deadline: float,
+                        think: float, strategy_ids: List[int], samples: Dict[str, list], errors: Dict[str, int]):
+    weights = [w for w, _, _ in SCENARIO]
+    while time.perf_counter() < deadline:
+        _, method, path = rng.choices(SCENARIO, weights)[0]
+        url = path.replace("{sid}", str(rng.choice(strategy_ids)))
+        key = f"{method} {path}"
+        t0 = time.perf_counter()
+        try:
+            response = await _request(client, method, url, key, errors)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        elapsed = (time.perf_counter() - t0) * 1000
+        samples.setdefault(key, []).append(elapsed)
+        if not ok:
+            errors[key] = errors.get(key, 0) + 1
+        if think:
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+
+async def _load_phase(base_url: str, users: int, seconds: float, think_ms: float, seed: int,
+                      strategy_ids: List[int]) -> dict:
+    samples: Dict[str, list] = {}
+    errors: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+        deadline = time.perf_counter() + seconds
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            _virtual_user(client, random.Random(seed + i), deadline, think_ms / 1000, strategy_ids, samples, errors)
+            for i in range(users)
+        ))
+        wall = time.perf_counter() - start
+    every = [v for values in samples.values() for v in values]
+    return {
+        "requests": len(every),
+        "errors": sum(errors.values()),
+        "throughput_rps": round(len(every) / wall, 1) if wall else 0.0,
+        "latency_ms": _percentiles(every),
+        "endpoints": {key: {**_percentiles(values), "errors": errors.get(key, 0)}
+                      for key, values in sorted(samples.items())},
+    }
+
+
+def _cycles_since(client: httpx.Client, since: float) -> List[float]:
+    return client.get("/loadtest/cycles", params={"since": since}).json()["cycles_ms"]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(users: List[int], seconds: float = 30.0, warmup_seconds: float = 10.0, think_ms: float = 0.0,
+        strategies: int = 3, symbols: int = 50, cycle_interval: float = 2.0, broker_latency_ms: float = 20.0,
+        database_url: Optional[str] = None, port: int = 8765, seed: int = 7) -> dict:
+    """
+    Start the mock broker and the app (with its cycle driver) in a child process,
+    measure strategy cycle times idle, then drive the API with each number of
+    concurrent virtual users in turn and measure throughput, latency percentiles
+    and the cycle times under that load.
+    """
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    broker = MockBroker(broker_latency_ms)
+    broker.start()
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        "DATA_DIR": os.path.join(workdir, "data"),
+        "DHAN_API_BASE_URL": broker.url,
+        "PAPER_TRADING": "true",
+        "TRIGGER_FEED_ENABLED": "false",
+        "TELEGRAM_BOT_TOKEN": "",
+    }
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    child = subprocess.Popen(
+        [sys.executable, "-m", "app.workers.loadtest", "--serve", "--port", str(port),
+         "--strategies", str(strategies), "--symbols", str(symbols),
+         "--cycle-interval", str(cycle_interval), "--seed", str(seed)],
+        cwd=backend_dir, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        with httpx.Client(base_url=base_url, timeout=30.0) as client:
+            deadline = time.monotonic() + 120
+            while True:
+                if child.poll() is not None:
+                    raise RuntimeError(f"App process exited with code {child.returncode}")
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("App did not come up within 120s")
+                time.sleep(0.5)
+            listed = client.get("/api/strategies/")
+            strategy_ids = [s["id"] for s in listed.json()] if listed.status_code == 200 else [1]
+
+            logger.info(f"Warming up for {warmup_seconds:.0f}s")
+            time.sleep(warmup_seconds)
+            since = time.time()
+            time.sleep(seconds)
+            idle = _cycles_since(client, since)
+
+            phases = []
+            for n in users:
+                logger.info(f"{n} virtual users for {seconds:.0f}s")
+                since = time.time()
+                result = asyncio.run(_load_phase(base_url, n, seconds, think_ms, seed, strategy_ids))
+                cycles = _cycles_since(client, since)
+                result["users"] = n
+                result["cycle_ms"] = _percentiles(cycles)
+                idle_p50 = _percentiles(idle)["p50"]
+                loaded_p50 = result["cycle_ms"]["p50"]
+                result["cycle_slowdown_p50"] = round(loaded_p50 / idle_p50, 2) if idle_p50 and loaded_p50 else None
+                phases.append(result)
+                logger.info(f"{n} users: {result['throughput_rps']} req/s, p99 {result['latency_ms']['p99']} ms, "
+                            f"cycle p50 {loaded_p50} ms (x{result['cycle_slowdown_p50']} vs idle)")
+    finally:
+        child.terminate()
+        try:
+            child.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            child.kill()
+        broker.stop()
+
+    return {
+        "version": {"git": _git_revision(), "python": platform.python_version(), "cpus": os.cpu_count(),
+                    "platform": platform.platform()},
+        "scenario": {"users": users, "seconds": seconds, "think_ms": think_ms, "strategies": strategies,
+                     "symbols": symbols, "cycle_interval": cycle_interval, "broker_latency_ms": broker_latency_ms,
+                     "database": "sqlite" if database_url is None else database_url.split(":", 1)[0],
+                     "seed": seed, "mix": [f"{w} {m} {p}" for w, m, p in SCENARIO]},
+        "idle_cycle_ms": _percentiles(idle),
+        "broker_requests": broker.requests,
+        "phases": phases,
+    }
+
+
+def compare(baseline: dict, current: dict) -> List[str]:
+    """Side-by-side of two result files' phases (matched by user count)"""
+    lines = []
+    if baseline.get("scenario") != current.get("scenario"):
+        lines.append("warning: scenarios differ; numbers are not directly comparable")
+    lines.append(f"{'users':>5}  {'req/s':>15}  {'p50 ms':>15}  {'p99 ms':>15}  {'cycle p50 ms':>15}")
+    before = {p["users"]: p for p in baseline.get("phases", [])}
+    for phase in current.get("phases", []):
+        old = before.get(phase["users"])
+        if old is None:
+            continue
+        cells = [
+            (old["throughput_rps"], phase["throughput_rps"]),
+            (old["latency_ms"]["p50"], phase["latency_ms"]["p50"]),
+            (old["latency_ms"]["p99"], phase["latency_ms"]["p99"]),
+            (old["cycle_ms"]["p50"], phase["cycle_ms"]["p50"]),
+        ]
+        lines.append(f"{phase['users']:>5}  " + "  ".join(f"{a or 0:>7.1f}>{b or 0:<7.1f}" for a, b in cells))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.workers.loadtest",
+        description="Load-test the API against a scratch database and a mock broker while the engine cycles")
+    parser.add_argument("--users", default="1,10,50", help="comma-separated virtual-user counts, one phase each")
+    parser.add_argument("--seconds", type=float, default=30.0, help="duration of each phase")
+    parser.add_argument("--warmup", type=float, default=10.0)
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a user's requests")
+    parser.add_argument("--strategies", type=int, default=3)
+    parser.add_argument("--symbols", type=int, default=50, help="watchlist size of each strategy")
+    parser.add_argument("--cycle-interval", type=float, default=2.0, help="seconds between strategy cycles")
+    parser.add_argument("--broker-latency-ms", type=float, default=20.0)
+    parser.add_argument("--database-url", default=None, help="default: a scratch SQLite file")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="write the JSON result here")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+
+    if args.serve:
+        serve(args.port, args.strategies, args.symbols, args.cycle_interval, args.seed)
+        return
+    result = run(users=[int(n) for n in args.users.split(",")], seconds=args.seconds,
+                 warmup_seconds=args.warmup, think_ms=args.think_ms, strategies=args.strategies,
+                 symbols=args.symbols, cycle_interval=args.cycle_interval,
+                 broker_latency_ms=args.broker_latency_ms, database_url=args.database_url,
+                 port=args.port, seed=args.seed)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(json.load(f), result)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Optional, Tuple
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base, SessionLocal
+from app.models.strategy import Strategy, WatchlistItem
+from app.models.order import Order, GlobalSettings
+from app.models.config_dhan import ConfigDhan
+from app.services import paper_broker, portfolio_risk, trigger_monitor, journal, topology, alerts, cross_section, warmup
+from app.services.candle_store import get_store, DHAN_EPOCH_OFFSET
+from app.services.market_calendar import get_calendar
+from app.core.config import settings
+from app.workers import engine, strategy_pool
+import numpy as np
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# The live scheduler runs the cycle at :05 past every minute
+CYCLE_OFFSET_SECONDS = 5
+
+
+class VirtualClock:
+    def __init__(self, start: float):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+
+class RecordedDay:
+    """
+    One session of stored minute bars served the way the Dhan intraday endpoint
+    would have served them at the virtual time: only bars that have completed.
+    """
+
+    def __init__(self, day: date, items, clock: VirtualClock):
+        window = get_calendar().session(day)
+        if window is None:
+            raise ValueError(f"{day} is not a trading session")
+        self.window = window
+        self.clock = clock
+        store = get_store()
+        self.bars: Dict[Tuple[str, str], Dict[str, np.ndarray]] = {}
+        for item in items:
+            security_id = item.security_id or item.symbol
+            cols = store.read(item.exchange, security_id, window.open_ts, window.close_ts, "1")
+            if len(cols["ts"]):
+                self.bars[(item.exchange, security_id)] = {k: np.array(v) for k, v in cols.items()}
+
+    def fetch(self, db, security_id: str, exchange: str = "NSE", **kwargs) -> Optional[dict]:
+        cols = self.bars.get((exchange, security_id))
+        if cols is None:
+            return None
+        cut = int(np.searchsorted(cols["ts"], self.clock.time() - 60, side="right"))
+        if cut == 0:
+            return None
+        return {
+            "open": cols["open"][:cut],
+            "high": cols["high"][:cut],
+            "low": cols["low"][:cut],
+            "close": cols["close"][:cut],
+            "volume": cols["volume"][:cut],
+            "start_Time": cols["ts"][:cut] - DHAN_EPOCH_OFFSET,
+        }
+
+
+def _copy_setup(source, target):
+    """Enabled strategies, their watchlists and the global settings, forced to paper trading"""
+    strategies = source.query(Strategy).filter(Strategy.is_enabled == True).all()
+    ids = [s.id for s in strategies]
+    for s in strategies:
+        target.add(Strategy(id=s.id, name=s.name, module_name=s.module_name, class_name=s.class_name,
+                            description=s.description, timeframe=s.timeframe, is_enabled=True,
+                            params=dict(s.params or {})))
+    items = source.query(WatchlistItem).filter(WatchlistItem.strategy_id.in_(ids)).all() if ids else []
+    for w in items:
+        target.add(WatchlistItem(id=w.id, strategy_id=w.strategy_id, symbol=w.symbol,
+                                 exchange=w.exchange, security_id=w.security_id))
+    gs = source.query(GlobalSettings).first()
+    target.add(GlobalSettings(
+        id=1, trading_enabled=True, paper_trading=True,
+        max_daily_loss_pct=gs.max_daily_loss_pct if gs else 2.0,
+        max_positions=gs.max_positions if gs else 3,
+        max_capital_per_trade_pct=gs.max_capital_per_trade_pct if gs else 10.0,
+    ))
+    target.commit()
+    return items
+
+
+@contextmanager
+def _sandbox(clock: VirtualClock):
+    """
+    Run the real engine against an in-memory database, a fresh paper broker, exposure
+    books, warm-up history, cross-section and trigger monitor, all on the virtual clock,
+    with the journal and alerts off. Everything is restored afterwards.
+    """
+    if engine.get_scheduler_status():
+        raise RuntimeError("Stop the scheduler before replaying a session")
+    db_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=db_engine, tables=[
+        model.__table__ for model in (Strategy, WatchlistItem, Order, GlobalSettings, ConfigDhan)
+    ])
+    sandbox_session = sessionmaker(bind=db_engine, autocommit=False, autoflush=False)
+    calendar = get_calendar()
+
+    saved = (engine.SessionLocal, strategy_pool._runner, paper_broker._broker, portfolio_risk._book,
+             portfolio_risk._account_books, warmup._history, trigger_monitor._monitor, calendar.clock,
+             settings.PAPER_TRADING, journal._journal, topology._cache, alerts._dispatcher,
+             cross_section._cross_section)
+    monitor = trigger_monitor.TriggerMonitor(inline=True)
+    monitor.set_exit_handler(engine._on_trigger)
+    engine.SessionLocal = sandbox_session
+    strategy_pool._runner = strategy_pool.new_runner(isolated=False)  # deterministic, in-process
+    paper_broker._broker = paper_broker.PaperBroker(
+        cash=settings.PAPER_CAPITAL, slippage_bps=settings.PAPER_SLIPPAGE_BPS,
+        latency_ms=settings.PAPER_LATENCY_MS, fee_per_order=settings.PAPER_FEE_PER_ORDER, clock=clock.time,
+    )
+    portfolio_risk._book = None
+    portfolio_risk._account_books = {}  # on_pre_open resets every book it finds
+    warmup._history = None
+    trigger_monitor._monitor = monitor
+    calendar.clock = clock.time
+    calendar._today_bounds = (0.0, -1.0)
+    settings.PAPER_TRADING = True
+    journal._journal = None  # a replay is not market data the live engine saw
+    topology._cache = topology.TopologyCache()
+    alerts._dispatcher = None  # replayed fills and risk events must not page anyone
+    cross_section._cross_section = cross_section.CrossSection(settings.CROSS_SECTION_WINDOW)
+    try:
+        yield sandbox_session
+    finally:
+        (engine.SessionLocal, strategy_pool._runner, paper_broker._broker, portfolio_risk._book,
+         portfolio_risk._account_books, warmup._history, trigger_monitor._monitor, calendar.clock,
+         settings.PAPER_TRADING, journal._journal, topology._cache, alerts._dispatcher,
+         cross_section._cross_section) = saved
+        calendar._today_bounds = (0.0, -1.0)
+        db_engine.dispose()
+
+
+def fingerprint(orders) -> str:
+    """Digest of what was traded, independent of wall-clock timestamps; equal digests = identical replay"""
+    digest = hashlib.sha256()
+    for o in orders:
+        digest.update(f"{o.strategy_id}|{o.symbol}|{o.side}|{o.qty}|{o.order_type}|{o.price or 0:.4f}|"
+                      f"{o.status}|{o.dhan_order_id}|{o.notes}\n".encode())
+    return digest.hexdigest()
+
+
+def replay_day(day: date, speed: Optional[float] = None) -> dict:
+    """
+    Replay a recorded session through run_strategy_cycle: pre-open, one cycle per
+    minute at :05, square-off and the paper broker's fills, on a virtual clock.
+    speed=None runs as fast as possible; speed=N paces the clock at N x real time.
+    """
+    window = get_calendar().session(day)
+    if window is None:
+        raise ValueError(f"{day} is not a trading session")
+    clock = VirtualClock(window.pre_open.timestamp())
+
+    with _sandbox(clock) as sandbox_session:
+        live = SessionLocal()
+        sandbox = sandbox_session()
+        try:
+            items = _copy_setup(live, sandbox)
+        finally:
+            live.close()
+            sandbox.close()
+        if not items:
+            raise ValueError("No enabled strategy has a watchlist to replay")
+        recorded = RecordedDay(day, items, clock)
+        if not recorded.bars:
+            raise ValueError(f"No stored minute bars for {day}; ingest the session first")
+
+        engine.on_pre_open()
+        first = int(window.open_ts // 60 * 60) + CYCLE_OFFSET_SECONDS
+        cycles = np.arange(first if first >= window.open_ts else first + 60, window.close_ts + 1, 60)
+        squared_off = False
+        timings = []
+        wall_start = time.perf_counter()
+        for ts in cycles:
+            clock.now = float(ts)
+            if not squared_off and ts >= window.square_off_ts:
+                engine.square_off_intraday()
+                squared_off = True
+            if speed:
+                delay = (ts - cycles[0]) / speed - (time.perf_counter() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            t0 = time.perf_counter()
+            engine.run_strategy_cycle(fetch=recorded.fetch)
+            timings.append(time.perf_counter() - t0)
+        if not squared_off:
+            clock.now = window.square_off_ts
+            engine.square_off_intraday()
+        wall = time.perf_counter() - wall_start
+
+        db = sandbox_session()
+        try:
+            orders = db.query(Order).order_by(Order.id).all()
+            result_orders = [
+                {"strategy_id": o.strategy_id, "symbol": o.symbol, "side": o.side, "qty": o.qty,
+                 "price": o.price, "status": o.status, "order_id": o.dhan_order_id, "notes": o.notes}
+                for o in orders
+            ]
+            digest = fingerprint(orders)
+        finally:
+            db.close()
+        account = paper_broker.get_broker().account()
+        exposure = portfolio_risk.get_book().summary()
+
+    timings_ms = np.array(timings) * 1000
+    simulated = float(cycles[-1] - cycles[0]) if len(cycles) else 0.0
+    logger.info(f"Replayed {day}: {len(cycles)} cycles, {len(result_orders)} orders in {wall:.2f}s "
+                f"({simulated / wall if wall else 0:.0f}x real time), fingerprint {digest[:12]}")
+    return {
+        "day": str(day),
+        "instruments": len(recorded.bars),
+        "cycles": len(cycles),
+        "orders": result_orders,
+        "fingerprint": digest,
+        "account": account,
+        "exposure": exposure,
+        "wall_seconds": round(wall, 3),
+        "speedup": round(simulated / wall, 1) if wall else None,
+        "cycle_ms": {
+            "p50": round(float(np.percentile(timings_ms, 50)), 3) if len(timings_ms) else 0.0,
+            "p95": round(float(np.percentile(timings_ms, 95)), 3) if len(timings_ms) else 0.0,
+            "max": round(float(timings_ms.max()), 3) if len(timings_ms) else 0.0,
+        },
+    }
@@ -0,0 +1,478 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.models.strategy import Strategy, WatchlistItem
+from app.workers.cycle_data import FeatureCache
+from app.strategies.registry import get_strategy_class
+from app.core.config import settings
+from app.services import log_sink, alerts
+import multiprocessing
+import pandas as pd
+import threading
+import logging
+import json
+import time
+
+logger = logging.getLogger(__name__)
+
+# Spawning a worker imports pandas and the strategy; this is not part of any call budget
+WORKER_START_TIMEOUT = 60.0
+
+
+class StrategyCall(NamedTuple):
+    item: WatchlistItem
+    df: pd.DataFrame
+    config: Dict[str, Any]
+    features: Any              # the cycle's FeatureCache (shipped to and merged back from workers)
+    options: Any = None        # ChainAnalytics of the underlying, for uses_option_chain strategies
+    cross_section: Any = None  # CrossSectionView of the symbol, for uses_cross_section strategies
+
+
+class CallResult(NamedTuple):
+    item: WatchlistItem
+    intents: list
+    seconds: float
+
+
+class StrategyStats:
+    """CPU, memory and overrun accounting of one strategy"""
+
+    def __init__(self):
+        self.calls = 0
+        self.intents = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.max_call_seconds = 0.0
+        self.max_rss_kb = 0
+        self.errors = 0
+        self.overruns = 0
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.quarantined_until = 0.0
+        self.last_intent_at = 0.0
+
+    def record(self, wall: float, cpu: float, intents: int, rss_kb: int = 0):
+        self.calls += 1
+        self.intents += intents
+        self.wall_seconds += wall
+        self.cpu_seconds += cpu
+        self.max_call_seconds = max(self.max_call_seconds, wall)
+        self.max_rss_kb = max(self.max_rss_kb, rss_kb)
+        if intents:
+            self.last_intent_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "intents": self.intents,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "avg_call_ms": round(self.wall_seconds / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_call_ms": round(self.max_call_seconds * 1000, 2),
+            "max_rss_mb": round(self.max_rss_kb / 1024, 1),
+            "errors": self.errors,
+            "overruns": self.overruns,
+            "restarts": self.restarts,
+            "quarantined_until": self.quarantined_until if self.quarantined_until > time.time() else None,
+        }
+
+
+def _instance_key(strategy: Strategy) -> Tuple[str, str]:
+    return strategy.module_name, json.dumps(strategy.params or {}, sort_keys=True, default=str)
+
+
+class StrategyRunner:
+    """
+    Runs the strategies of one cycle and keeps their accounting. Strategies that
+    overrun their budget or fail `quarantine_after` times in a row are skipped for
+    `quarantine_minutes`.
+    """
+
+    def __init__(self, call_budget: float, strategy_budget: float, quarantine_after: int,
+                 quarantine_minutes: float, priority_window: float):
+        self.call_budget = call_budget
+        self.strategy_budget = strategy_budget
+        self.quarantine_after = quarantine_after
+        self.quarantine_seconds = quarantine_minutes * 60
+        self.priority_window = priority_window
+        self._stats: Dict[int, StrategyStats] = {}
+        self._lock = threading.Lock()
+
+    def stats_for(self, strategy_id: int) -> StrategyStats:
+        with self._lock:
+            stats = self._stats.get(strategy_id)
+            if stats is None:
+                stats = self._stats[strategy_id] = StrategyStats()
+            return stats
+
+    def is_quarantined(self, strategy_id: int) -> bool:
+        return self.stats_for(strategy_id).quarantined_until > time.time()
+
+    def tiers(self, strategies: List[Strategy], book) -> List[List[Strategy]]:
+        """
+        Order-generating strategies first: those holding a position (their exits matter)
+        or that emitted intents within the priority window. Quarantined ones are dropped.
+        """
+        now = time.time()
+        high, low = [], []
+        for strategy in strategies:
+            stats = self.stats_for(strategy.id)
+            if stats.quarantined_until > now:
+                continue
+            busy = book.has_positions(strategy.id) or now - stats.last_intent_at < self.priority_window
+            (high if busy else low).append(strategy)
+        return [tier for tier in (high, low) if tier]
+
+    def _failed(self, strategy: Strategy, reason: str):
+        stats = self.stats_for(strategy.id)
+        stats.consecutive_failures += 1
+        if stats.consecutive_failures >= self.quarantine_after:
+            stats.quarantined_until = time.time() + self.quarantine_seconds
+            stats.consecutive_failures = 0
+            message = (f"Strategy {strategy.name} quarantined for {self.quarantine_seconds / 60:.0f} min "
+                       f"after {self.quarantine_after} consecutive failures (last: {reason})")
+            logger.warning(message)
+            log_sink.emit("WARN", "ENGINE", message, {"strategy_id": strategy.id, "reason": reason})
+            alerts.emit("WARN", "error", message)
+
+    def run(self, jobs: List[Tuple[Strategy, List[StrategyCall]]]) -> List[Tuple[Strategy, List[CallResult]]]:
+        raise NotImplementedError
+
+    def position_closed(self, strategy_id: int, symbol: str):
+        raise NotImplementedError
+
+    def warm_up(self, strategies: List[Strategy]):
+        pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {str(sid): stats.to_dict() for sid, stats in self._stats.items()}
+
+    def shutdown(self):
+        pass
+
+
+class InlineRunner(StrategyRunner):
+    """
+    Strategies as objects in this process, called one after another with the shared
+    FeatureCache. A call cannot be interrupted, so budgets are only enforced after
+    the fact (an overrunning strategy still ends up quarantined). Used for replays
+    and when STRATEGY_ISOLATION is off.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instances: Dict[int, Tuple[Tuple[str, str], Any]] = {}
+
+    def _instance(self, strategy: Strategy):
+        key = _instance_key(strategy)
+        entry = self.instances.get(strategy.id)
+        if entry is None or entry[0] != key:
+            cls = get_strategy_class(strategy.module_name)
+            if cls is None:
+                logger.error(f"Strategy class not found: {strategy.module_name}")
+                return None
+            entry = self.instances[strategy.id] = (key, cls(config={"product": "INTRADAY"}, params=strategy.params or {}))
+        return entry[1]
+
+    def run(self, jobs):
+        results = []
+        for strategy, calls in jobs:
+            instance = self._instance(strategy)
+            if instance is None:
+                continue
+            stats = self.stats_for(strategy.id)
+            out, overran = [], False
+            for call in calls:
+                instance.config = call.config
+                instance.features = call.features
+                instance.options = call.options
+                instance.cross_section = call.cross_section
+                t0, cpu0 = time.perf_counter(), time.thread_time()
+                try:
+                    intents = instance.on_bar(call.item.symbol, call.df) or []
+                except Exception as e:
+                    stats.errors += 1
+                    logger.error(f"Error processing {call.item.symbol} for strategy {strategy.name}: {e}")
+                    intents = []
+                finally:
+                    instance.features = None
+                    instance.options = None
+                    instance.cross_section = None
+                seconds = time.perf_counter() - t0
+                stats.record(seconds, time.thread_time() - cpu0, len(intents))
+                if seconds > self.call_budget:
+                    stats.overruns += 1
+                    overran = True
+                out.append(CallResult(call.item, intents, seconds))
+            if overran:
+                self._failed(strategy, "on_bar over budget")
+            else:
+                stats.consecutive_failures = 0
+            results.append((strategy, out))
+        return results
+
+    def position_closed(self, strategy_id: int, symbol: str):
+        entry = self.instances.get(strategy_id)
+        if entry is not None:
+            entry[1].on_position_closed(symbol)
+
+
+def _worker_main(conn, module_name: str, params: dict, memory_limit_mb: int):
+    """Strategy worker process: one strategy instance serving on_bar calls over a pipe"""
+    import resource
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        instance = get_strategy_class(module_name)(config={"product": "INTRADAY"}, params=params)
+    except Exception as e:
+        conn.send(("failed", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", None))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        op = message[0]
+        if op == "stop":
+            return
+        if op == "closed":
+            instance.on_position_closed(message[1])
+            continue
+        _, symbol, config, df, features, options, cross_section = message
+        # Indicators the cycle already has come along; the ones computed here go back
+        shared = FeatureCache(df)
+        shared.merge(features)
+        instance.config = config
+        instance.features = shared
+        instance.options = options
+        instance.cross_section = cross_section
+        cpu0 = time.process_time()
+        error = None
+        try:
+            intents = instance.on_bar(symbol, df) or []
+        except Exception as e:
+            intents, error = [], f"{type(e).__name__}: {e}"
+        instance.features = None
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        computed = (shared.export(exclude=features), shared.hits, shared.misses)
+        conn.send((intents, time.process_time() - cpu0, rss_kb, error, computed))
+
+
+class StrategyWorker:
+    """Handle on one strategy's worker process"""
+
+    def __init__(self, ctx, strategy: Strategy, memory_limit_mb: int):
+        self.key = _instance_key(strategy)
+        self.ready = False
+        self.conn, child = ctx.Pipe()
+        self._send_lock = threading.Lock()  # the cycle and the trigger monitor both send
+        self.process = ctx.Process(target=_worker_main, name=f"strategy-{strategy.id}", daemon=True,
+                                   args=(child, strategy.module_name, strategy.params or {}, memory_limit_mb))
+        self.process.start()
+        child.close()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def wait_ready(self, timeout: float) -> Optional[str]:
+        """None once the strategy is instantiated, else why it is not"""
+        if self.ready:
+            return None
+        if not self.conn.poll(timeout):
+            return f"not ready after {timeout:.0f}s"
+        status, error = self.conn.recv()
+        self.ready = status == "ready"
+        return error
+
+    def call(self, symbol: str, config: dict, df: pd.DataFrame, features: dict, options, cross_section,
+             timeout: float) -> Optional[tuple]:
+        """
+        (intents, cpu seconds, max RSS kB, error, (new indicator arrays, hits, misses)),
+        or None when the call did not finish in time
+        """
+        self.send("bar", symbol, config, df, features, options, cross_section)
+        if not self.conn.poll(timeout):
+            return None
+        return self.conn.recv()
+
+    def send(self, *message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=1.0)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(("stop",))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1.0)
+        self.conn.close()
+
+
+class IsolatedRunner(StrategyRunner):
+    """
+    Every strategy in its own spawned process, driven concurrently from a thread per
+    strategy. A call past its budget gets the worker killed (its in-memory state
+    goes with it) and the strategy's remaining symbols are skipped for this cycle,
+    so it can delay no one but itself.
+    """
+
+    def __init__(self, *args, memory_limit_mb: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.memory_limit_mb = memory_limit_mb
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers: Dict[int, StrategyWorker] = {}
+        self._workers_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _worker(self, strategy: Strategy) -> StrategyWorker:
+        with self._workers_lock:
+            worker = self._workers.get(strategy.id)
+            if worker is not None and (not worker.alive or worker.key != _instance_key(strategy)):
+                if worker.alive:
+                    worker.stop()  # parameters changed
+                else:
+                    self.stats_for(strategy.id).restarts += 1
+                worker = None
+            if worker is None:
+                worker = self._workers[strategy.id] = StrategyWorker(self._ctx, strategy, self.memory_limit_mb)
+            return worker
+
+    def _discard(self, strategy_id: int):
+        with self._workers_lock:
+            worker = self._workers.pop(strategy_id, None)
+        if worker is not None:
+            worker.kill()
+            self.stats_for(strategy_id).restarts += 1
+
+    def warm_up(self, strategies: List[Strategy]):
+        """Spawn the workers ahead of the session so process start-up is not charged to the first cycle"""
+        for strategy in strategies:
+            self._worker(strategy)
+
+    def _run_one(self, strategy: Strategy, calls: List[StrategyCall]) -> List[CallResult]:
+        stats = self.stats_for(strategy.id)
+        try:
+            error = self._worker(strategy).wait_ready(WORKER_START_TIMEOUT)
+        except (OSError, EOFError) as e:
+            error = str(e)
+        if error:
+            logger.error(f"Strategy {strategy.name} worker failed to start: {error}")
+            self._discard(strategy.id)
+            self._failed(strategy, f"worker start: {error}")
+            return []
+        deadline = time.monotonic() + self.strategy_budget
+        out = []
+        for call in calls:
+            timeout = min(self.call_budget, deadline - time.monotonic())
+            if timeout <= 0:
+                stats.overruns += 1
+                logger.warning(f"Strategy {strategy.name} used its {self.strategy_budget:.1f}s cycle budget; "
+                               f"{len(calls) - len(out)} symbols skipped")
+                self._failed(strategy, "cycle budget exhausted")
+                return out
+            t0 = time.perf_counter()
+            features = call.features.export() if call.features is not None else {}
+            try:
+                reply = self._worker(strategy).call(call.item.symbol, call.config, call.df, features,
+                                                    call.options, call.cross_section, timeout)
+            except (OSError, EOFError) as e:
+                stats.errors += 1
+                logger.error(f"Strategy {strategy.name} worker died on {call.item.symbol}: {e}")
+                self._discard(strategy.id)
+                self._failed(strategy, "worker died")
+                return out
+            seconds = time.perf_counter() - t0
+            if reply is None:
+                stats.overruns += 1
+                logger.warning(f"Strategy {strategy.name} on_bar({call.item.symbol}) exceeded {timeout * 1000:.0f} ms; "
+                               f"worker restarted")
+                self._discard(strategy.id)
+                self._failed(strategy, f"on_bar({call.item.symbol}) timed out")
+                return out
+            intents, cpu, rss_kb, error, computed = reply
+            if call.features is not None:
+                call.features.merge(*computed)
+            stats.record(seconds, cpu, len(intents), rss_kb)
+            if error:
+                stats.errors += 1
+                logger.error(f"Error processing {call.item.symbol} for strategy {strategy.name}: {error}")
+            out.append(CallResult(call.item, intents, seconds))
+        stats.consecutive_failures = 0
+        return out
+
+    def run(self, jobs):
+        if not jobs:
+            return []
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=settings.STRATEGY_MAX_PARALLEL,
+                                                thread_name_prefix="strategy-driver")
+        # Submitted in tier order, so with more strategies than driver threads the first get going first
+        futures = [(strategy, self._executor.submit(self._run_one, strategy, calls)) for strategy, calls in jobs]
+        results = []
+        for strategy, future in futures:
+            try:
+                results.append((strategy, future.result()))
+            except Exception as e:
+                logger.error(f"Strategy {strategy.name} driver error: {e}")
+        return results
+
+    def position_closed(self, strategy_id: int, symbol: str):
+        with self._workers_lock:
+            worker = self._workers.get(strategy_id)
+        if worker is not None and worker.alive:
+            try:
+                worker.send("closed", symbol)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not notify strategy {strategy_id} of closed {symbol}: {e}")
+
+    def shutdown(self):
+        with self._workers_lock:
+            workers, self._workers = list(self._workers.values()), {}
+        for worker in workers:
+            worker.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def new_runner(isolated: Optional[bool] = None) -> StrategyRunner:
+    isolated = settings.STRATEGY_ISOLATION if isolated is None else isolated
+    args = dict(
+        call_budget=settings.STRATEGY_CALL_BUDGET_MS / 1000,
+        strategy_budget=settings.STRATEGY_CYCLE_BUDGET_SECONDS,
+        quarantine_after=settings.STRATEGY_QUARANTINE_AFTER,
+        quarantine_minutes=settings.STRATEGY_QUARANTINE_MINUTES,
+        priority_window=settings.STRATEGY_PRIORITY_WINDOW_MINUTES * 60,
+    )
+    if isolated:
+        return IsolatedRunner(memory_limit_mb=settings.STRATEGY_MEMORY_LIMIT_MB, **args)
+    return InlineRunner(**args)
+
+
+_runner: Optional[StrategyRunner] = None
+
+
+def get_runner() -> StrategyRunner:
+    global _runner
+    if _runner is None:
+        _runner = new_runner()
+    return _runner
+
+
+def shutdown():
+    global _runner
+    runner, _runner = _runner, None
+    if runner is not None:
+        runner.shutdown()
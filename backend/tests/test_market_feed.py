@@ -0,0 +1,64 @@
+"""
+MarketFeed against the installed dhanhq SDK: the feed must construct with the
+SDK's own DhanFeed signature and route decoded ticker packets to the monitor.
+"""
+import struct
+import threading
+
+import pytest
+
+marketfeed = pytest.importorskip("dhanhq.marketfeed")
+
+from app.services.trigger_monitor import MarketFeed  # noqa: E402
+
+
+class _Monitor:
+    def __init__(self):
+        self.prices = []
+
+    def on_price(self, exchange, symbol, price):
+        self.prices.append((exchange, symbol, price))
+
+
+def _build(instruments):
+    """Create the DhanFeed on a worker thread, like MarketFeed._run does"""
+    monitor = _Monitor()
+    feed = MarketFeed(monitor, "1000000001", "token", instruments)
+    built = {}
+    thread = threading.Thread(target=lambda: built.setdefault("feed", feed._create_feed()))
+    thread.start()
+    thread.join()
+    return feed, built["feed"], monitor
+
+
+def test_feed_builds_with_sdk_signature():
+    feed, dhan_feed, _ = _build([("NSE", "2885", "RELIANCE"), ("NFO", "43210", "NIFTY24DECFUT")])
+    try:
+        assert isinstance(dhan_feed, marketfeed.DhanFeed)
+        assert sorted(dhan_feed.instruments) == [(1, "2885", marketfeed.Ticker), (2, "43210", marketfeed.Ticker)]
+        groups = marketfeed.validate_and_process_tuples(dhan_feed.instruments)
+        packet = dhan_feed.create_subscription_packet(groups[str(marketfeed.Ticker)][0], marketfeed.Ticker)
+        assert len(packet) == 83 + 4 + 100 * 21
+        assert callable(dhan_feed.get_data) and callable(dhan_feed.close_connection)
+    finally:
+        dhan_feed.loop.close()
+
+
+def test_ticker_packet_reaches_monitor():
+    feed, dhan_feed, monitor = _build([("NSE", "2885", "RELIANCE")])
+    try:
+        header = struct.pack('<BHBIfI', 2, 16, 1, 2885, 2931.5, 1700000000)
+        feed._on_message(dhan_feed.process_data(header))
+        # unsubscribed instrument and non-ticker payloads are ignored
+        feed._on_message(dhan_feed.process_data(struct.pack('<BHBIfI', 2, 16, 1, 1594, 1.0, 0)))
+        feed._on_message(None)
+        assert monitor.prices == [("NSE", "RELIANCE", 2931.5)]
+    finally:
+        dhan_feed.loop.close()
+
+
+def test_stop_without_connection():
+    feed, dhan_feed, _ = _build([("NSE", "2885", "RELIANCE")])
+    dhan_feed.loop.close()
+    feed.stop()
+    assert feed._feed is None and feed._thread is None